@@ -1,8 +1,22 @@
 # app.py
 from flask import Flask, request, jsonify
-from classifier import classify_text
+from classifier import classify_text, classify_batch
+from chatbot.model_registry import preload
 
 app = Flask(__name__)
+preload("app")
+
+MAX_BATCH_SIZE = 512
+
+def to_response(result):
+    label, explanation, reason, source_url, score = result
+    return {
+        "label": label,
+        "explanation": explanation,
+        "reason": reason,
+        "source_url": source_url,
+        "score": round(score, 3)
+    }
 
 @app.route("/")
 def home():
@@ -14,15 +28,17 @@ def classify():
     if not data or "text" not in data:
         return jsonify({"error": "Missing 'text' in request body"}), 400
 
-    label, explanation, reason, source_url, score = classify_text(data["text"])
+    return jsonify(to_response(classify_text(data["text"])))
 
-    return jsonify({
-        "label": label,
-        "explanation": explanation,
-        "reason": reason,
-        "source_url": source_url,
-        "score": round(score, 3)
-    })
+@app.route("/classify_batch", methods=["POST"])
+def classify_many():
+    data = request.get_json()
+    if not isinstance(data, dict) or not isinstance(data.get("texts"), list):
+        return jsonify({"error": "Missing 'texts' list in request body"}), 400
+    if len(data["texts"]) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} texts per request"}), 400
+
+    return jsonify({"results": [to_response(result) for result in classify_batch(data["texts"])]})
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=7860)
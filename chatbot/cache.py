@@ -0,0 +1,133 @@
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+class LRUCache:
+    """Thread-safe LRU cache with an optional time-to-live and hit/miss counters.
+
+    Memory is bounded by max_entries; the least recently used entry is evicted
+    first, and entries older than ttl_seconds are treated as misses.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, stored_at)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry):
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+    # --- internals (caller holds the lock) ---
+    def _expired(self, entry):
+        return self.ttl_seconds is not None and time.monotonic() - entry[1] > self.ttl_seconds
+
+    def _store(self, key, value):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        self._entries[key] = (value, time.monotonic())
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        del self._entries[key]
+
+class VerdictCache(LRUCache):
+    """LRU+TTL cache of classification results keyed by normalized claim text.
+
+    With near_duplicate_threshold set, entries also keep the claim's
+    L2-normalized embedding, and get_similar() returns the result of the
+    closest cached claim whose cosine similarity reaches the threshold.
+    Near-duplicate hits are counted separately from exact hits and misses.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=None, near_duplicate_threshold=None, dim=384):
+        super().__init__(max_entries, ttl_seconds)
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.near_duplicate_hits = 0
+        # One preallocated row per cache slot, so lookup is a single matrix-vector product
+        self._matrix = np.zeros((max_entries, dim), dtype=np.float32) if near_duplicate_threshold is not None else None
+        self._slot_keys = [None] * max_entries
+        self._slots = {}  # key -> row in _matrix
+        self._free = list(range(max_entries - 1, -1, -1))
+
+    def set(self, key, value, embedding=None):
+        with self._lock:
+            self._store(key, value)
+            if embedding is not None and self.near_duplicate_threshold is not None:
+                slot = self._slots.get(key)
+                if slot is None:
+                    slot = self._free.pop()
+                    self._slots[key] = slot
+                    self._slot_keys[slot] = key
+                self._matrix[slot] = embedding
+
+    def get_similar(self, embedding):
+        """Result for the most similar cached claim, or None below the threshold"""
+        if self.near_duplicate_threshold is None:
+            return None
+        with self._lock:
+            if not self._slots:
+                return None
+            scores = self._matrix @ embedding
+            occupied = np.fromiter(self._slots.values(), dtype=np.int64)
+            best = occupied[np.argmax(scores[occupied])]
+            if scores[best] < self.near_duplicate_threshold:
+                return None
+            key = self._slot_keys[best]
+            entry = self._entries[key]
+            if self._expired(entry):
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            self.near_duplicate_hits += 1
+            return entry[0]
+
+    def stats(self):
+        stats = super().stats()
+        stats["near_duplicate_hits"] = self.near_duplicate_hits
+        return stats
+
+    def _remove(self, key):
+        super()._remove(key)
+        slot = self._slots.pop(key, None)
+        if slot is not None:
+            self._slot_keys[slot] = None
+            self._free.append(slot)
@@ -1,12 +1,53 @@
-from transformers import BertTokenizer, BertForSequenceClassification, GPT2LMHeadModel, GPT2Tokenizer, pipeline
 import torch
 import re
-from sentence_transformers import SentenceTransformer, util
+import numpy as np
+from chatbot.model_registry import (
+    get_semantic_model, get_fact_checker, get_small_fact_checker, get_perplexity_model, SEMANTIC_ENCODER_ID
+)
+from chatbot.text_analysis import TextAnalysis
+from chatbot.embedding_store import EmbeddingStore, cached_embeddings
+from chatbot.nli_cascade import cascade_stats, run_cascade, run_cascade_batch
 
 # ========================
 # Shared Semantic Model
 # ========================
-semantic_model = SentenceTransformer("all-MiniLM-L6-v2")  # Used for all similarity checks
+semantic_model = get_semantic_model()  # Used for all similarity checks; shared process-wide
+
+def encode_normalized(texts):
+    """Encode text(s) to L2-normalized float32 vectors, so cosine similarity is a dot product"""
+    return semantic_model.encode(texts, convert_to_numpy=True, normalize_embeddings=True).astype(np.float32)
+
+def fact_check(pairs, batch_size=32):
+    """BART-MNLI label scores for each {"text": premise, "text_pair": hypothesis} in a list"""
+    return get_fact_checker()(list(pairs), top_k=None, batch_size=batch_size)
+
+def small_fact_check(pairs, batch_size=32):
+    """Distilled MNLI label scores, same inputs and outputs as fact_check"""
+    return get_small_fact_checker()(list(pairs), top_k=None, batch_size=batch_size)
+
+def analyze(text: str, variants=(), embedding=None, encoder=encode_normalized, nli=fact_check,
+            small_nli=small_fact_check) -> TextAnalysis:
+    """Per-request context that encodes the text once for every pipeline stage.
+
+    encoder and the NLI functions can be swapped for micro-batched versions
+    that share forward passes with concurrent requests.
+    """
+    return TextAnalysis(text, encoder, variants, embedding=embedding, nli=nli, small_nli=small_nli)
+
+def build_reference_store(name: str, corpus: dict) -> dict:
+    """Encode a {label: [sentences]} corpus once into a single stacked, memory-mapped matrix"""
+    labels, spans, sentences = [], [], []
+    for label, refs in corpus.items():
+        labels.append(label)
+        spans.append((len(sentences), len(sentences) + len(refs)))
+        sentences.extend(refs)
+    matrix = cached_embeddings(name, sentences, encode_normalized, SEMANTIC_ENCODER_ID)
+    return {"labels": labels, "spans": spans, "sentences": sentences, "matrix": matrix}
+
+def score_reference_store(store: dict, emb_text) -> dict:
+    """Cosine similarity of one text against every reference, in one matrix multiply"""
+    sims = store["matrix"].scores(emb_text)
+    return {label: sims[start:end] for label, (start, end) in zip(store["labels"], store["spans"])}
 
 # ========================
 # Misinformation Prototypes
@@ -21,23 +62,28 @@ misinfo_prototypes = [
     "Home remedies like garlic can prevent monkeypox."
 ]
 
-def is_similar_to_misinformation(text, prototypes=misinfo_prototypes, threshold=0.75):
-    emb_text = semantic_model.encode(text, convert_to_tensor=True)
-    for prototype in prototypes:
-        emb_proto = semantic_model.encode(prototype, convert_to_tensor=True)
-        similarity = util.pytorch_cos_sim(emb_text, emb_proto).item()
-        if similarity > threshold:
-            print(f"[DEBUG] Misinformation detected with similarity: {similarity:.3f}")
-            return True
+# Precompute prototype embeddings
+PROTOTYPE_EMBEDDINGS = cached_embeddings("prototypes", misinfo_prototypes, encode_normalized, SEMANTIC_ENCODER_ID)
+
+def is_similar_to_misinformation(text, prototypes=misinfo_prototypes, threshold=0.75, analysis=None):
+    emb_text = (analysis or analyze(text)).embedding
+    if prototypes is misinfo_prototypes:
+        emb_protos = PROTOTYPE_EMBEDDINGS
+    else:
+        emb_protos = EmbeddingStore.from_array(encode_normalized(list(prototypes)))
+    similarities = emb_protos.scores(emb_text)
+    above = np.flatnonzero(similarities > threshold)
+    if above.size:
+        print(f"[DEBUG] Misinformation detected with similarity: {similarities[above[0]]:.3f}")
+        return True
     return False
 
 # ========================
 # GPT-2 Perplexity Checker (lighter)
 # ========================
-gpt2_tokenizer = GPT2Tokenizer.from_pretrained("distilgpt2")
-gpt2_model = GPT2LMHeadModel.from_pretrained("distilgpt2")
-
 def get_perplexity(text):
+    # distilgpt2 is loaded on first use; classify_text does not need it
+    gpt2_tokenizer, gpt2_model = get_perplexity_model()
     inputs = gpt2_tokenizer(text, return_tensors="pt")
     with torch.no_grad():
         outputs = gpt2_model(**inputs)
@@ -71,6 +117,9 @@ reference_statements = {
     ]
 }
 
+# Precompute reference embeddings
+REFERENCE_STORE = build_reference_store("references", reference_statements)
+
 label_urls = {
     "TRUE ✅": "https://www.who.int/news-room/questions-and-answers/item/mpox",
     "FALSE ❌": "https://www.who.int/news-room/fact-sheets/detail/monkeypox",
@@ -81,39 +130,32 @@ label_urls = {
 def is_nonsense(text: str) -> bool:
     return len(text.split()) < 2 or re.search(r"[^a-zA-Z0-9\s\.,!?]", text)
 
-# ========================
-# BERT Classification (Hugging Face Model)
-# ========================
-MODEL_DIR = "aerynnnn/mpox-mythbuster-bert"
-tokenizer = BertTokenizer.from_pretrained(MODEL_DIR)
-model = BertForSequenceClassification.from_pretrained(MODEL_DIR)
-model.eval()
-
-fact_checker = pipeline("text-classification", model="facebook/bart-large-mnli", top_k=None)
-
 # ========================
 # Helper: Get explanation
 # ========================
-def get_dynamic_reason(user_text: str, label: str) -> str:
-    candidate_reasons = {
-        "TRUE ✅": [
-            "Studies and trusted organizations confirm that direct contact is the main route of mpox transmission.",
-            "Evidence shows mpox primarily spreads through close contact."
-        ],
-        "FALSE ❌": [
-            "There is no credible scientific evidence supporting claims like 5G radiation or natural cures.",
-            "No natural remedies prevent mpox. Only vaccines and avoiding exposure are proven prevention methods.",
-            "Established health agencies explicitly warn against these unproven prevention claims."
-        ],
-        "⚠️ UNCERTAIN": [
-            "Preliminary research has produced mixed results on this topic.",
-            "The current evidence isn't strong enough to draw definitive conclusions."
-        ],
-        "❓ Requires Expert Review": [
-            "The provided information requires expert analysis before reaching a conclusion.",
-        ]
-    }
+candidate_reasons = {
+    "TRUE ✅": [
+        "Studies and trusted organizations confirm that direct contact is the main route of mpox transmission.",
+        "Evidence shows mpox primarily spreads through close contact."
+    ],
+    "FALSE ❌": [
+        "There is no credible scientific evidence supporting claims like 5G radiation or natural cures.",
+        "No natural remedies prevent mpox. Only vaccines and avoiding exposure are proven prevention methods.",
+        "Established health agencies explicitly warn against these unproven prevention claims."
+    ],
+    "⚠️ UNCERTAIN": [
+        "Preliminary research has produced mixed results on this topic.",
+        "The current evidence isn't strong enough to draw definitive conclusions."
+    ],
+    "❓ Requires Expert Review": [
+        "The provided information requires expert analysis before reaching a conclusion.",
+    ]
+}
+
+# Precompute candidate reason embeddings
+REASON_STORE = build_reference_store("reasons", candidate_reasons)
 
+def get_dynamic_reason(user_text: str, label: str, analysis=None) -> str:
     user_lower = user_text.lower()
     if "garlic" in user_lower and ("prevent" in user_lower or "protect" in user_lower):
         return "No natural remedies like garlic prevent mpox. The WHO explicitly warns against such unproven prevention methods."
@@ -122,17 +164,15 @@ def get_dynamic_reason(user_text: str, label: str) -> str:
     if not candidates:
         return "Additional details are unavailable."
     
-    emb_query = semantic_model.encode(user_text, convert_to_tensor=True)
-    best_candidate = max(
-        candidates,
-        key=lambda c: util.pytorch_cos_sim(emb_query, semantic_model.encode(c, convert_to_tensor=True)).item()
-    )
-    return best_candidate
+    emb_query = (analysis or analyze(user_text)).embedding
+    scores = score_reference_store(REASON_STORE, emb_query)[label]
+    return candidates[int(np.argmax(scores))]
 
 # ========================
 # Detect Misinformation
 # ========================
-def detect_misinformation(text):
+def rule_verdict(text, analysis=None):
+    """Keyword and prototype checks; returns None when the NLI stage has to decide"""
     text_lower = text.lower()
 
     prevention_falsehoods = [
@@ -148,44 +188,42 @@ def detect_misinformation(text):
     if "vaccine" in text_lower or "smallpox" in text_lower:
         return "Real"
 
-    if is_similar_to_misinformation(text):
+    if is_similar_to_misinformation(text, analysis=analysis):
         return "Misinformation"
+    return None
 
-    results = fact_checker(text, top_k=None)
-    flat_results = results[0] if isinstance(results[0], list) else results
-    scores = {res['label'].lower(): res.get('score', 0) for res in flat_results}
-
-    if scores.get("contradiction", 0) > scores.get("entailment", 0):
-        return "Misinformation"
-    elif scores.get("entailment", 0) > scores.get("contradiction", 0):
-        return "Real"
-    elif scores.get("neutral", 0) > 0.45:
-        return "Uncertain"
-    return "Requires Expert Review"
+def detect_misinformation(text, analysis=None):
+    """Rules first; claims they leave open go through the NLI cascade (see chatbot.nli_cascade)"""
+    verdict = rule_verdict(text, analysis=analysis)
+    if verdict is not None:
+        cascade_stats.record("rules")
+        return verdict
+    return run_cascade(text, analysis or analyze(text), REFERENCE_STORE)
 
 # ========================
 # Final Classification Pipeline
 # ========================
-def classify_text(text: str):
+def _invalid_input_result(text):
     if not isinstance(text, str) or not text.strip():
         return ("Invalid Input", "⚠️ Sorry, I couldn't understand that.", "Input was empty.", None, 0.0)
 
     if is_nonsense(text):
         return ("Invalid Input", "⚠️ Gibberish detected.", "Input was not coherent.", None, 0.0)
+    return None
 
-    verdict = detect_misinformation(text)
+def _verdict_result(text, verdict, analysis):
     if verdict == "Misinformation":
-        return "FALSE ❌", "This claim contradicts established scientific evidence.", get_dynamic_reason(text, "FALSE ❌"), label_urls["FALSE ❌"], 0.95
+        return "FALSE ❌", "This claim contradicts established scientific evidence.", get_dynamic_reason(text, "FALSE ❌", analysis), label_urls["FALSE ❌"], 0.95
     elif verdict == "Real":
-        return "TRUE ✅", "This statement aligns with verified health sources.", get_dynamic_reason(text, "TRUE ✅"), label_urls["TRUE ✅"], 0.95
+        return "TRUE ✅", "This statement aligns with verified health sources.", get_dynamic_reason(text, "TRUE ✅", analysis), label_urls["TRUE ✅"], 0.95
 
     if "symptom" in text.lower() or "sign" in text.lower():
         return ("Informational", "Medical symptom inquiry", "This appears to be a request for symptom information", "https://www.cdc.gov/poxvirus/monkeypox/symptoms.html", 1.0)
 
-    emb_text = semantic_model.encode(text, convert_to_tensor=True)
+    emb_text = analysis.embedding
     avg_scores = {
-        label: sum(util.pytorch_cos_sim(emb_text, semantic_model.encode(ref, convert_to_tensor=True)).item() for ref in refs) / len(refs)
-        for label, refs in reference_statements.items()
+        label: float(sims.mean())
+        for label, sims in score_reference_store(REFERENCE_STORE, emb_text).items()
     }
 
     best_label = max(avg_scores, key=avg_scores.get)
@@ -201,4 +239,38 @@ def classify_text(text: str):
         "❓ Requires Expert Review": "Additional expert analysis is needed due to insufficient data."
     }
 
-    return best_label, explanations[best_label], get_dynamic_reason(text, best_label), label_urls[best_label], highest_avg
+    return best_label, explanations[best_label], get_dynamic_reason(text, best_label, analysis), label_urls[best_label], highest_avg
+
+def classify_text(text: str, analysis=None):
+    invalid = _invalid_input_result(text)
+    if invalid:
+        return invalid
+
+    analysis = analysis or analyze(text)
+    return _verdict_result(text, detect_misinformation(text, analysis=analysis), analysis)
+
+def classify_batch(texts, batch_size=32):
+    """Classify many texts with one encoder call and one batched NLI call; results keep input order"""
+    results = [_invalid_input_result(text) for text in texts]
+    pending = [i for i, result in enumerate(results) if result is None]
+    if not pending:
+        return results
+
+    embeddings = encode_normalized([texts[i].lower() for i in pending])
+    analyses = {i: analyze(texts[i], embedding=emb) for i, emb in zip(pending, embeddings)}
+    verdicts = {i: rule_verdict(texts[i], analysis=analyses[i]) for i in pending}
+    cascade_stats.record("rules", count=sum(v is not None for v in verdicts.values()))
+
+    nli_pending = [i for i in pending if verdicts[i] is None]
+    if nli_pending:
+        cascade_verdicts = run_cascade_batch(
+            [texts[i] for i in nli_pending], [analyses[i] for i in nli_pending], REFERENCE_STORE,
+            small_nli=lambda pairs: small_fact_check(pairs, batch_size=batch_size),
+            large_nli=lambda pairs: fact_check(pairs, batch_size=batch_size),
+        )
+        for i, verdict in zip(nli_pending, cascade_verdicts):
+            verdicts[i] = verdict
+
+    for i in pending:
+        results[i] = _verdict_result(texts[i], verdicts[i], analyses[i])
+    return results
\ No newline at end of file
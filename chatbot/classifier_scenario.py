@@ -1,7 +1,8 @@
-import torch
-from sentence_transformers import SentenceTransformer, util
+import numpy as np
+from .model_registry import get_semantic_model, SEMANTIC_ENCODER_ID
+from .embedding_store import cached_embeddings
 
-SCENARIO_MODEL = SentenceTransformer("all-MiniLM-L6-v2")
+SCENARIO_MODEL = get_semantic_model()  # Same MiniLM instance as the classifier
 
 # Define evidence URLs FIRST
 EVIDENCE_URLS = {
@@ -45,20 +46,25 @@ SCENARIO_DB = {
     }
 }
 
-# Precompute embeddings
-SCENARIO_EMBEDDINGS = {
-    scenario: SCENARIO_MODEL.encode(scenario, convert_to_tensor=True)
-    for scenario in SCENARIO_DB.keys()
-}
+# Precompute embeddings (L2-normalized, one row per scenario in SCENARIO_DB order)
+SCENARIO_EMBEDDINGS = cached_embeddings(
+    "scenarios", list(SCENARIO_DB.keys()),
+    lambda texts: SCENARIO_MODEL.encode(texts, convert_to_numpy=True, normalize_embeddings=True).astype(np.float32),
+    SEMANTIC_ENCODER_ID
+)
 
-def classify_scenario(text: str):
+def classify_scenario(text: str, analysis=None):
     text_lower = text.lower()
-    emb_text = SCENARIO_MODEL.encode(text_lower, convert_to_tensor=True)
+    if analysis is not None:
+        emb_text = analysis.embedding
+    else:
+        emb_text = SCENARIO_MODEL.encode(text_lower, convert_to_numpy=True, normalize_embeddings=True)
+    scenario_scores = SCENARIO_EMBEDDINGS.scores(emb_text)
     
     best_match = None
     best_score = 0
     
-    for scenario, data in SCENARIO_DB.items():
+    for i, (scenario, data) in enumerate(SCENARIO_DB.items()):
         # 1. Check for direct keyword match
         if scenario in text_lower:
             return (
@@ -70,7 +76,7 @@ def classify_scenario(text: str):
             )
         
         # 2. Semantic similarity match
-        score = util.pytorch_cos_sim(emb_text, SCENARIO_EMBEDDINGS[scenario]).item()
+        score = float(scenario_scores[i])
         if score > best_score:
             best_score = score
             best_match = (scenario, data)
@@ -96,4 +102,4 @@ def classify_scenario(text: str):
     
     # 5. Fallback to standard classification
     from .classifier import classify_text
-    return classify_text(text)
\ No newline at end of file
+    return classify_text(text, analysis=analysis)
\ No newline at end of file
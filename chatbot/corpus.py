@@ -0,0 +1,244 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import argparse
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from chatbot.embedding_store import write_embeddings, open_embeddings
+
+logger = logging.getLogger(__name__)
+
+DATASET_REPO = "aerynnnn/mpox-dataset"
+CORPUS_FORMAT_VERSION = 2  # 2: embeddings in the memory-mapped embedding store format
+CORPUS_DIR = os.getenv("MPOX_CORPUS_DIR", "artifacts/mpox-corpus")
+
+# Tables stored in the artifact, and which text column gets an embedding matrix
+CORPUS_TABLES = {
+    "faq": "question",
+    "train": None,
+    "verified_sources": "clean_text",
+}
+
+# ===== SCENARIO QUESTIONS =====
+scenario_questions = [
+    {"question": "can you get mpox from shaking hands",
+     "answer": "Risk from brief handshake is very low unless there's direct contact with lesions",
+     "source": "CDC/WHO Guidelines"},
+    {"question": "mpox transmission from surfaces",
+     "answer": "Possible but less common than direct contact. Virus survives 1–2 days on surfaces.",
+     "source": "CDC/WHO Guidelines"},
+    {"question": "is mpox airborne",
+     "answer": "Not considered airborne like COVID-19. Requires prolonged face-to-face contact.",
+     "source": "CDC/WHO Guidelines"},
+    {"question": "can pets spread mpox",
+     "answer": "Possible but rare. Isolate from pets if infected.",
+     "source": "CDC/WHO Guidelines"}
+]
+
+# ===== TEXT CLEANING =====
+def basic_clean(text):
+    if not isinstance(text, str):
+        return ""
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+# ===== LIVE CORPUS (network: Hugging Face Hub + WHO scrape) =====
+def build_faq_df(faq_df_csv):
+    from src.scrapers.who_scraper import scrape_who_data
+
+    try:
+        scraped_faqs = scrape_who_data()
+    except Exception as e:
+        print("⚠️ WHO scrape failed:", e)
+        scraped_faqs = []
+
+    faq_df_scraped = pd.DataFrame(scraped_faqs)
+
+    if 'source' not in faq_df_scraped.columns:
+        faq_df_scraped['source'] = 'WHO Scraped'
+
+    faq_df_scraped = faq_df_scraped.rename(columns={'Fact': 'question'})
+    faq_df_scraped['question'] = faq_df_scraped['question'].str.lower()
+
+    faq_df_csv['question'] = faq_df_csv['question'].str.lower()
+    faq_df_csv['answer'] = faq_df_csv['answer'].astype(str)
+
+    faq_df = pd.concat([faq_df_scraped, faq_df_csv], ignore_index=True)
+
+    scenario_df = pd.DataFrame(scenario_questions)
+    faq_df = pd.concat([faq_df, scenario_df], ignore_index=True)
+
+    return faq_df.drop_duplicates(subset=['question'])
+
+def build_training_dfs(followup_df, who_df, cdc_df):
+    """Return (train_df, positive_df) from the follow-up, WHO and CDC splits"""
+    followup_df['source'] = 'Follow-Up'
+    followup_df['clean_text'] = followup_df['clean_text'].astype(str).apply(basic_clean)
+    followup_df['binary_class'] = followup_df['binary_class'].astype(int)
+    followup_df = followup_df[followup_df['binary_class'].isin([0, 1])]
+    followup_df = followup_df.drop_duplicates(subset=['clean_text'])
+
+    who_df['binary_class'] = 1
+    who_df['source'] = 'WHO'
+    who_df['clean_text'] = who_df['clean_text'].astype(str).apply(basic_clean)
+    who_df = who_df.drop_duplicates(subset=['clean_text'])
+
+    cdc_df['binary_class'] = 1
+    cdc_df['source'] = 'CDC'
+    cdc_df['clean_text'] = cdc_df['clean_text'].astype(str).apply(basic_clean)
+    cdc_df = cdc_df.drop_duplicates(subset=['clean_text'])
+
+    positive_df = pd.concat([who_df, cdc_df], ignore_index=True).drop_duplicates(subset=['clean_text'])
+
+    target_positive = 477
+    target_negative = 377
+
+    if len(positive_df) < target_positive:
+        print(f"Warning: Only {len(positive_df)} positive samples available.")
+        positive_sample = positive_df
+    else:
+        positive_sample = positive_df.sample(n=target_positive, random_state=42)
+
+    negative_candidates = followup_df[followup_df['binary_class'] == 0].drop_duplicates(subset=['clean_text'])
+
+    if len(negative_candidates) < target_negative:
+        print(f"Warning: Only {len(negative_candidates)} negative samples available.")
+        negative_sample = negative_candidates
+    else:
+        negative_sample = negative_candidates.sample(n=target_negative, random_state=42)
+
+    train_df = pd.concat([
+        positive_sample[['clean_text', 'binary_class']],
+        negative_sample[['clean_text', 'binary_class']]
+    ], ignore_index=True)
+
+    train_df['clean_text'] = train_df['clean_text'].apply(basic_clean)
+    train_df = train_df.sample(frac=1, random_state=42).reset_index(drop=True)
+
+    print("✅ Final label distribution after cleaning and deduplication:\n", train_df['binary_class'].value_counts())
+    return train_df, positive_df
+
+def build_live_corpus():
+    """Download the dataset splits, scrape WHO and assemble faq / train / verified_sources"""
+    from datasets import load_dataset
+
+    # === Load all required splits from Hugging Face Dataset Hub ===
+    faq_df_csv = pd.DataFrame(load_dataset(DATASET_REPO, split="faq"))
+    followup_df = pd.DataFrame(load_dataset(DATASET_REPO, split="followup"))
+    who_df = pd.DataFrame(load_dataset(DATASET_REPO, split="who"))
+    cdc_df = pd.DataFrame(load_dataset(DATASET_REPO, split="cdc"))
+
+    faq_df = build_faq_df(faq_df_csv)
+    train_df, positive_df = build_training_dfs(followup_df, who_df, cdc_df)
+
+    verified_sources = positive_df.copy()
+    verified_sources['clean_text'] = verified_sources['clean_text'].str.lower()
+    verified_sources = verified_sources.reset_index(drop=True)
+
+    return {"faq": faq_df, "train": train_df, "verified_sources": verified_sources}
+
+# ===== ARTIFACT =====
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def write_corpus_artifact(corpus, out_dir, encoder, model_name, embedding_dtype="float32"):
+    """Write each table as Parquet plus an embedding store file per text column, and a manifest.
+
+    encoder maps a list of texts to L2-normalized float32 rows.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {
+        "format_version": CORPUS_FORMAT_VERSION,
+        "built_at": datetime.now(timezone.utc).isoformat(),
+        "dataset": DATASET_REPO,
+        "embedding_model": model_name,
+        "embedding_dtype": embedding_dtype,
+        "tables": {},
+    }
+    for name, text_column in CORPUS_TABLES.items():
+        df = corpus[name].reset_index(drop=True)
+        table_path = os.path.join(out_dir, f"{name}.parquet")
+        df.to_parquet(table_path, index=False)
+        entry = {"rows": len(df), "parquet": os.path.basename(table_path), "sha256": _file_sha256(table_path)}
+        if text_column:
+            emb_path = os.path.join(out_dir, f"{name}_embeddings.emb")
+            write_embeddings(emb_path, encoder(df[text_column].astype(str).tolist()), embedding_dtype)
+            entry["embeddings"] = os.path.basename(emb_path)
+            entry["embeddings_sha256"] = _file_sha256(emb_path)
+        manifest["tables"][name] = entry
+
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Wrote corpus artifact to {out_dir}: " + ", ".join(f"{k}={v['rows']}" for k, v in manifest["tables"].items()))
+    return manifest
+
+def open_corpus_artifact(path=CORPUS_DIR, model_name=None):
+    """Open a built artifact, or return None if it is missing or incompatible.
+
+    Embedding matrices are memory-mapped read-only rather than copied onto the heap.
+    Every file is checked against the sha256 in the manifest first, so a
+    truncated or partially rebuilt artifact is rejected rather than loaded.
+    model_name is the encoder id the caller scores with (see
+    model_registry.encoder_id); if the artifact was encoded by another one,
+    its tables are still used but its embeddings are left out to be re-encoded.
+    """
+    manifest_path = os.path.join(path, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != CORPUS_FORMAT_VERSION:
+        logger.warning(f"Ignoring corpus artifact {path}: format {manifest.get('format_version')} != {CORPUS_FORMAT_VERSION}")
+        return None
+    use_embeddings = not model_name or manifest.get("embedding_model") == model_name
+    if not use_embeddings:
+        logger.warning(f"Ignoring embeddings in corpus artifact {path}: encoded with {manifest.get('embedding_model')}, not {model_name}")
+
+    for entry in manifest["tables"].values():
+        for file_key, hash_key in (("parquet", "sha256"), ("embeddings", "embeddings_sha256")):
+            if file_key not in entry or hash_key not in entry:
+                continue
+            file_path = os.path.join(path, entry[file_key])
+            if not os.path.exists(file_path) or _file_sha256(file_path) != entry[hash_key]:
+                logger.warning(f"Ignoring corpus artifact {path}: {entry[file_key]} is missing or does not match its manifest sha256")
+                return None
+
+    corpus = {"manifest": manifest, "embeddings": {}}
+    for name, entry in manifest["tables"].items():
+        corpus[name] = pd.read_parquet(os.path.join(path, entry["parquet"]))
+        if use_embeddings and "embeddings" in entry:
+            corpus["embeddings"][name] = open_embeddings(os.path.join(path, entry["embeddings"]))
+    logger.info(f"Opened corpus artifact {path} (built {manifest['built_at']})")
+    return corpus
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Snapshot the mpox corpus into a local artifact")
+    parser.add_argument("--out", default=CORPUS_DIR, help="Output directory")
+    parser.add_argument("--with-summaries", action="store_true", help="Also precompute BART summaries of long FAQ answers")
+    parser.add_argument("--embedding-dtype", default="float32", choices=["float32", "float16", "int8"],
+                        help="Storage precision of the embedding matrices")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    from chatbot.model_registry import get_semantic_model, SEMANTIC_ENCODER_ID
+
+    model = get_semantic_model()
+    def encoder(texts):
+        return model.encode(texts, convert_to_numpy=True, normalize_embeddings=True).astype(np.float32)
+
+    corpus = build_live_corpus()
+    if args.with_summaries:
+        from chatbot.summaries import precompute_faq_summaries
+        precompute_faq_summaries(corpus["faq"], path=None)
+    write_corpus_artifact(corpus, args.out, encoder, SEMANTIC_ENCODER_ID, args.embedding_dtype)
+
+if __name__ == "__main__":
+    main()
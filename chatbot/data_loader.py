@@ -1,15 +1,12 @@
+import os
 import pandas as pd
-import re
+import numpy as np
 from src.utils.helpers import similarity
-from sentence_transformers import SentenceTransformer, util
-from src.scrapers.who_scraper import scrape_who_data
-from datasets import load_dataset
-
-# === Load all required splits from Hugging Face Dataset Hub ===
-faq_df_csv = pd.DataFrame(load_dataset("aerynnnn/mpox-dataset", split="faq"))
-followup_df = pd.DataFrame(load_dataset("aerynnnn/mpox-dataset", split="followup"))
-who_df = pd.DataFrame(load_dataset("aerynnnn/mpox-dataset", split="who"))
-cdc_df = pd.DataFrame(load_dataset("aerynnnn/mpox-dataset", split="cdc"))
+from chatbot.model_registry import get_semantic_model, SEMANTIC_ENCODER_ID
+from chatbot.text_index import AhoCorasick
+from chatbot.faq_index import load_faq_index
+from chatbot.embedding_store import cached_embeddings
+from chatbot.corpus import CORPUS_DIR, basic_clean, scenario_questions, build_live_corpus, open_corpus_artifact
 
 # ===== HEALTH KEYWORDS =====
 HEALTH_KEYWORDS = {
@@ -19,22 +16,6 @@ HEALTH_KEYWORDS = {
     "treatment": ["treat", "cure", "medicine", "vaccine"]
 }
 
-# ===== SCENARIO QUESTIONS =====
-scenario_questions = [
-    {"question": "can you get mpox from shaking hands", 
-     "answer": "Risk from brief handshake is very low unless there's direct contact with lesions",
-     "source": "CDC/WHO Guidelines"},
-    {"question": "mpox transmission from surfaces", 
-     "answer": "Possible but less common than direct contact. Virus survives 1–2 days on surfaces.",
-     "source": "CDC/WHO Guidelines"},
-    {"question": "is mpox airborne",
-     "answer": "Not considered airborne like COVID-19. Requires prolonged face-to-face contact.",
-     "source": "CDC/WHO Guidelines"},
-    {"question": "can pets spread mpox",
-     "answer": "Possible but rare. Isolate from pets if infected.",
-     "source": "CDC/WHO Guidelines"}
-]
-
 # ===== QUERY EXPANSION =====
 def expand_health_query(text):
     text = text.lower()
@@ -43,120 +24,81 @@ def expand_health_query(text):
             return text + " " + " ".join(keywords)
     return text
 
-# ===== TEXT CLEANING =====
-def basic_clean(text):
-    if not isinstance(text, str):
-        return ""
-    return re.sub(r'\s+', ' ', text).strip().lower()
-
-# ===== FAQ CONSTRUCTION =====
-try:
-    scraped_faqs = scrape_who_data()
-except Exception as e:
-    print("⚠️ WHO scrape failed:", e)
-    scraped_faqs = []
-
-faq_df_scraped = pd.DataFrame(scraped_faqs)
-
-if 'source' not in faq_df_scraped.columns:
-    faq_df_scraped['source'] = 'WHO Scraped'
-
-faq_df_scraped = faq_df_scraped.rename(columns={'Fact': 'question'})
-faq_df_scraped['question'] = faq_df_scraped['question'].str.lower()
+# ===== CORPUS =====
+# Prefer the prebuilt artifact (python -m chatbot.corpus); fall back to the network sources
+corpus = open_corpus_artifact(CORPUS_DIR, SEMANTIC_ENCODER_ID) or build_live_corpus()
+faq_df = corpus["faq"]
+train_df = corpus["train"]
+verified_sources = corpus["verified_sources"]
+prebuilt_embeddings = corpus.get("embeddings", {})
 
-faq_df_csv['question'] = faq_df_csv['question'].str.lower()
-faq_df_csv['answer'] = faq_df_csv['answer'].astype(str)
-
-faq_df = pd.concat([faq_df_scraped, faq_df_csv], ignore_index=True)
+# ===== EMBEDDING GENERATION =====
+qa_model = get_semantic_model()  # Same MiniLM instance as the classifier
 
-scenario_df = pd.DataFrame(scenario_questions)
-faq_df = pd.concat([faq_df, scenario_df], ignore_index=True)
+def encode_questions(texts):
+    return qa_model.encode(texts, convert_to_numpy=True, normalize_embeddings=True).astype(np.float32)
 
-faq_df = faq_df.drop_duplicates(subset=['question'])
+# "exact" (NumPy dot product), "hnsw" (approximate, needs hnswlib) or "auto" (by corpus size)
+FAQ_INDEX_BACKEND = os.getenv("FAQ_INDEX_BACKEND", "auto")
+FAQ_INDEX_DIR = os.getenv("FAQ_INDEX_DIR", ".cache/faq_index")
 
-# ===== EMBEDDING GENERATION =====
-qa_model = SentenceTransformer("all-MiniLM-L6-v2")
-faq_embeddings = qa_model.encode(faq_df['question'].tolist(), convert_to_tensor=True)
+faq_index = load_faq_index(
+    faq_df['question'].tolist(), encode_questions, SEMANTIC_ENCODER_ID,
+    cache_dir=FAQ_INDEX_DIR, backend=FAQ_INDEX_BACKEND, embeddings=prebuilt_embeddings.get("faq")
+)
+faq_embeddings = faq_index.store
 
 # ===== FAQ MATCHING FUNCTION =====
-def faq_match(user_input, threshold=0.65):
+def faq_match(user_input, threshold=0.65, analysis=None):
     expanded_input = expand_health_query(user_input.lower())
-    input_embedding = qa_model.encode(expanded_input, convert_to_tensor=True)
-    cosine_scores = util.pytorch_cos_sim(input_embedding, faq_embeddings)[0]
-
-    top_indices = cosine_scores.topk(3).indices
-    top_scores = cosine_scores[top_indices].tolist()
+    if analysis is not None:
+        input_embedding = analysis.embed(expanded_input)
+    else:
+        input_embedding = qa_model.encode(expanded_input, convert_to_numpy=True, normalize_embeddings=True)
+    top_indices, top_scores = faq_index.search(input_embedding, k=3)
+    top_scores = top_scores.tolist()
 
     for idx, score in zip(top_indices, top_scores):
         if score >= threshold:
-            answer = faq_df.iloc[idx.item()]['answer']
+            answer = faq_df.iloc[int(idx)]['answer']
             if pd.isna(answer) or not isinstance(answer, str):
                 continue
             return answer, score
 
     return None, max(top_scores) if top_scores else 0
 
-# ===== TRAINING DATA (for classification model) =====
-followup_df['source'] = 'Follow-Up'
-followup_df['clean_text'] = followup_df['clean_text'].astype(str).apply(basic_clean)
-followup_df['binary_class'] = followup_df['binary_class'].astype(int)
-followup_df = followup_df[followup_df['binary_class'].isin([0, 1])]
-followup_df = followup_df.drop_duplicates(subset=['clean_text'])
-
-who_df['binary_class'] = 1
-who_df['source'] = 'WHO'
-who_df['clean_text'] = who_df['clean_text'].astype(str).apply(basic_clean)
-who_df = who_df.drop_duplicates(subset=['clean_text'])
-
-cdc_df['binary_class'] = 1
-cdc_df['source'] = 'CDC'
-cdc_df['clean_text'] = cdc_df['clean_text'].astype(str).apply(basic_clean)
-cdc_df = cdc_df.drop_duplicates(subset=['clean_text'])
-
-positive_df = pd.concat([who_df, cdc_df], ignore_index=True).drop_duplicates(subset=['clean_text'])
-
-target_positive = 477
-target_negative = 377
-
-if len(positive_df) < target_positive:
-    print(f"Warning: Only {len(positive_df)} positive samples available.")
-    positive_sample = positive_df
-else:
-    positive_sample = positive_df.sample(n=target_positive, random_state=42)
-
-negative_candidates = followup_df[followup_df['binary_class'] == 0].drop_duplicates(subset=['clean_text'])
-
-if len(negative_candidates) < target_negative:
-    print(f"Warning: Only {len(negative_candidates)} negative samples available.")
-    negative_sample = negative_candidates
-else:
-    negative_sample = negative_candidates.sample(n=target_negative, random_state=42)
-
-train_df = pd.concat([
-    positive_sample[['clean_text', 'binary_class']],
-    negative_sample[['clean_text', 'binary_class']]
-], ignore_index=True)
-
-train_df['clean_text'] = train_df['clean_text'].apply(basic_clean)
-train_df = train_df.sample(frac=1, random_state=42).reset_index(drop=True)
-
-print("✅ Final label distribution after cleaning and deduplication:\n", train_df['binary_class'].value_counts())
-
 # ===== RULE-BASED & SOURCE CHECKING =====
+# One automaton over every training sentence: containment is checked in a single pass over the input
+train_matcher = AhoCorasick(train_df['clean_text'].tolist())
+
 def rule_based_check(text):
     text = text.lower()
-    for _, row in train_df.iterrows():
-        if row['clean_text'] in text:
-            return "Real", 1.0
+    if train_matcher.contains_any(text):
+        return "Real", 1.0
     return None
 
-verified_sources = positive_df.copy()
-verified_sources['clean_text'] = verified_sources['clean_text'].str.lower()
+# Verified fact embeddings (L2-normalized) for candidate retrieval, precomputed in the artifact when available
+verified_embeddings = prebuilt_embeddings.get("verified_sources")
+if verified_embeddings is None:
+    verified_embeddings = cached_embeddings(
+        "verified", verified_sources['clean_text'].tolist(), encode_questions, SEMANTIC_ENCODER_ID
+    )
 
-def source_check_override(user_input, threshold=0.85):
+def source_check_override(user_input, threshold=0.85, analysis=None, candidates=5):
     user_input = user_input.lower()
-    for _, row in verified_sources.iterrows():
-        fact = row['clean_text']
+    if analysis is not None:
+        input_embedding = analysis.embed(user_input)
+    else:
+        input_embedding = qa_model.encode(user_input, convert_to_numpy=True, normalize_embeddings=True)
+
+    # Only the closest facts by embedding are scored with similarity()
+    scores = verified_embeddings.scores(input_embedding)
+    k = min(candidates, len(scores))
+    if k == 0:
+        return None
+    top_indices = np.argpartition(-scores, k - 1)[:k]
+    for idx in top_indices[np.argsort(-scores[top_indices])]:
+        fact = verified_sources.at[int(idx), 'clean_text']
         score = similarity(user_input, fact)
         if score >= threshold:
             return "Real", score
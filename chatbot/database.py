@@ -1,260 +1,309 @@
+import os
+import queue
 import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 import logging
 
+from chatbot.repository import Repository, get_repository, INTENT_SOURCE_ROUTER
+from chatbot.migrations import ensure_schema, LATEST_VERSION
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-DB_PATH = "mpox_bot.db"
-DB_VERSION = 3  # Incremented version
+DB_PATH = "mpox_bot.db"  # Default SQLite file; DATABASE_URL selects the backend
+DB_VERSION = LATEST_VERSION  # Latest migration in chatbot.migrations
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+
+# Applied to every pooled connection. WAL lets readers run alongside the
+# writer, and synchronous=NORMAL fsyncs at checkpoints rather than on every
+# commit (an application crash still loses nothing; a power cut may lose the
+# last few transactions).
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+)
+
+# ===== CONNECTION POOL =====
+class ConnectionPool:
+    """Long-lived SQLite connections shared across threads.
+
+    Connections are opened on demand up to `size` and reused afterwards, so
+    sqlite3's per-connection statement cache keeps every query prepared.
+    """
+
+    def __init__(self, path, size=DB_POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, cached_statements=256)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                conn = self._connect()
+                self._opened += 1
+                return conn
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; commits on success and rolls back on error"""
+        conn = self._acquire()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        """Close idle connections (call once no requests are in flight)"""
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._opened = 0
+
+# ===== STATEMENTS =====
+# Kept as constants so each pooled connection prepares them once
+INSERT_USER = '''
+    INSERT OR REPLACE INTO User (user_id, username, first_name, last_name)
+    VALUES (?, ?, ?, ?)
+'''
+INSERT_MESSAGE = '''
+    INSERT INTO Message (user_id, content, intent_id, intent_source)
+    VALUES (?, ?, ?, ?)
+'''
+INSERT_MISINFORMATION = '''
+    INSERT OR IGNORE INTO Misinformation (content, source_url)
+    VALUES (?, ?)
+'''
+INSERT_RESPONSE = '''
+    INSERT INTO Response (intent_id, content)
+    VALUES (?, ?)
+'''
+
+# ===== SQLITE REPOSITORY =====
+class SQLiteRepository(Repository):
+    """Repository backed by one SQLite file through a ConnectionPool"""
+
+    def __init__(self, path=DB_PATH, pool_size=DB_POOL_SIZE):
+        super().__init__()
+        self.path = path
+        self.pool = ConnectionPool(path, pool_size)
+
+    def init_schema(self):
+        with self.pool.connection() as conn:
+            ensure_schema(conn)
+            self._load_intent_ids(conn)
+
+    def load_intent_ids(self):
+        with self.pool.connection() as conn:
+            return self._load_intent_ids(conn)
+
+    def _load_intent_ids(self, conn):
+        self.intent_ids = dict(conn.execute('SELECT name, intent_id FROM Intent').fetchall())
+        return self.intent_ids
+
+    def log_user(self, user_id, username=None, first_name=None, last_name=None):
+        with self.pool.connection() as conn:
+            conn.execute(INSERT_USER, (user_id, username, first_name, last_name))
+
+    def log_message(self, user_id, content, intent_name=None, intent_source=None):
+        with self.pool.connection() as conn:
+            return conn.execute(INSERT_MESSAGE, (user_id, content, self.intent_id(intent_name), intent_source)).lastrowid
+
+    def log_response(self, intent_name, response_content):
+        with self.pool.connection() as conn:
+            conn.execute(INSERT_RESPONSE, (self.intent_id(intent_name), response_content))
+
+    def log_misinformation(self, content, source_url=None):
+        with self.pool.connection() as conn:
+            conn.execute(INSERT_MISINFORMATION, (content, source_url))
 
+    def write_log_batch(self, messages=(), responses=(), misinformation=()):
+        messages = [(user_id, content, self.intent_id(name), source) for user_id, content, name, source in messages]
+        responses = [(self.intent_id(name), content) for name, content in responses]
+        with self.pool.connection() as conn:
+            if messages:
+                conn.executemany(INSERT_MESSAGE, messages)
+            if responses:
+                conn.executemany(INSERT_RESPONSE, responses)
+            if misinformation:
+                conn.executemany(INSERT_MISINFORMATION, misinformation)
+
+    def get_misinformation_stats(self):
+        with self.pool.connection() as conn:
+            return conn.execute('''
+                SELECT verification_status, claims
+                FROM MisinformationStatus
+                WHERE claims > 0
+                ORDER BY verification_status
+            ''').fetchall()
+
+    def get_hourly_intent_counts(self, since=None):
+        with self.pool.connection() as conn:
+            return conn.execute('''
+                SELECT h.hour, i.name, h.messages
+                FROM MessageHourly h
+                LEFT JOIN Intent i ON i.intent_id = h.intent_id
+                WHERE h.hour >= ? AND h.messages > 0
+                ORDER BY h.hour, i.name
+            ''', (since or '',)).fetchall()
+
+    def get_labelled_messages(self, limit=None):
+        with self.pool.connection() as conn:
+            return conn.execute('''
+                SELECT m.content, i.name
+                FROM Message m
+                JOIN Intent i ON i.intent_id = m.intent_id
+                WHERE m.intent_source IS NULL OR m.intent_source = ?
+                ORDER BY m.message_id DESC
+                LIMIT ?
+            ''', (INTENT_SOURCE_ROUTER, -1 if limit is None else limit)).fetchall()
+
+    @contextmanager
+    def export_rows(self, table, key, since, chunk_size):
+        # Its own connection with no write transaction open, so the bot's
+        # logging keeps the write lock while the file streams to disk
+        with self.pool.connection() as conn:
+            upper = conn.execute(f'SELECT COALESCE(MAX({key}), 0) FROM {table}').fetchone()[0]
+            cursor = conn.execute(
+                f'SELECT * FROM {table} WHERE {key} > ? AND {key} <= ? ORDER BY {key}', (since, upper)
+            )
+            try:
+                columns = [desc[0] for desc in cursor.description]
+                integer_columns = {row[1] for row in conn.execute(f'PRAGMA table_info({table})') if "INT" in row[2].upper()}
+                yield columns, integer_columns, upper, iter(lambda: cursor.fetchmany(chunk_size), [])
+            finally:
+                cursor.close()
+
+    def get_export_watermark(self, table, consumer):
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                'SELECT last_id FROM ExportWatermark WHERE table_name = ? AND consumer = ?', (table, consumer)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def set_export_watermark(self, table, consumer, last_id):
+        with self.pool.connection() as conn:
+            conn.execute('''
+                INSERT INTO ExportWatermark (table_name, consumer, last_id, exported_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (table_name, consumer) DO UPDATE
+                SET last_id = excluded.last_id, exported_at = excluded.exported_at
+            ''', (table, consumer, last_id))
+
+    def close(self):
+        self.pool.close()
+
+# ===== SCHEMA SETUP =====
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    # Create version table if not exists
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS Version (
-            version INTEGER PRIMARY KEY
-        )
-    ''')
-    
-    # Get current version
-    c.execute('SELECT version FROM Version ORDER BY version DESC LIMIT 1')
-    current_version = c.fetchone()
-    current_version = current_version[0] if current_version else 0
-    
- # ===== Migration 2 to 3 =====
-    if current_version < 3:
-        logger.info("Migrating database to version 3")
-        
-        # Check if Message table exists
-        c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='Message'")
-        if c.fetchone():
-            # Add intent_id column if missing
-            c.execute("PRAGMA table_info(Message)")
-            columns = [col[1] for col in c.fetchall()]
-            if 'intent_id' not in columns:
-                c.execute('ALTER TABLE Message ADD COLUMN intent_id INTEGER REFERENCES Intent(intent_id)')
-        
-        # Update version
-        c.execute('INSERT INTO Version (version) VALUES (3)')
-        conn.commit()
-    
-    # ===== Create Tables (Version 2 Schema) =====
-    # User table remains the same
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS User (
-            user_id TEXT PRIMARY KEY,
-            username TEXT,
-            first_name TEXT,
-            last_name TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Updated Intent table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS Intent (
-            intent_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE NOT NULL,
-            description TEXT,
-            category TEXT  -- NEW COLUMN
-        )
-    ''')
-    
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS Message (
-            message_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT REFERENCES User(user_id),
-            content TEXT NOT NULL,
-            intent_id INTEGER REFERENCES Intent(intent_id),
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS Response (
-            response_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            intent_id INTEGER REFERENCES Intent(intent_id),
-            content TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS Misinformation (
-            misinfo_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            content TEXT NOT NULL UNIQUE,
-            verification_status TEXT DEFAULT 'pending',
-            source_url TEXT
-        )
-    ''')
-    
-    # Create indexes
-    c.execute('CREATE INDEX IF NOT EXISTS idx_message_content ON Message(content)')
-    c.execute('CREATE INDEX IF NOT EXISTS idx_misinfo_content ON Misinformation(content)')
-    
-    # Pre-populate intents
-    intents = [
-        ("misinfo_check", "Verification of potential misinformation", "classification"),
-        ("transmission_risk", "Questions about transmission scenarios", "scenario"),
-        ("symptom_query", "Inquiries about mpox symptoms", "information"),
-        ("prevention_info", "Questions about prevention methods", "information"),
-        ("news_request", "Requests for latest mpox news", "service"),
-        ("general_question", "Other health-related questions", "information"),
-        ("greeting", "Initial user greetings", "service"),
-        ("off_topic", "Non-health related queries", "service")
-    ]
-
-    # Update existing intents
-    for name, desc, category in intents:
-        c.execute('''
-            INSERT OR IGNORE INTO Intent (name, description, category)
-            VALUES (?, ?, ?)
-        ''', (name, desc, category))
-    
-    c.executemany('''
-        INSERT OR IGNORE INTO Intent (name, description, category) VALUES (?, ?, ?)
-    ''', intents)
-    
-    conn.commit()
-    conn.close()
+    """Create or migrate the schema of the configured database (run once at startup)"""
+    get_repository().init_schema()
     logger.info("Database initialized with simplified schema")
 
+def load_intent_ids():
+    """Refresh the intent name -> id map after Intent changed"""
+    return get_repository().load_intent_ids()
+
 # ===== USER OPERATIONS =====
 def log_user(user_id, username=None, first_name=None, last_name=None):
     """Log or update user information"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('''
-            INSERT OR REPLACE INTO User (user_id, username, first_name, last_name)
-            VALUES (?, ?, ?, ?)
-        ''', (user_id, username, first_name, last_name))
-        conn.commit()
+        get_repository().log_user(user_id, username, first_name, last_name)
         return True
     except Exception as e:
         logger.error(f"Error logging user: {str(e)}")
         return False
-    finally:
-        conn.close()
 
 # ===== MESSAGE OPERATIONS =====
-def log_message(user_id, content, intent_name=None):
+def log_message(user_id, content, intent_name=None, intent_source=None):
     """Log message with intent mapping"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        
-        # Get intent ID if provided
-        intent_id = None
-        if intent_name:
-            c.execute('SELECT intent_id FROM Intent WHERE name = ?', (intent_name,))
-            intent_row = c.fetchone()
-            intent_id = intent_row[0] if intent_row else None
-        
-        c.execute('''
-            INSERT INTO Message (user_id, content, intent_id)
-            VALUES (?, ?, ?)
-        ''', (user_id, content, intent_id))
-        
-        message_id = c.lastrowid
-        conn.commit()
-        return message_id
+        return get_repository().log_message(user_id, content, intent_name, intent_source)
     except Exception as e:
         logger.error(f"Error logging message: {str(e)}")
         return None
-    finally:
-        conn.close()
 
 # ===== MISINFORMATION LOGGING =====
 def log_misinformation(content, source_url=None):
     """Log detected misinformation claim"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('''
-            INSERT OR IGNORE INTO Misinformation (content, source_url)
-            VALUES (?, ?)
-        ''', (content, source_url))
-        conn.commit()
+        get_repository().log_misinformation(content, source_url)
         return True
     except Exception as e:
         logger.error(f"Error logging misinformation: {str(e)}")
         return False
-    finally:
-        conn.close()
 
 # ===== RESPONSE LOGGING =====
 def log_response(intent_name, response_content):
     """Log a bot response"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('''
-            INSERT INTO Response (intent_id, content)
-            VALUES (
-                (SELECT intent_id FROM Intent WHERE name = ?),
-                ?
-            )
-        ''', (intent_name, response_content))
-        conn.commit()
+        get_repository().log_response(intent_name, response_content)
         return True
     except Exception as e:
         logger.error(f"Error logging response: {str(e)}")
         return False
-    finally:
-        conn.close()
+
+# ===== BATCHED LOGGING =====
+def write_log_batch(messages=(), responses=(), misinformation=()):
+    """Insert queued log records in one transaction.
+
+    messages are (user_id, content, intent_name, intent_source), responses are
+    (intent_name, response_content) and misinformation are (content, source_url).
+    Raises on failure so the caller can decide what to do with the batch.
+    """
+    get_repository().write_log_batch(messages, responses, misinformation)
 
 # ===== ANALYSIS QUERIES =====
 def get_misinformation_stats():
     """Get summary of misinformation claims"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('''
-            SELECT verification_status, COUNT(*) 
-            FROM Misinformation 
-            GROUP BY verification_status
-        ''')
-        return c.fetchall()
+        return get_repository().get_misinformation_stats()
     except Exception as e:
         logger.error(f"Error getting stats: {str(e)}")
         return []
-    finally:
-        conn.close()
 
-def export_to_csv(filename="mpox_bot_data.csv"):
-    """Export data to CSV"""
+def get_hourly_intent_counts(since=None):
+    """Messages per hour and intent from the rollup: [(hour, intent_name, messages)]
+
+    since is a 'YYYY-MM-DD HH:MM:SS' UTC string; intent_name is None for
+    messages logged without an intent.
+    """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        
-        # Export messages
-        with open(f"messages_{filename}", "w") as f:
-            c = conn.cursor()
-            c.execute("SELECT * FROM Message")
-            columns = [desc[0] for desc in c.description]
-            f.write(",".join(columns) + "\n")
-            for row in c.fetchall():
-                f.write(",".join(map(str, row)) + "\n")
-        
-        # Export misinformation
-        with open(f"misinformation_{filename}", "w") as f:
-            c = conn.cursor()
-            c.execute("SELECT * FROM Misinformation")
-            columns = [desc[0] for desc in c.description]
-            f.write(",".join(columns) + "\n")
-            for row in c.fetchall():
-                f.write(",".join(map(str, row)) + "\n")
-        
+        return get_repository().get_hourly_intent_counts(since)
+    except Exception as e:
+        logger.error(f"Error getting hourly intent counts: {str(e)}")
+        return []
+
+def export_to_csv(filename="mpox_bot_data.csv", compression=None, incremental=False):
+    """Export data to CSV (streamed in chunks; see chatbot.export for Parquet and options)"""
+    from chatbot.export import export_tables
+    try:
+        export_tables(filename, "csv", compression=compression, incremental=incremental)
         return True
     except Exception as e:
         logger.error(f"Export failed: {str(e)}")
         return False
-    finally:
-        conn.close()
-
-# Initialize database when imported
-init_db()
\ No newline at end of file
@@ -0,0 +1,149 @@
+import os
+import struct
+import hashlib
+import tempfile
+
+import numpy as np
+
+# ===== FILE FORMAT =====
+# A 64-byte little-endian header, an optional per-row float32 scale vector
+# (int8 only), then the row-major embedding matrix starting at a 64-byte
+# aligned offset. Files are opened read-only with np.memmap, so every process
+# on a host shares one copy through the page cache.
+MAGIC = b"MPXEMB\x00\x01"
+HEADER = struct.Struct("<8sBBHQI40x")  # magic, dtype code, reserved, reserved, rows, dim
+ALIGN = 64
+
+DTYPES = {"float32": (0, np.float32), "float16": (1, np.float16), "int8": (2, np.int8)}
+DTYPE_NAMES = {code: name for name, (code, _) in DTYPES.items()}
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", ".cache/embeddings")
+EMBEDDING_DTYPE = os.getenv("EMBEDDING_DTYPE", "float32")
+
+# Rows converted to float32 at a time when scoring float16/int8 stores
+SCORE_BLOCK_ROWS = 8192
+
+def _aligned(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+class EmbeddingStore:
+    """Read-only embedding matrix (L2-normalized rows) with cosine scoring.
+
+    Backed either by a memory-mapped file (open_embeddings) or an in-memory
+    array (from_array). float16 and int8 rows are widened to float32 block
+    by block while scoring, so no full-size float32 copy is made.
+    """
+
+    def __init__(self, matrix, scales=None, path=None):
+        self.matrix = matrix
+        self.scales = scales
+        self.path = path
+
+    @classmethod
+    def from_array(cls, matrix):
+        return cls(np.ascontiguousarray(matrix, dtype=np.float32))
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1]
+
+    @property
+    def dtype(self):
+        return self.matrix.dtype.name
+
+    def scores(self, query):
+        """Cosine similarity of an L2-normalized query against every row"""
+        query = np.asarray(query, dtype=np.float32)
+        if self.matrix.dtype == np.float32:
+            return self.matrix @ query
+        out = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), SCORE_BLOCK_ROWS):
+            block = self.matrix[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+            out[start:start + len(block)] = block @ query
+        if self.scales is not None:
+            out *= self.scales
+        return out
+
+    def as_float32(self):
+        """Materialize the rows as a float32 array (e.g. to build an ANN graph)"""
+        if self.matrix.dtype == np.float32:
+            return np.asarray(self.matrix)
+        matrix = self.matrix.astype(np.float32)
+        if self.scales is not None:
+            matrix *= self.scales[:, None]
+        return matrix
+
+def write_embeddings(path, matrix, dtype="float32"):
+    """Write matrix to path in the embedding store format (atomically)"""
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+    code, np_dtype = DTYPES[dtype]
+    matrix = np.asarray(matrix, dtype=np.float32)
+    rows, dim = matrix.shape
+
+    scales = None
+    if dtype == "int8":
+        # Symmetric per-row quantization
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        data = np.round(matrix / scales[:, None]).astype(np.int8)
+        scales = scales.astype(np.float32)
+    else:
+        data = matrix.astype(np_dtype)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, code, 0, 0, rows, dim))
+            if scales is not None:
+                f.write(scales.tobytes())
+            f.write(b"\0" * (_aligned(f.tell()) - f.tell()))
+            f.write(np.ascontiguousarray(data).tobytes())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+def open_embeddings(path):
+    """Memory-map an embedding store file read-only"""
+    with open(path, "rb") as f:
+        magic, code, _, _, rows, dim = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not an embedding store file")
+    np_dtype = DTYPES[DTYPE_NAMES[code]][1]
+    if rows == 0:
+        return EmbeddingStore(np.zeros((0, dim), dtype=np_dtype), path=path)
+
+    offset = HEADER.size
+    scales = None
+    if np_dtype == np.int8:
+        scales = np.memmap(path, dtype=np.float32, mode="r", offset=offset, shape=(rows,))
+        offset += rows * 4
+    matrix = np.memmap(path, dtype=np_dtype, mode="r", offset=_aligned(offset), shape=(rows, dim))
+    return EmbeddingStore(matrix, scales, path)
+
+def cached_embeddings(name, texts, encoder, model_name, cache_dir=EMBEDDING_CACHE_DIR, dtype=EMBEDDING_DTYPE):
+    """Open the store for these texts, encoding and writing it first if it does not exist yet.
+
+    The file name carries a hash of the texts, model_name and dtype, so a
+    changed corpus gets a new file and stale ones are never reused.
+    encoder itself is not hashed: model_name must identify the encoder that
+    produced the vectors, backend included (see model_registry.encoder_id).
+    """
+    texts = [str(t) for t in texts]
+    digest = hashlib.sha256(f"{model_name}\0{dtype}".encode("utf-8"))
+    for text in texts:
+        digest.update(b"\0" + text.encode("utf-8"))
+    if not cache_dir:
+        return EmbeddingStore.from_array(encoder(texts))
+
+    path = os.path.join(cache_dir, f"{name}-{digest.hexdigest()[:16]}.emb")
+    if not os.path.exists(path):
+        write_embeddings(path, encoder(texts), dtype)
+    return open_embeddings(path)
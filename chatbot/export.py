@@ -0,0 +1,127 @@
+import io
+import os
+import csv
+import gzip
+import logging
+import argparse
+
+from chatbot.database import init_db
+from chatbot.repository import get_repository
+
+try:
+    import zstandard
+except ImportError:  # Optional: only needed for zstd-compressed CSV
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Rows held in memory at a time, whatever the table size
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "10000"))
+
+# Exported tables: output file prefix and the increasing key used as the watermark
+EXPORT_TABLES = {
+    "Message": ("messages", "message_id"),
+    "Misinformation": ("misinformation", "misinfo_id"),
+}
+
+CSV_SUFFIXES = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+# ===== WRITERS =====
+def _open_text(path, compression):
+    if compression is None:
+        return open(path, "w", newline="", encoding="utf-8")
+    if compression == "gzip":
+        return gzip.open(path, "wt", newline="", encoding="utf-8")
+    if compression == "zstd":
+        if zstandard is None:
+            raise ImportError("zstd compression requires the zstandard package")
+        writer = zstandard.ZstdCompressor().stream_writer(open(path, "wb"))
+        return io.TextIOWrapper(writer, encoding="utf-8", newline="")
+    raise ValueError(f"Unknown compression: {compression}")
+
+def _write_csv(columns, chunks, path, compression):
+    rows = 0
+    with _open_text(path, compression) as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for chunk in chunks:
+            writer.writerows(chunk)
+            rows += len(chunk)
+    return rows
+
+def _write_parquet(columns, integer_columns, chunks, path, compression):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Declared column types decide the Arrow type, so an all-NULL first chunk can't mislead inference
+    schema = pa.schema([
+        (name, pa.int64() if name in integer_columns else pa.string()) for name in columns
+    ])
+    rows = 0
+    with pq.ParquetWriter(path, schema, compression=compression or "snappy") as writer:
+        for chunk in chunks:
+            columns = zip(*chunk)
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+            ))
+            rows += len(chunk)
+    return rows
+
+# ===== EXPORT =====
+def export_path(prefix, filename, fmt="csv", compression=None):
+    path = f"{prefix}_{filename}"
+    return path + CSV_SUFFIXES[compression] if fmt == "csv" else path
+
+def export_tables(filename="mpox_bot_data.csv", fmt="csv", compression=None,
+                  incremental=False, consumer="default", chunk_size=EXPORT_CHUNK_ROWS):
+    """Stream Message and Misinformation to files in fixed-size chunks.
+
+    fmt is "csv" (compression None, "gzip" or "zstd") or "parquet"
+    (compression is the Parquet codec). With incremental=True only rows
+    added since this consumer's last export are written, and the watermark
+    advances once the file is complete. Rows are exported by id, so later
+    edits to an already-exported row (e.g. verification_status) are not
+    picked up again. Returns {table: rows_written}.
+    """
+    if fmt not in ("csv", "parquet"):
+        raise ValueError(f"Unknown export format: {fmt}")
+    repository = get_repository()
+    written = {}
+    for table, (prefix, key) in EXPORT_TABLES.items():
+        since = repository.get_export_watermark(table, consumer) if incremental else 0
+        with repository.export_rows(table, key, since, chunk_size) as (columns, integer_columns, upper, chunks):
+            path = export_path(prefix, filename, fmt, compression)
+            tmp_path = path + ".tmp"
+            try:
+                if fmt == "csv":
+                    rows = _write_csv(columns, chunks, tmp_path, compression)
+                else:
+                    rows = _write_parquet(columns, integer_columns, chunks, tmp_path, compression)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+
+        if incremental:
+            # Short transaction of its own, once the file is in place
+            repository.set_export_watermark(table, consumer, max(since, upper))
+        written[table] = rows
+        logger.info(f"Exported {rows} {table} rows to {path}")
+    return written
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export logged messages and misinformation claims")
+    parser.add_argument("--filename", default="mpox_bot_data.csv", help="Suffix of the output file names")
+    parser.add_argument("--format", default="csv", choices=["csv", "parquet"])
+    parser.add_argument("--compression", default=None, help="csv: gzip or zstd; parquet: any Parquet codec")
+    parser.add_argument("--incremental", action="store_true", help="Only rows added since the last export")
+    parser.add_argument("--consumer", default="default", help="Watermark name for incremental exports")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    export_tables(args.filename, args.format, args.compression, args.incremental, args.consumer)
+
+if __name__ == "__main__":
+    main()
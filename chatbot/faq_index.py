@@ -0,0 +1,116 @@
+import os
+import hashlib
+import logging
+
+import numpy as np
+
+from chatbot.embedding_store import EmbeddingStore, cached_embeddings
+
+try:
+    import hnswlib
+except ImportError:  # Optional: only needed for the approximate backend
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+# Corpora at least this large use the approximate index when backend="auto"
+ANN_MIN_ROWS = int(os.getenv("FAQ_ANN_MIN_ROWS", "20000"))
+
+class ExactIndex:
+    """Brute-force inner product over an L2-normalized EmbeddingStore (exact cosine top-k)"""
+
+    backend = "exact"
+
+    def __init__(self, store):
+        self.store = store
+
+    def __len__(self):
+        return len(self.store)
+
+    def search(self, query, k=3):
+        """Return (indices, scores) of the k most similar rows, best first"""
+        scores = self.store.scores(query)
+        k = min(k, len(scores))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return top, scores[top]
+
+    def save(self, path):
+        pass  # Rebuilt from the embedding store
+
+class HNSWIndex:
+    """Approximate top-k (HNSW graph, inner-product space) for large corpora"""
+
+    backend = "hnsw"
+
+    def __init__(self, store, path=None, m=16, ef_construction=200, ef_search=64):
+        if hnswlib is None:
+            raise ImportError("The 'hnsw' FAQ index backend requires the hnswlib package")
+        self.store = store
+        self._index = hnswlib.Index(space="ip", dim=store.dim)
+        if path and os.path.exists(path):
+            self._index.load_index(path, max_elements=len(store))
+        else:
+            self._index.init_index(max_elements=len(store), ef_construction=ef_construction, M=m)
+            self._index.add_items(store.as_float32(), np.arange(len(store)))
+        self._index.set_ef(ef_search)
+
+    def __len__(self):
+        return len(self.store)
+
+    def search(self, query, k=3):
+        """Return (indices, scores) of the k most similar rows, best first"""
+        k = min(k, len(self.store))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        labels, distances = self._index.knn_query(query, k=k)
+        # hnswlib's "ip" distance is 1 - inner product
+        return labels[0].astype(np.int64), (1.0 - distances[0]).astype(np.float32)
+
+    def save(self, path):
+        if not os.path.exists(path):
+            self._index.save_index(path)
+
+def corpus_hash(texts, model_name):
+    """Content hash of the corpus and encoder, used to name persisted files"""
+    digest = hashlib.sha256(model_name.encode("utf-8"))
+    for text in texts:
+        digest.update(b"\0" + str(text).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+def choose_backend(backend, rows):
+    if backend == "auto":
+        return "hnsw" if rows >= ANN_MIN_ROWS and hnswlib is not None else "exact"
+    return backend
+
+def load_faq_index(texts, encoder, model_name, cache_dir=None, backend="auto", embeddings=None):
+    """Build (or reopen) the FAQ index; embeddings are re-encoded only when the corpus changes.
+
+    encoder maps a list of texts to L2-normalized float32 rows. Pass
+    embeddings (array or EmbeddingStore) to skip encoding entirely, e.g.
+    from the corpus artifact. Otherwise they are cached under cache_dir in
+    the memory-mapped embedding store format.
+    """
+    texts = list(texts)
+    backend = choose_backend(backend, len(texts))
+
+    if embeddings is None:
+        store = cached_embeddings("faq", texts, encoder, model_name, cache_dir=cache_dir)
+    elif isinstance(embeddings, EmbeddingStore):
+        store = embeddings
+    else:
+        store = EmbeddingStore.from_array(embeddings)
+
+    if backend == "hnsw":
+        graph_path = os.path.join(cache_dir, f"faq-{corpus_hash(texts, model_name)}.hnsw") if cache_dir else None
+        index = HNSWIndex(store, path=graph_path)
+        if graph_path:
+            index.save(graph_path)
+    elif backend == "exact":
+        index = ExactIndex(store)
+    else:
+        raise ValueError(f"Unknown FAQ index backend: {backend}")
+    logger.info(f"FAQ index: {index.backend} over {len(index)} questions ({store.dtype})")
+    return index
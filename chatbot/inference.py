@@ -0,0 +1,137 @@
+import os
+import time
+import queue
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+
+logger = logging.getLogger(__name__)
+
+# ===== CONFIGURATION =====
+# Model calls allowed to run at once, and how many more may wait for a free slot
+INFERENCE_MAX_WORKERS = int(os.getenv("INFERENCE_MAX_WORKERS", "8"))
+INFERENCE_MAX_QUEUE = int(os.getenv("INFERENCE_MAX_QUEUE", "32"))
+
+# Micro-batching: how many single-item calls to merge, and how long to wait for more
+MICROBATCH_MAX_SIZE = int(os.getenv("MICROBATCH_MAX_SIZE", "16"))
+MICROBATCH_MAX_WAIT_MS = float(os.getenv("MICROBATCH_MAX_WAIT_MS", "5"))
+
+class InferenceQueueFull(Exception):
+    """Raised when every worker is busy and the wait queue is at capacity"""
+
+class InferenceExecutor:
+    """Bounded thread pool that async handlers await model calls on.
+
+    PyTorch releases the GIL during forward passes, so threads give real
+    parallelism while sharing the models loaded in the registry.
+    """
+
+    def __init__(self, max_workers=INFERENCE_MAX_WORKERS, max_queue=INFERENCE_MAX_QUEUE):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        self._in_flight = 0  # Only touched from the event loop thread
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the pool without blocking the event loop"""
+        if self._in_flight >= self.max_workers + self.max_queue:
+            raise InferenceQueueFull(f"{self._in_flight} inference calls already pending")
+
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, partial(fn, *args, **kwargs))
+        finally:
+            self._in_flight -= 1
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+class MicroBatcher:
+    """Merges single-item model calls from concurrent requests into batched calls.
+
+    batch_fn takes a list of items and returns one result per item. Callers
+    submit one item and get a Future; a worker thread collects items until
+    max_batch_size is reached or max_wait_ms has passed since the first one.
+    """
+
+    _STOP = object()
+
+    def __init__(self, batch_fn, max_batch_size=MICROBATCH_MAX_SIZE, max_wait_ms=MICROBATCH_MAX_WAIT_MS, name="microbatcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._worker, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item) -> Future:
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def map(self, items):
+        """Blocking helper: submit every item and wait for all results"""
+        futures = [self.submit(item) for item in items]
+        return [future.result() for future in futures]
+
+    def close(self):
+        self._queue.put((self._STOP, None))
+        self._thread.join()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while batch[-1][0] is not self._STOP and len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while True:
+            batch = self._collect()
+            stop = batch[-1][0] is self._STOP
+            if stop:
+                batch.pop()
+            if batch:
+                self._run(batch)
+            if stop:
+                return
+
+    def _run(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            results = self.batch_fn(items)
+            if len(results) != len(batch):
+                # zip() would leave the extra callers waiting forever
+                raise ValueError(f"Batched call returned {len(results)} results for {len(batch)} items")
+            self.batches += 1
+            self.items += len(items)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            logger.exception(f"Batched call failed for {len(items)} items")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+# Shared executor for the bot process
+inference_executor = InferenceExecutor()
+
+async def run_inference(fn, *args, **kwargs):
+    """Await a blocking model call on the shared inference executor"""
+    return await inference_executor.run(fn, *args, **kwargs)
@@ -0,0 +1,260 @@
+import os
+import time
+import random
+import logging
+import argparse
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from chatbot.intent_router import intent_router, FALLBACK_INTENT, LOG_INTENTS
+from chatbot.repository import INTENT_SOURCE_HEAD
+
+logger = logging.getLogger(__name__)
+
+# ===== CONFIGURATION =====
+INTENT_HEAD_PATH = os.getenv("INTENT_HEAD_PATH", "artifacts/intent-head.npz")
+# Head probability needed to take a message away from the classify_text fallback
+INTENT_HEAD_THRESHOLD = float(os.getenv("INTENT_HEAD_THRESHOLD", "0.85"))
+# Intents with fewer distinct logged messages are left out of training
+INTENT_HEAD_MIN_EXAMPLES = int(os.getenv("INTENT_HEAD_MIN_EXAMPLES", "20"))
+
+# Centroid logits are scaled cosines, so softmax gives usable probabilities
+CENTROID_SCALE = 20.0
+
+# Logged intent name -> the handle_message branch that answers it
+HEAD_ROUTES = {"transmission_info": "transmission_claim"}
+# Predictions that are the fallback itself (misinfo_check runs the same classifier)
+FALLBACK_LABELS = {"misinfo_check"}
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+class IntentHead:
+    """Linear intent classifier over the shared, L2-normalized MiniLM embedding.
+
+    Scoring a message is one (intents x dim) matmul on the embedding the
+    pipeline computes anyway. "centroid" heads use scaled cosines to the
+    per-intent mean embedding; "logreg" heads are softmax regression
+    started from those centroids.
+    """
+
+    def __init__(self, labels, weights, bias, kind="logreg"):
+        self.labels = list(labels)
+        self.weights = np.ascontiguousarray(weights, dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.kind = kind
+
+    def probabilities(self, embeddings):
+        """Intent probabilities for one embedding (k,) or a batch (n, k)"""
+        return _softmax(np.asarray(embeddings, dtype=np.float32) @ self.weights.T + self.bias)
+
+    def predict(self, embedding):
+        """(intent_name, probability) for one embedding"""
+        probs = self.probabilities(embedding)
+        best = int(probs.argmax())
+        return self.labels[best], float(probs[best])
+
+    def predict_batch(self, embeddings):
+        probs = self.probabilities(embeddings)
+        best = probs.argmax(axis=1)
+        return [self.labels[i] for i in best], probs[np.arange(len(best)), best]
+
+    # ===== TRAINING =====
+    @classmethod
+    def fit_centroid(cls, embeddings, labels):
+        names = sorted(set(labels))
+        targets = np.array([names.index(label) for label in labels])
+        centroids = np.stack([embeddings[targets == i].mean(axis=0) for i in range(len(names))])
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+        return cls(names, centroids * CENTROID_SCALE, np.zeros(len(names)), kind="centroid")
+
+    @classmethod
+    def fit_logreg(cls, embeddings, labels, l2=1e-4, epochs=300, lr=0.5):
+        """Class-balanced softmax regression by full-batch gradient descent (with momentum)"""
+        head = cls.fit_centroid(embeddings, labels)
+        targets = np.array([head.labels.index(label) for label in labels])
+        onehot = np.eye(len(head.labels), dtype=np.float32)[targets]
+        # Logged traffic is dominated by a few intents; weight rows so each intent counts equally
+        counts = onehot.sum(axis=0)
+        row_weights = (len(labels) / (len(counts) * counts))[targets][:, None]
+
+        weights, bias = head.weights.copy(), head.bias.copy()
+        velocity_w, velocity_b = np.zeros_like(weights), np.zeros_like(bias)
+        for _ in range(epochs):
+            probs = _softmax(embeddings @ weights.T + bias)
+            error = (probs - onehot) * row_weights / len(labels)
+            velocity_w = 0.9 * velocity_w - lr * (error.T @ embeddings + l2 * weights)
+            velocity_b = 0.9 * velocity_b - lr * error.sum(axis=0)
+            weights += velocity_w
+            bias += velocity_b
+        return cls(head.labels, weights, bias, kind="logreg")
+
+    @classmethod
+    def fit(cls, embeddings, labels, kind="logreg"):
+        if kind == "centroid":
+            return cls.fit_centroid(embeddings, labels)
+        if kind == "logreg":
+            return cls.fit_logreg(embeddings, labels)
+        raise ValueError(f"Unknown intent head kind: {kind}")
+
+    # ===== PERSISTENCE =====
+    def save(self, path=INTENT_HEAD_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, labels=np.array(self.labels), weights=self.weights, bias=self.bias, kind=self.kind)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path=INTENT_HEAD_PATH):
+        with np.load(path) as data:
+            return cls([str(label) for label in data["labels"]], data["weights"], data["bias"], str(data["kind"]))
+
+# ===== SERVING =====
+def gate_fallback(routing, analysis, head=None, threshold=INTENT_HEAD_THRESHOLD):
+    """Reroute a message the keyword router left to the classify_text fallback.
+
+    When the head is confident the message is a cheap intent, routing.intent
+    is changed to the branch that answers it. Returns the (possibly new)
+    intent. Runs on an inference thread: it reads analysis.embedding,
+    which classify_text would have computed anyway.
+    """
+    if head is None:
+        from chatbot.model_registry import get_intent_head
+        head = get_intent_head()
+    if head is None or routing.intent != FALLBACK_INTENT:
+        return routing.intent
+
+    with routing.timed("intent_head"):
+        label, probability = head.predict(analysis.embedding)
+    routing.scores["intent_head"] = probability
+    if label not in FALLBACK_LABELS and probability >= threshold:
+        routing.intent = HEAD_ROUTES.get(label, label)
+        routing.intent_source = INTENT_SOURCE_HEAD
+    return routing.intent
+
+# ===== DATA =====
+def _normalize(text):
+    return " ".join(str(text).lower().split())
+
+def labelled_examples(limit=None, extra_csv=None, min_examples=INTENT_HEAD_MIN_EXAMPLES):
+    """(texts, labels) from the logged Message/Intent tables plus optional hand-labelled CSVs.
+
+    Only keyword-routed messages are read (never the head's own reroutes).
+    Texts are normalized and deduplicated, keeping each text's most frequent
+    label; extra CSVs (columns text,intent) take precedence over the logs.
+    """
+    import pandas as pd
+    from chatbot.repository import get_repository
+
+    votes = defaultdict(Counter)
+    for content, intent_name in get_repository().get_labelled_messages(limit):
+        votes[_normalize(content)][intent_name] += 1
+    examples = {text: counter.most_common(1)[0][0] for text, counter in votes.items() if text}
+    for path in extra_csv or ():
+        for text, intent_name in pd.read_csv(path)[["text", "intent"]].itertuples(index=False):
+            examples[_normalize(text)] = intent_name
+
+    counts = Counter(examples.values())
+    kept = {label for label, count in counts.items() if count >= min_examples}
+    dropped = sorted(set(counts) - kept)
+    if dropped:
+        logger.warning(f"Too few examples to learn {', '.join(dropped)} (need {min_examples})")
+    pairs = sorted((text, label) for text, label in examples.items() if label in kept)
+    return [text for text, _ in pairs], [label for _, label in pairs]
+
+def _encode(texts, batch_size=256):
+    from chatbot.classifier import encode_normalized
+    return np.concatenate([encode_normalized(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)])
+
+def _split(texts, labels, holdout, seed=13):
+    order = list(range(len(texts)))
+    random.Random(seed).shuffle(order)
+    cut = int(len(order) * (1 - holdout))
+    pick = lambda idx: ([texts[i] for i in idx], [labels[i] for i in idx])
+    return pick(order[:cut]), pick(order[cut:])
+
+def train(kind="logreg", path=INTENT_HEAD_PATH, limit=None, extra_csv=None):
+    texts, labels = labelled_examples(limit, extra_csv)
+    if len(set(labels)) < 2:
+        raise ValueError("Need at least two intents with enough logged messages to train a head")
+    head = IntentHead.fit(_encode(texts), labels, kind)
+    head.save(path)
+    logger.info(f"Trained {kind} intent head on {len(texts)} messages ({len(head.labels)} intents): {path}")
+    return head
+
+# ===== BENCHMARK =====
+def _per_message_us(fn, items, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, time.perf_counter() - start)
+    return best / max(len(items), 1) * 1e6
+
+def benchmark(kind="logreg", holdout=0.2, limit=None, extra_csv=None, eval_csv=None, threshold=INTENT_HEAD_THRESHOLD):
+    """Accuracy and latency of the keyword router and an embedding head on held-out labelled messages.
+
+    With eval_csv (columns text,intent) the head trains on all logged
+    messages and both are scored on that file. Otherwise a head is trained
+    on part of the logs and scored on the rest; the logs were labelled by
+    the router, so its accuracy there only measures agreement with itself.
+    """
+    texts, labels = labelled_examples(limit, extra_csv)
+    if eval_csv:
+        import pandas as pd
+        frame = pd.read_csv(eval_csv)
+        train_set = (texts, labels)
+        test_set = ([_normalize(text) for text in frame["text"]], list(frame["intent"]))
+    else:
+        train_set, test_set = _split(texts, labels, holdout)
+    test_texts, test_labels = test_set
+
+    start = time.perf_counter()
+    train_embeddings = _encode(train_set[0])
+    test_embeddings = _encode(test_texts)
+    encode_us = (time.perf_counter() - start) / (len(train_set[0]) + len(test_texts)) * 1e6
+    head = IntentHead.fit(train_embeddings, train_set[1], kind)
+
+    routed = [intent_router.route(text) for text in test_texts]
+    router_labels = [LOG_INTENTS.get(intent, intent) for intent in routed]
+    head_labels, head_probs = head.predict_batch(test_embeddings)
+
+    fallback = [i for i, intent in enumerate(routed) if intent == FALLBACK_INTENT]
+    rerouted = [i for i in fallback if head_labels[i] not in FALLBACK_LABELS and head_probs[i] >= threshold]
+    accuracy = lambda predicted: np.mean([p == t for p, t in zip(predicted, test_labels)]) if test_labels else 0.0
+
+    print(f"{len(train_set[0])} training / {len(test_texts)} test messages, {len(head.labels)} intents ({kind} head)")
+    print(f"{'':22}{'accuracy':>10}{'us/message':>12}")
+    print(f"{'keyword router':22}{accuracy(router_labels):>10.3f}{_per_message_us(intent_router.route, test_texts):>12.1f}")
+    print(f"{'embedding head':22}{accuracy(head_labels):>10.3f}{_per_message_us(head.predict, test_embeddings):>12.1f}")
+    print(f"(MiniLM encoding, shared with the rest of the pipeline: {encode_us:.0f} us/message batched)")
+    correct = sum(head_labels[i] == test_labels[i] for i in rerouted)
+    print(f"Router fallbacks: {len(fallback)}; head would reroute {len(rerouted)} at p >= {threshold} ({correct} correctly)")
+    return head
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train or benchmark the embedding intent head")
+    parser.add_argument("command", choices=["train", "benchmark"])
+    parser.add_argument("--kind", default="logreg", choices=["logreg", "centroid"])
+    parser.add_argument("--limit", type=int, default=None, help="Use only the newest N logged messages")
+    parser.add_argument("--extra-csv", action="append", help="Hand-labelled text,intent CSV to train on (repeatable)")
+    parser.add_argument("--eval-csv", help="benchmark: hand-labelled text,intent CSV to score on")
+    parser.add_argument("--holdout", type=float, default=0.2, help="benchmark: share of logged messages held out")
+    parser.add_argument("--output", default=INTENT_HEAD_PATH)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    from chatbot.database import init_db
+    init_db()
+    if args.command == "train":
+        train(args.kind, args.output, args.limit, args.extra_csv)
+    else:
+        benchmark(args.kind, args.holdout, args.limit, args.extra_csv, args.eval_csv)
+
+if __name__ == "__main__":
+    main()
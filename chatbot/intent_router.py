@@ -0,0 +1,286 @@
+import re
+import time
+from contextlib import contextmanager
+
+from chatbot.text_index import AhoCorasick
+from chatbot.repository import INTENT_SOURCE_ROUTER
+
+# ===== KEYWORD SETS =====
+NEWS_KEYWORDS = ["news", "update", "headline", "recent", "latest", "new", "current"]
+
+GREETINGS = ["hi", "hello", "hey", "good morning", "good afternoon", "good evening", "howdy",
+             "how are you", "how's it going", "what's up", "how do you do", "how are things",
+             "how have you been", "how is everything"]
+
+QUESTION_KEYWORDS = ['what', 'how', 'why', 'when', 'where', 'who', 'is', 'are', 'can', 'does', 'do', 'will']
+
+QUESTION_PHRASES = ["tell me", "explain", "describe", "list", "what is", "what are", "how do", "can you"]
+
+TRANSMISSION_SCENARIOS = [
+    "handshake", "hand shake", "shake hands", "hug", "kiss", "embrace",
+    "surface", "object", "toilet", "bedding", "clothing", "utensil",
+    "air", "breathe", "cough", "sneeze", "respiratory", "aerosol",
+    "water", "pool", "swim", "swimming", "beach", "ocean",
+    "food", "eat", "drink", "animal", "pet"
+]
+
+MISINFO_KEYPHRASES = [
+    "garlic water", "5g", "government hoax", "bill gates", "microchip",
+    "wifi signals", "not real", "fake virus", "planned", "bio weapon"
+]
+
+OFF_TOPIC_KEYWORDS = {
+    "capital", "president", "weather", "sports", "movie", "music",
+    "celebrity", "recipe", "game", "sport", "team", "actor", "actress",
+    "book", "song", "artist", "football", "basketball", "entertainment",
+    "history", "geography", "politics", "economy", "stock", "finance",
+    "recipe", "cook", "food", "restaurant", "travel", "destination",
+    "language", "translate", "currency", "population", "size"
+}
+
+JOKE_TRIGGERS = {
+    "joke", "funny", "humor", "laugh", "hilarious", "comedy",
+    "kidding", "jest", "gag", "pun", "rofl", "lol", "make me laugh",
+    "cheer me up", "tell me something funny", "lighten up"
+}
+
+DISEASE_KEYWORDS = {"pox", "virus", "disease", "illness", "infection"}
+HEALTH_KEYWORDS = {"health", "medical", "clinic", "doctor", "hospital", "patient", "monkeypox", "mpox"}
+VAGUE_TERMS = ["this", "that", "it", "explain", "more", "detail", "tell me"]
+VAGUE_PHRASES = {"tell me", "explain", "what about", "how about", "and"}
+
+RISK_PHRASES = [
+    "safe to", "is it safe", "how safe", "should i worry",
+    "chance of getting", "likely to catch", "risk of",
+    "more dangerous", "less dangerous", "compared to",
+    "versus", "vs "
+]
+COMPARISON_PHRASES = [" vs ", "compared to"]
+COMPARED_DISEASES = ["covid", "chickenpox", "smallpox", "measles", "flu"]
+
+CASUAL_THANKS = {
+    "thanks", "thank", "thx", "tx", "appreciate",
+    "ok", "cool", "lame", "fine", "alright", "got it",
+    "cheers", "kudos", "ty",
+    "hank", "tank", "thnak", "thnks"  # Common misspellings
+}
+
+# Substring features: every keyword of every set is found in one automaton pass
+FEATURE_KEYWORDS = {
+    "joke": JOKE_TRIGGERS,
+    "off_topic_keyword": OFF_TOPIC_KEYWORDS,
+    "disease_keyword": DISEASE_KEYWORDS,
+    "health_keyword": HEALTH_KEYWORDS,
+    "vague_term": VAGUE_TERMS,
+    "misinfo": MISINFO_KEYPHRASES,
+    "risk": RISK_PHRASES,
+    "comparison": COMPARISON_PHRASES,
+    "compared_disease": COMPARED_DISEASES,
+    "symptom": ["symptom", "sign"],
+    "transmission_claim": ["spread", "transmit", "catch", "infect", "exposure", "contact"],
+    "prevention": ["prevent", "avoid", "protection", "safe"],
+    "transmission_scenario": TRANSMISSION_SCENARIOS,
+    "casual": CASUAL_THANKS,
+    "news_keyword": NEWS_KEYWORDS,
+    "mpox": ["mpox", "monkeypox"],
+    "news_verb": ["update", "report", "headline", "show", "give"],
+    "question_phrase": QUESTION_PHRASES,
+    "how_are_you": ["how are you"],
+}
+
+# Regex features: each set is one precompiled alternation (any alternative matching = feature present)
+FEATURE_PATTERNS = {
+    "off_topic_pattern": [
+        r"who (is|are) .+",
+        r"what (is|are) .+",
+        r"where is .+",
+        r"when (was|did) .+",
+        r"how to .+",
+        r"capital of",
+        r"president of",
+        r"leader of",
+        r"population of",
+        r"define ",
+        r"meaning of",
+        r"translate "
+    ],
+    "transmission_explanation": [r"how is mpox (transmitted|spread)"],
+    "transmission_scenario": [
+        r"can you get \w+ from",
+        r"is it safe to",
+        r"risk of.*from",
+        r"transmi(t|ssion).*(through|via|from)",
+        r"spread.*(in|through|at)"
+    ],
+    "greeting": [rf"\b{re.escape(greet)}\b" for greet in GREETINGS],
+}
+
+# ===== ROUTING RULES =====
+def _is_off_topic(features, text):
+    if "off_topic_keyword" in features:
+        return True
+    # Allow disease comparisons
+    if "disease_keyword" in features:
+        return False
+    return "health_keyword" not in features and "off_topic_pattern" in features
+
+def _is_vague(features, text):
+    if not text.strip():
+        return False
+    return text in VAGUE_PHRASES or ("vague_term" in features and len(text.split()) <= 3)
+
+def _is_general_question(features, text):
+    text = text.strip()
+    words = text.split()
+    return text.endswith('?') or (words and words[0] in QUESTION_KEYWORDS) or "question_phrase" in features
+
+# (intent, predicate) in the priority order handle_message answers them
+ROUTES = [
+    ("joke_request", lambda f, t: "joke" in f),
+    ("off_topic", _is_off_topic),
+    ("vague_reference", _is_vague),
+    ("misinfo_check", lambda f, t: "misinfo" in f),
+    ("transmission_explanation", lambda f, t: "transmission_explanation" in f),
+    ("risk_comparison", lambda f, t: {"risk", "comparison", "compared_disease"} <= f),
+    ("symptom_query", lambda f, t: "symptom" in f),
+    ("transmission_claim", lambda f, t: "transmission_claim" in f),
+    ("prevention_info", lambda f, t: "prevention" in f),
+    ("transmission_risk", lambda f, t: "transmission_scenario" in f),
+    ("greeting", lambda f, t: "greeting" in f and bool(t.strip())),
+    ("casual_reply", lambda f, t: "casual" in f),
+    ("news_request", lambda f, t: "news_keyword" in f or {"mpox", "news_verb"} <= f),
+    ("general_question", _is_general_question),
+]
+FALLBACK_INTENT = "classification"
+
+# Intent row each routed intent is logged under (intents not listed log under their own name)
+LOG_INTENTS = {
+    "transmission_explanation": "transmission_info",
+    "transmission_claim": "transmission_info",
+    # The fallback runs the same misinformation classifier as misinfo_check
+    FALLBACK_INTENT: "misinfo_check",
+}
+
+# Classifier verdict that gets the message stored as a misinformation claim
+MISINFORMATION_LABEL = "FALSE ❌"
+
+class RoutingResult:
+    """The routing decision for one message: made once, used for the reply and for the log.
+
+    features are the keyword/pattern features the intent was chosen from.
+    Handlers add what they learn while answering: model confidences in
+    scores, stage latencies (ms) in timings, and the classifier verdict.
+    """
+
+    def __init__(self, intent: str, features: frozenset, timings=None):
+        self.intent = intent
+        # "router", or "head" once chatbot.intent_model.gate_fallback reroutes the message
+        self.intent_source = INTENT_SOURCE_ROUTER
+        self.features = features
+        self.scores = {}
+        self.timings = dict(timings or {})
+        self.label = None
+        self.source_url = None
+
+    @property
+    def log_intent(self) -> str:
+        """Intent name the message and its response are logged under"""
+        return LOG_INTENTS.get(self.intent, self.intent)
+
+    @property
+    def is_misinformation(self) -> bool:
+        return self.label == MISINFORMATION_LABEL
+
+    @contextmanager
+    def timed(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = (time.perf_counter() - start) * 1000
+
+    def record_verdict(self, label, source_url=None, confidence=None, stage="classification"):
+        self.label = label
+        self.source_url = source_url
+        if confidence is not None:
+            self.scores[stage] = confidence
+
+    def __repr__(self):
+        return f"RoutingResult(intent={self.intent!r}, scores={self.scores}, timings={self.timings})"
+
+class IntentRouter:
+    """Keyword/regex intent detection compiled once at startup.
+
+    features() finds every keyword of every set in a single Aho–Corasick
+    pass over the lowercased message (plus one precompiled alternation per
+    regex set), so routing cost does not grow with the number of keywords.
+    route() then applies the priority order to that feature set.
+    """
+
+    def __init__(self, keywords=FEATURE_KEYWORDS, patterns=FEATURE_PATTERNS, routes=ROUTES):
+        self._matcher = AhoCorasick([(kw, feature) for feature, kws in keywords.items() for kw in kws])
+        self._patterns = {feature: re.compile("|".join(f"(?:{p})" for p in pats)) for feature, pats in patterns.items()}
+        self.routes = routes
+
+    def features(self, text: str) -> frozenset:
+        text = text.lower()
+        found = self._matcher.payloads(text)
+        for feature, pattern in self._patterns.items():
+            if feature not in found and pattern.search(text):
+                found.add(feature)
+        return frozenset(found)
+
+    def route(self, text: str, features=None) -> str:
+        """Highest-priority intent for text (FALLBACK_INTENT if none applies)"""
+        if features is None:
+            features = self.features(text)
+        lower = text.lower()
+        for intent, applies in self.routes:
+            if applies(features, lower):
+                return intent
+        return FALLBACK_INTENT
+
+    def decide(self, text: str) -> RoutingResult:
+        """Features and intent for text, with the time routing took"""
+        start = time.perf_counter()
+        features = self.features(text)
+        intent = self.route(text, features)
+        return RoutingResult(intent, features, {"route": (time.perf_counter() - start) * 1000})
+
+intent_router = IntentRouter()
+
+# ===== SINGLE-INTENT HELPERS =====
+def is_joke_request(text: str) -> bool:
+    return "joke" in intent_router.features(text)
+
+def is_off_topic(text: str) -> bool:
+    return _is_off_topic(intent_router.features(text), text.lower())
+
+def classify_off_topic(text: str) -> bool:
+    """Use pattern matching to detect off-topic queries"""
+    return "off_topic_pattern" in intent_router.features(text)
+
+def is_vague_reference(text: str) -> bool:
+    return _is_vague(intent_router.features(text), text.lower())
+
+def is_clear_misinfo(text: str) -> bool:
+    return "misinfo" in intent_router.features(text)
+
+def is_transmission_scenario(text: str) -> bool:
+    return "transmission_scenario" in intent_router.features(text)
+
+def is_risk_query(text: str) -> bool:
+    return "risk" in intent_router.features(text)
+
+def is_greeting(text) -> bool:
+    return bool(text.strip()) and "greeting" in intent_router.features(text)
+
+def is_news_request(text: str) -> bool:
+    features = intent_router.features(text)
+    return "news_keyword" in features or {"mpox", "news_verb"} <= features
+
+def is_casual_thanks(text) -> bool:
+    return "casual" in intent_router.features(text)
+
+def is_general_question(text: str) -> bool:
+    return bool(_is_general_question(intent_router.features(text), text.lower()))
@@ -1,53 +1,64 @@
-import sqlite3
-
-def migrate_database():
-    conn = sqlite3.connect('mpox_bot.db')
-    c = conn.cursor()
-    
-    try:
-        # Add intent_id column to Message table
-        c.execute("PRAGMA table_info(Message)")
-        columns = [col[1] for col in c.fetchall()]
-        if 'intent_id' not in columns:
-            c.execute('''
-                ALTER TABLE Message
-                ADD COLUMN intent_id INTEGER REFERENCES Intent(intent_id)
-            ''')
-            print("Added intent_id column to Message table")
-        
-        # Ensure Intent table exists
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS Intent (
-                intent_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                description TEXT
-            )
-        ''')
-        
-        # Pre-populate intents
-        intents = [
-            ("misinfo_check", "Verification of potential misinformation"),
-            ("transmission_risk", "Questions about transmission scenarios"),
-            ("symptom_query", "Inquiries about mpox symptoms"),
-            ("prevention_info", "Questions about prevention methods"),
-            ("news_request", "Requests for latest mpox news"),
-            ("general_question", "Other health-related questions"),
-            ("joke_request", "Requests for jokes/humor"),
-            ("off_topic", "Non-mpox related queries"),
-            ("greeting", "Initial greetings"),
-            ("casual_reply", "Thank you/casual responses")
-        ]
-        
-        c.executemany('''
-            INSERT OR IGNORE INTO Intent (name, description) VALUES (?, ?)
-        ''', intents)
-        
-        conn.commit()
-        print("Database migration successful")
-    except Exception as e:
-        print(f"Migration failed: {str(e)}")
-    finally:
-        conn.close()
+import argparse
+import logging
+
+from chatbot.database import SQLiteRepository
+from chatbot.migrations import MIGRATIONS, LATEST_VERSION, applied_migrations, run_migrations, schema_version
+from chatbot.postgres_repository import POSTGRES_MIGRATIONS
+from chatbot.repository import get_repository
+
+logger = logging.getLogger(__name__)
+
+def migrate_database(dry_run=False):
+    """Apply pending schema migrations to the configured database"""
+    repository = get_repository()
+    if not isinstance(repository, SQLiteRepository):
+        pending = repository.pending_migrations()
+        if dry_run:
+            for migration in pending:
+                logger.info(f"Would apply {migration.version:03d}_{migration.name}")
+        else:
+            repository.init_schema(auto_migrate=True)
+        return pending
+
+    with repository.pool.connection() as conn:
+        pending = run_migrations(conn, dry_run=dry_run)
+    if not dry_run:
+        # Intents may have changed; refresh the name -> id cache used when logging
+        repository.load_intent_ids()
+    return pending
+
+def print_status():
+    repository = get_repository()
+    if isinstance(repository, SQLiteRepository):
+        migrations = MIGRATIONS
+        with repository.pool.connection() as conn:
+            applied = applied_migrations(conn)
+            version = schema_version(conn)
+    else:
+        # PostgreSQL records the versions it reached, not per-migration checksums
+        migrations = POSTGRES_MIGRATIONS
+        version = repository.schema_version()
+        applied = {m.version for m in migrations if m.version <= version}
+    print(f"Schema version {version} of {LATEST_VERSION}")
+    for migration in migrations:
+        state = "applied" if migration.version in applied else "pending"
+        print(f"  {migration.version:03d}_{migration.name}: {state}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply numbered schema migrations")
+    parser.add_argument("--dry-run", action="store_true", help="List pending migrations without applying them")
+    parser.add_argument("--status", action="store_true", help="Show applied and pending migrations")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.status:
+        print_status()
+        return
+    pending = migrate_database(dry_run=args.dry_run)
+    if not pending:
+        print("Database schema is up to date")
+    elif not args.dry_run:
+        print(f"Applied {len(pending)} migration(s)")
 
 if __name__ == "__main__":
-    migrate_database()
\ No newline at end of file
+    main()
@@ -0,0 +1,409 @@
+import os
+import sqlite3
+import hashlib
+import logging
+
+from chatbot.repository import DEFAULT_INTENTS, ROUTING_INTENTS
+
+logger = logging.getLogger(__name__)
+
+# Rows per transaction when backfilling derived tables from large base tables
+BACKFILL_BATCH_ROWS = int(os.getenv("MIGRATION_BACKFILL_BATCH_ROWS", "5000"))
+# Apply pending migrations at startup; with 0 startup refuses to run on an old schema
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "1") == "1"
+
+class MigrationError(Exception):
+    """Raised when the ledger and the migrations in code disagree"""
+
+class Backfill:
+    """Populates a derived table from `table`, one key range per transaction.
+
+    sql takes (low, high) and must cover rows with low < key <= high. The
+    migration's schema steps record the largest key at that moment; rows
+    added afterwards are maintained by the triggers those steps create, so
+    the backfill never races live writes.
+    """
+
+    def __init__(self, table, key, sql):
+        self.table = table
+        self.key = key
+        self.sql = sql
+
+class AddColumn:
+    """Step adding a column unless the table already has it (ALTER TABLE has no IF NOT EXISTS)"""
+
+    def __init__(self, table, column, definition):
+        self.table = table
+        self.column = column
+        self.sql = f'ALTER TABLE {table} ADD COLUMN {column} {definition}'
+
+    def __call__(self, conn):
+        columns = [col[1] for col in conn.execute(f"PRAGMA table_info({self.table})")]
+        if self.column not in columns:
+            conn.execute(self.sql)
+
+class ExecuteMany:
+    """Step running one statement for each row of parameters (e.g. seeding a table)"""
+
+    def __init__(self, sql, rows):
+        self.sql = sql
+        self.rows = list(rows)
+
+    def __call__(self, conn):
+        conn.executemany(self.sql, self.rows)
+
+def _normalize_sql(sql):
+    return " ".join(sql.split())
+
+class Migration:
+    """One numbered schema change: ordered steps (SQL, AddColumn or ExecuteMany), then optional backfills.
+
+    Steps must be idempotent, because databases created before the ledger
+    existed replay every step once. The checksum covers the SQL and rows the
+    migration executes, with whitespace normalized: reformatting an applied
+    migration is harmless, changing what it does stops the runner.
+    """
+
+    def __init__(self, version, name, steps=(), backfills=()):
+        self.version = version
+        self.name = name
+        self.steps = list(steps)
+        self.backfills = list(backfills)
+
+    @property
+    def checksum(self):
+        digest = hashlib.sha256(self.name.encode("utf-8"))
+        for step in self.steps:
+            sql = step if isinstance(step, str) else step.sql
+            digest.update(b"\0" + _normalize_sql(sql).encode("utf-8"))
+            if isinstance(step, ExecuteMany):
+                digest.update(repr(step.rows).encode("utf-8"))
+        for backfill in self.backfills:
+            digest.update(f"\0{backfill.table}\0{backfill.key}\0{_normalize_sql(backfill.sql)}".encode("utf-8"))
+        return digest.hexdigest()
+
+# ===== STEPS =====
+INSERT_INTENT = '''
+    INSERT OR IGNORE INTO Intent (name, description, category) VALUES (?, ?, ?)
+'''
+
+# Aggregates kept current by triggers, so dashboards read a handful of rows
+# instead of scanning Message / Misinformation. Each logged row costs one
+# extra upsert on a small table. intent_id 0 stands for "no intent" because
+# NULLs never conflict in a primary key.
+HOUR_BUCKET = "strftime('%Y-%m-%d %H:00:00', {})"
+
+ROLLUP_STEPS = [
+    '''
+    CREATE TABLE IF NOT EXISTS MessageHourly (
+        hour TEXT NOT NULL,
+        intent_id INTEGER NOT NULL,
+        messages INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (hour, intent_id)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS MisinformationStatus (
+        verification_status TEXT PRIMARY KEY,
+        claims INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_message_hourly_insert AFTER INSERT ON Message
+    BEGIN
+        INSERT INTO MessageHourly (hour, intent_id, messages)
+        VALUES ({HOUR_BUCKET.format('NEW.timestamp')}, COALESCE(NEW.intent_id, 0), 1)
+        ON CONFLICT (hour, intent_id) DO UPDATE SET messages = messages + 1;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_message_hourly_delete AFTER DELETE ON Message
+    BEGIN
+        UPDATE MessageHourly SET messages = messages - 1
+        WHERE hour = {HOUR_BUCKET.format('OLD.timestamp')} AND intent_id = COALESCE(OLD.intent_id, 0);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_misinfo_status_insert AFTER INSERT ON Misinformation
+    BEGIN
+        INSERT INTO MisinformationStatus (verification_status, claims)
+        VALUES (COALESCE(NEW.verification_status, ''), 1)
+        ON CONFLICT (verification_status) DO UPDATE SET claims = claims + 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_misinfo_status_update
+    AFTER UPDATE OF verification_status ON Misinformation
+    WHEN COALESCE(OLD.verification_status, '') != COALESCE(NEW.verification_status, '')
+    BEGIN
+        UPDATE MisinformationStatus SET claims = claims - 1
+        WHERE verification_status = COALESCE(OLD.verification_status, '');
+        INSERT INTO MisinformationStatus (verification_status, claims)
+        VALUES (COALESCE(NEW.verification_status, ''), 1)
+        ON CONFLICT (verification_status) DO UPDATE SET claims = claims + 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_misinfo_status_delete AFTER DELETE ON Misinformation
+    BEGIN
+        UPDATE MisinformationStatus SET claims = claims - 1
+        WHERE verification_status = COALESCE(OLD.verification_status, '');
+    END
+    ''',
+]
+
+ROLLUP_BACKFILLS = [
+    Backfill("Message", "message_id", f'''
+        INSERT INTO MessageHourly (hour, intent_id, messages)
+        SELECT {HOUR_BUCKET.format('timestamp')}, COALESCE(intent_id, 0), COUNT(*)
+        FROM Message
+        WHERE message_id > ? AND message_id <= ?
+        GROUP BY 1, 2
+        ON CONFLICT (hour, intent_id) DO UPDATE SET messages = messages + excluded.messages
+    '''),
+    Backfill("Misinformation", "misinfo_id", '''
+        INSERT INTO MisinformationStatus (verification_status, claims)
+        SELECT COALESCE(verification_status, ''), COUNT(*)
+        FROM Misinformation
+        WHERE misinfo_id > ? AND misinfo_id <= ?
+        GROUP BY 1
+        ON CONFLICT (verification_status) DO UPDATE SET claims = claims + excluded.claims
+    '''),
+]
+
+# ===== MIGRATIONS =====
+# Append only. Never edit a migration that has shipped: its checksum is in
+# every deployed ledger, and a mismatch stops the runner.
+MIGRATIONS = [
+    Migration(1, "base_tables", [
+        '''
+        CREATE TABLE IF NOT EXISTS User (
+            user_id TEXT PRIMARY KEY,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS Intent (
+            intent_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            description TEXT,
+            category TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS Message (
+            message_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT REFERENCES User(user_id),
+            content TEXT NOT NULL,
+            intent_id INTEGER REFERENCES Intent(intent_id),
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS Response (
+            response_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            intent_id INTEGER REFERENCES Intent(intent_id),
+            content TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS Misinformation (
+            misinfo_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            content TEXT NOT NULL UNIQUE,
+            verification_status TEXT DEFAULT 'pending',
+            source_url TEXT
+        )
+        ''',
+    ]),
+    Migration(2, "message_intent_id", [AddColumn("Message", "intent_id", "INTEGER REFERENCES Intent(intent_id)")]),
+    # Databases set up by the old migrate_db.py have no category column
+    Migration(3, "intent_category", [AddColumn("Intent", "category", "TEXT")]),
+    Migration(4, "seed_intents", [
+        ExecuteMany(INSERT_INTENT, DEFAULT_INTENTS),
+        ExecuteMany('''
+            UPDATE Intent SET category = ? WHERE name = ? AND category IS NULL
+        ''', [(category, name) for name, _, category in DEFAULT_INTENTS]),
+    ]),
+    Migration(5, "export_watermark", [
+        # Last exported row per table and export consumer (chatbot.export)
+        '''
+        CREATE TABLE IF NOT EXISTS ExportWatermark (
+            table_name TEXT NOT NULL,
+            consumer TEXT NOT NULL,
+            last_id INTEGER NOT NULL,
+            exported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (table_name, consumer)
+        )
+        ''',
+    ]),
+    Migration(6, "analytics_indexes", [
+        # Content B-trees served no query; Misinformation.content is already UNIQUE
+        'DROP INDEX IF EXISTS idx_message_content',
+        'DROP INDEX IF EXISTS idx_misinfo_content',
+        'CREATE INDEX IF NOT EXISTS idx_message_intent_time ON Message(intent_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_message_user_time ON Message(user_id, timestamp)',
+    ]),
+    Migration(7, "hourly_and_status_rollups", ROLLUP_STEPS, ROLLUP_BACKFILLS),
+    Migration(8, "seed_routing_intents", [ExecuteMany(INSERT_INTENT, ROUTING_INTENTS)]),
+    # Who chose Message.intent_id: "router" or "head" (NULL for older rows, all routed by keyword)
+    Migration(9, "message_intent_source", [AddColumn("Message", "intent_source", "TEXT")]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+# ===== LEDGER =====
+LEDGER_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS SchemaMigrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        checksum TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    # Backfills in flight: rows with key <= upper are done once last_id reaches upper
+    '''
+    CREATE TABLE IF NOT EXISTS SchemaMigrationProgress (
+        version INTEGER NOT NULL,
+        table_name TEXT NOT NULL,
+        last_id INTEGER NOT NULL,
+        upper INTEGER NOT NULL,
+        PRIMARY KEY (version, table_name)
+    )
+    ''',
+]
+
+def schema_version(conn):
+    """Highest applied migration, or 0 for a database without a ledger"""
+    try:
+        return conn.execute('SELECT MAX(version) FROM SchemaMigrations').fetchone()[0] or 0
+    except sqlite3.OperationalError:
+        return 0
+
+def applied_migrations(conn):
+    """{version: (name, checksum)} from the ledger"""
+    try:
+        rows = conn.execute('SELECT version, name, checksum FROM SchemaMigrations').fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    return {version: (name, checksum) for version, name, checksum in rows}
+
+def pending_migrations(conn):
+    """Migrations not applied yet; raises MigrationError if an applied one was edited"""
+    applied = applied_migrations(conn)
+    for migration in MIGRATIONS:
+        if migration.version in applied and applied[migration.version][1] != migration.checksum:
+            raise MigrationError(
+                f"Migration {migration.version} ({migration.name}) differs from the one applied to this database"
+            )
+    return [m for m in MIGRATIONS if m.version not in applied]
+
+# ===== RUNNER =====
+def run_migrations(conn, dry_run=False, batch_rows=BACKFILL_BATCH_ROWS):
+    """Apply pending migrations in order and return them.
+
+    Each migration's steps run in one IMMEDIATE transaction, so concurrent
+    runners serialize and a failed step leaves nothing behind. Backfills
+    then run in batches of batch_rows and resume where they stopped after
+    an interruption. With dry_run=True nothing is written.
+    """
+    pending = pending_migrations(conn)
+    if dry_run:
+        for migration in pending:
+            rows = ", ".join(
+                f"{b.table}: {_max_key(conn, b)} rows to backfill" for b in migration.backfills
+            )
+            logger.info(f"Would apply {migration.version:03d}_{migration.name}" + (f" ({rows})" if rows else ""))
+        return pending
+
+    for statement in LEDGER_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+    for migration in pending:
+        _apply(conn, migration, batch_rows)
+    return pending
+
+def _max_key(conn, backfill):
+    try:
+        return conn.execute(f'SELECT COALESCE(MAX({backfill.key}), 0) FROM {backfill.table}').fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+
+def _apply(conn, migration, batch_rows):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if conn.execute('SELECT 1 FROM SchemaMigrations WHERE version = ?', (migration.version,)).fetchone():
+            conn.rollback()  # Another process applied it while we waited for the lock
+            return
+        resuming = conn.execute(
+            'SELECT 1 FROM SchemaMigrationProgress WHERE version = ?', (migration.version,)
+        ).fetchone()
+        if not resuming:
+            logger.info(f"Applying migration {migration.version:03d}_{migration.name}")
+            for step in migration.steps:
+                if isinstance(step, str):
+                    conn.execute(step)
+                else:
+                    step(conn)
+            conn.executemany('''
+                INSERT INTO SchemaMigrationProgress (version, table_name, last_id, upper) VALUES (?, ?, 0, ?)
+            ''', [(migration.version, b.table, _max_key(conn, b)) for b in migration.backfills])
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    for backfill in migration.backfills:
+        _run_backfill(conn, migration.version, backfill, batch_rows)
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute('''
+            INSERT OR IGNORE INTO SchemaMigrations (version, name, checksum) VALUES (?, ?, ?)
+        ''', (migration.version, migration.name, migration.checksum))
+        conn.execute('DELETE FROM SchemaMigrationProgress WHERE version = ?', (migration.version,))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+def _run_backfill(conn, version, backfill, batch_rows):
+    batches = 0
+    while True:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('''
+                SELECT last_id, upper FROM SchemaMigrationProgress WHERE version = ? AND table_name = ?
+            ''', (version, backfill.table)).fetchone()
+            if row is None or row[0] >= row[1]:
+                conn.commit()
+                break
+            last_id, upper = row
+            high = min(last_id + batch_rows, upper)
+            conn.execute(backfill.sql, (last_id, high))
+            conn.execute('''
+                UPDATE SchemaMigrationProgress SET last_id = ? WHERE version = ? AND table_name = ?
+            ''', (high, version, backfill.table))
+            conn.commit()
+            batches += 1
+        except BaseException:
+            conn.rollback()
+            raise
+    if batches:
+        logger.info(f"Backfilled {backfill.table} for migration {version:03d} in {batches} batches")
+
+def ensure_schema(conn, auto_migrate=AUTO_MIGRATE):
+    """Startup check: a single ledger query when the schema is current, otherwise migrate"""
+    version = schema_version(conn)
+    if version >= LATEST_VERSION:
+        return version
+    if not auto_migrate:
+        raise MigrationError(
+            f"Database schema is at version {version}, this code needs {LATEST_VERSION}; run python -m chatbot.migrate_db"
+        )
+    run_migrations(conn)
+    return LATEST_VERSION
@@ -0,0 +1,234 @@
+import os
+import threading
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ===== MODEL NAMES =====
+SEMANTIC_MODEL_NAME = "all-MiniLM-L6-v2"
+FACT_CHECKER_MODEL_NAME = "facebook/bart-large-mnli"
+SMALL_FACT_CHECKER_MODEL_NAME = "typeform/distilbert-base-uncased-mnli"
+SUMMARIZER_MODEL_NAME = "facebook/bart-large-cnn"
+PERPLEXITY_MODEL_NAME = "distilgpt2"
+MYTHBUSTER_MODEL_NAME = "aerynnnn/mpox-mythbuster-bert"
+
+# Models each entry point actually needs at startup. Everything else
+# (distilgpt2 perplexity, mythbuster BERT) is only loaded on first use.
+STARTUP_MANIFEST = {
+    "app": ["semantic", "small_fact_checker", "fact_checker"],
+    "telegram_bot": ["semantic", "small_fact_checker", "fact_checker", "summarizer", "intent_head"],
+}
+
+# Loaded models, keyed by registry name. Each model is loaded at most once per process.
+_MODELS = {}
+_LOCKS = {}
+_LOCKS_GUARD = threading.Lock()
+
+def _get_or_load(name, loader):
+    """Return the cached model, loading it under a per-model lock on first use"""
+    model = _MODELS.get(name)
+    if model is not None:
+        return model
+
+    with _LOCKS_GUARD:
+        lock = _LOCKS.setdefault(name, threading.Lock())
+    with lock:
+        if name not in _MODELS:
+            logger.info(f"Loading model '{name}'")
+            _MODELS[name] = loader()
+    return _MODELS[name]
+
+def loaded_models():
+    """Names of the models loaded so far"""
+    return list(_MODELS)
+
+def preload(entry_point):
+    """Load the models an entry point needs before serving its first request"""
+    accessors = {
+        "semantic": get_semantic_model,
+        "fact_checker": get_fact_checker,
+        "small_fact_checker": get_small_fact_checker,
+        "summarizer": get_summarizer,
+        "perplexity": get_perplexity_model,
+        "mythbuster": get_mythbuster_model,
+        "intent_head": get_intent_head,
+    }
+    for name in STARTUP_MANIFEST[entry_point]:
+        accessors[name]()
+    logger.info(f"Startup models for '{entry_point}' ({INFERENCE_BACKEND}): {', '.join(loaded_models())}")
+
+# ===== INFERENCE BACKEND =====
+# torch: eager fp32 PyTorch. onnx / onnx-int8: ONNX Runtime on the models exported
+# (and for onnx-int8 dynamically quantized) by `python -m chatbot.onnx_export`.
+INFERENCE_BACKENDS = ("torch", "onnx", "onnx-int8")
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "artifacts/onnx")
+
+def onnx_model_path(model_name, backend):
+    """Directory an ONNX export of model_name lives in for the given backend"""
+    return os.path.join(ONNX_MODEL_DIR, "int8" if backend == "onnx-int8" else "fp32", model_name.replace("/", "--"))
+
+def _export_dir(model_name, backend):
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown INFERENCE_BACKEND: {backend} (expected one of {', '.join(INFERENCE_BACKENDS)})")
+    if backend == "torch":
+        return None
+    path = onnx_model_path(model_name, backend)
+    return path if os.path.isdir(path) else None
+
+def _onnx_path(model_name, backend):
+    """Exported model directory to load, or None to load the PyTorch model"""
+    path = _export_dir(model_name, backend)
+    if path is None and backend != "torch":
+        logger.warning(f"No {backend} export of {model_name} at {onnx_model_path(model_name, backend)}; "
+                       f"using PyTorch (see python -m chatbot.onnx_export)")
+    return path
+
+def encoder_id(model_name, backend=INFERENCE_BACKEND):
+    """Name of the encoder the loaders actually serve, e.g. 'all-MiniLM-L6-v2@onnx-int8'.
+
+    Cached embeddings are keyed by it: vectors from the PyTorch model and
+    from an (int8) ONNX export of it are close but not interchangeable.
+    """
+    return model_name if _export_dir(model_name, backend) is None else f"{model_name}@{backend}"
+
+# Key for embeddings produced by get_semantic_model()
+SEMANTIC_ENCODER_ID = encoder_id(SEMANTIC_MODEL_NAME)
+
+def _ort_model(class_name, path, **kwargs):
+    try:
+        import optimum.onnxruntime
+    except ImportError:
+        raise ImportError("ONNX inference backends require optimum[onnxruntime]")
+    return getattr(optimum.onnxruntime, class_name).from_pretrained(path, **kwargs)
+
+def _pipeline(task, model_name, backend, **kwargs):
+    from transformers import pipeline, AutoTokenizer
+    path = _onnx_path(model_name, backend)
+    if path is None:
+        return pipeline(task, model=model_name, **kwargs)
+    ort_class = "ORTModelForSeq2SeqLM" if task == "summarization" else "ORTModelForSequenceClassification"
+    return pipeline(task, model=_ort_model(ort_class, path), tokenizer=AutoTokenizer.from_pretrained(path), **kwargs)
+
+def hub_model_id(model_name):
+    """Hugging Face Hub id; bare sentence-transformers names resolve the way SentenceTransformer does"""
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+class OnnxSentenceEncoder:
+    """MiniLM on ONNX Runtime behind SentenceTransformer's encode() interface.
+
+    all-MiniLM-L6-v2 is BERT followed by mean pooling over the attention
+    mask, so the exported transformer plus that pooling reproduces its
+    embeddings without sentence-transformers' own ONNX support (which needs
+    a newer transformers than requirements.txt pins).
+    """
+
+    def __init__(self, path, max_seq_length=256, batch_size=32):
+        from transformers import AutoTokenizer
+        self.tokenizer = AutoTokenizer.from_pretrained(path)
+        self.model = _ort_model("ORTModelForFeatureExtraction", path)
+        self.max_seq_length = max_seq_length
+        self.batch_size = batch_size
+
+    def encode(self, sentences, batch_size=None, convert_to_numpy=True, normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        batch_size = batch_size or self.batch_size
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(
+                texts[start:start + batch_size], padding=True, truncation=True,
+                max_length=self.max_seq_length, return_tensors="np"
+            )
+            hidden = self.model(**inputs).last_hidden_state
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            batches.append((hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None))
+        embeddings = np.concatenate(batches) if batches else np.zeros((0, self.model.config.hidden_size), dtype=np.float32)
+        if normalize_embeddings:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings[0] if single else embeddings
+
+# ===== LOADERS =====
+# Each takes a backend and returns a fresh instance; the accessors below cache one per process
+def load_semantic_model(backend):
+    path = _onnx_path(SEMANTIC_MODEL_NAME, backend)
+    if path is None:
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(SEMANTIC_MODEL_NAME)
+    return OnnxSentenceEncoder(path)
+
+def load_fact_checker(backend):
+    return _pipeline("text-classification", FACT_CHECKER_MODEL_NAME, backend, top_k=None)
+
+def load_small_fact_checker(backend):
+    return _pipeline("text-classification", SMALL_FACT_CHECKER_MODEL_NAME, backend, top_k=None)
+
+def load_summarizer(backend):
+    return _pipeline("summarization", SUMMARIZER_MODEL_NAME, backend)
+
+def load_perplexity_model(backend):
+    from transformers import GPT2LMHeadModel, GPT2Tokenizer
+    path = _onnx_path(PERPLEXITY_MODEL_NAME, backend)
+    if path is None:
+        model = GPT2LMHeadModel.from_pretrained(PERPLEXITY_MODEL_NAME)
+    else:
+        # Exported without past key values: perplexity needs one full forward pass, not generation
+        model = _ort_model("ORTModelForCausalLM", path, use_cache=False)
+    return GPT2Tokenizer.from_pretrained(PERPLEXITY_MODEL_NAME), model
+
+def load_mythbuster_model(backend):
+    from transformers import BertTokenizer, BertForSequenceClassification
+    path = _onnx_path(MYTHBUSTER_MODEL_NAME, backend)
+    if path is None:
+        model = BertForSequenceClassification.from_pretrained(MYTHBUSTER_MODEL_NAME)
+        model.eval()
+    else:
+        model = _ort_model("ORTModelForSequenceClassification", path)
+    return BertTokenizer.from_pretrained(MYTHBUSTER_MODEL_NAME), model
+
+# Registry name -> (model name, loader); chatbot.onnx_export exports and verifies these
+LOADERS = {
+    "semantic": (SEMANTIC_MODEL_NAME, load_semantic_model),
+    "fact_checker": (FACT_CHECKER_MODEL_NAME, load_fact_checker),
+    "small_fact_checker": (SMALL_FACT_CHECKER_MODEL_NAME, load_small_fact_checker),
+    "summarizer": (SUMMARIZER_MODEL_NAME, load_summarizer),
+    "perplexity": (PERPLEXITY_MODEL_NAME, load_perplexity_model),
+    "mythbuster": (MYTHBUSTER_MODEL_NAME, load_mythbuster_model),
+}
+
+# ===== ACCESSORS =====
+def get_semantic_model():
+    """Shared MiniLM sentence encoder (classifier, FAQ matching, scenarios)"""
+    return _get_or_load("semantic", lambda: load_semantic_model(INFERENCE_BACKEND))
+
+def get_fact_checker():
+    """BART-large-MNLI text-classification pipeline"""
+    return _get_or_load("fact_checker", lambda: load_fact_checker(INFERENCE_BACKEND))
+
+def get_small_fact_checker():
+    """Distilled MNLI text-classification pipeline (second tier of the fact-check cascade)"""
+    return _get_or_load("small_fact_checker", lambda: load_small_fact_checker(INFERENCE_BACKEND))
+
+def get_summarizer():
+    """BART-large-CNN summarization pipeline"""
+    return _get_or_load("summarizer", lambda: load_summarizer(INFERENCE_BACKEND))
+
+def get_perplexity_model():
+    """(tokenizer, model) for the distilgpt2 perplexity checker"""
+    return _get_or_load("perplexity", lambda: load_perplexity_model(INFERENCE_BACKEND))
+
+def get_mythbuster_model():
+    """(tokenizer, model) for the fine-tuned mpox BERT classifier"""
+    return _get_or_load("mythbuster", lambda: load_mythbuster_model(INFERENCE_BACKEND))
+
+def get_intent_head():
+    """Embedding intent head trained by chatbot.intent_model (None until one has been trained).
+
+    A missing head is not cached: one trained while the bot runs is loaded on the next call.
+    """
+    from chatbot.intent_model import IntentHead, INTENT_HEAD_PATH
+    if "intent_head" not in _MODELS and not os.path.exists(INTENT_HEAD_PATH):
+        return None
+    return _get_or_load("intent_head", lambda: IntentHead.load(INTENT_HEAD_PATH))
@@ -0,0 +1,280 @@
+import os
+import re
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# ===== CONFIGURATION =====
+# With 0 every claim the rules leave open goes straight to the large MNLI model
+NLI_CASCADE = os.getenv("NLI_CASCADE", "1") == "1"
+# Tier 1 exits when the closest reference statement is at least this similar,
+# and this much closer than the closest statement of the opposite stance
+NLI_EMBEDDING_EXIT = float(os.getenv("NLI_EMBEDDING_EXIT", "0.85"))
+NLI_EMBEDDING_MARGIN = float(os.getenv("NLI_EMBEDDING_MARGIN", "0.10"))
+# Tier 2 exits when the distilled model supports or refutes the claim with at least this probability
+NLI_SMALL_EXIT = float(os.getenv("NLI_SMALL_EXIT", "0.90"))
+# Reference statements used as NLI premises for each claim
+NLI_EVIDENCE_K = int(os.getenv("NLI_EVIDENCE_K", "2"))
+
+# Reference labels that can serve as premises: a trusted statement that
+# entails the claim supports it, a known false claim that entails it refutes it
+STANCES = {"TRUE ✅": 1, "FALSE ❌": -1}
+
+# Embedding similarity cannot tell a claim from its negation ("mpox is not caused by 5G")
+NEGATION = re.compile(r"\b(not|no|never|none|cannot|without)\b|n't")
+
+TIERS = ("rules", "embedding", "small_nli", "large_nli")
+
+class CascadeStats:
+    """How many claims each tier of the misinformation cascade settled, and the time spent in it.
+
+    Time counts every claim a tier scored, including those it passed on.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._exits = dict.fromkeys(TIERS, 0)
+        self._seconds = dict.fromkeys(TIERS, 0.0)
+
+    def record(self, tier, seconds=0.0, count=1):
+        with self._lock:
+            self._exits[tier] += count
+            self._seconds[tier] += seconds
+
+    def snapshot(self):
+        with self._lock:
+            total = sum(self._exits.values())
+            return {
+                tier: {
+                    "exits": self._exits[tier],
+                    "share": round(self._exits[tier] / total, 3) if total else 0.0,
+                    "ms": round(self._seconds[tier] * 1000, 1),
+                }
+                for tier in TIERS
+            }
+
+cascade_stats = CascadeStats()
+
+# ===== TIER 1: EMBEDDING SIMILARITY =====
+def evidence(store, embedding, k=NLI_EVIDENCE_K):
+    """The k reference statements closest to the claim: [(premise, stance, similarity)]"""
+    sims = store["matrix"].scores(embedding)
+    candidates = []
+    for label, (start, end) in zip(store["labels"], store["spans"]):
+        if label in STANCES:
+            candidates.extend(
+                (store["sentences"][i], STANCES[label], float(sims[i])) for i in range(start, end)
+            )
+    candidates.sort(key=lambda item: item[2], reverse=True)
+    return candidates[:k]
+
+def embedding_verdict(text, store, embedding, threshold=NLI_EMBEDDING_EXIT, margin=NLI_EMBEDDING_MARGIN):
+    """Real / Misinformation when the claim is a near-paraphrase of one stance only, else None"""
+    if NEGATION.search(text.lower()):
+        return None
+    best = {1: -1.0, -1: -1.0}
+    for _, stance, similarity in evidence(store, embedding, k=None):
+        best[stance] = max(best[stance], similarity)
+    stance = 1 if best[1] >= best[-1] else -1
+    if best[stance] >= threshold and best[stance] - best[-stance] >= margin:
+        return "Real" if stance == 1 else "Misinformation"
+    return None
+
+# ===== TIERS 2 AND 3: NLI =====
+def nli_pairs(text, premises):
+    """Pipeline inputs pairing each reference premise with the claim as hypothesis"""
+    return [{"text": premise, "text_pair": text} for premise, _, _ in premises]
+
+def pair_scores(results, premises):
+    """support / refute / neutral probabilities from the most decisive premise"""
+    best = None
+    for item_results, (_, stance, _) in zip(results, premises):
+        flat_results = item_results[0] if isinstance(item_results[0], list) else item_results
+        scores = {res['label'].lower(): res.get('score', 0) for res in flat_results}
+        entail, contradict = scores.get("entailment", 0), scores.get("contradiction", 0)
+        pair = {
+            "support": entail if stance == 1 else contradict,
+            "refute": contradict if stance == 1 else entail,
+            "neutral": scores.get("neutral", 0),
+        }
+        if best is None or max(pair["support"], pair["refute"]) > max(best["support"], best["refute"]):
+            best = pair
+    return best or {"support": 0.0, "refute": 0.0, "neutral": 1.0}
+
+def nli_verdict(scores):
+    """Map support / refute / neutral scores to a verdict"""
+    if scores["refute"] > max(scores["support"], scores["neutral"]):
+        return "Misinformation"
+    elif scores["support"] > max(scores["refute"], scores["neutral"]):
+        return "Real"
+    elif scores["neutral"] > 0.45:
+        return "Uncertain"
+    return "Requires Expert Review"
+
+def small_nli_exit(scores, threshold=NLI_SMALL_EXIT):
+    """Verdict when the distilled model is confident enough to skip the large one, else None"""
+    verdict = nli_verdict(scores)
+    if verdict in ("Real", "Misinformation") and max(scores["support"], scores["refute"]) >= threshold:
+        return verdict
+    return None
+
+# ===== CASCADE =====
+# Each tier records the time it spent, on its own clock, whether or not it settled the claim
+def run_cascade(text, analysis, store, cascade=NLI_CASCADE):
+    """Verdict for a claim the rules left open, escalating embedding -> small NLI -> large NLI"""
+    if cascade:
+        start = time.perf_counter()
+        verdict = embedding_verdict(text, store, analysis.embedding)
+        cascade_stats.record("embedding", time.perf_counter() - start, int(verdict is not None))
+        if verdict is not None:
+            return verdict
+
+    premises = evidence(store, analysis.embedding)
+    pairs = nli_pairs(text, premises)
+    if cascade and analysis.has_nli("small"):
+        start = time.perf_counter()
+        verdict = small_nli_exit(pair_scores(analysis.nli_results(pairs, "small"), premises))
+        cascade_stats.record("small_nli", time.perf_counter() - start, int(verdict is not None))
+        if verdict is not None:
+            return verdict
+
+    start = time.perf_counter()
+    verdict = nli_verdict(pair_scores(analysis.nli_results(pairs, "large"), premises))
+    cascade_stats.record("large_nli", time.perf_counter() - start)
+    return verdict
+
+def run_cascade_batch(texts, analyses, store, small_nli, large_nli, cascade=NLI_CASCADE):
+    """run_cascade for many claims, with one batched model call per NLI tier"""
+    verdicts = [None] * len(texts)
+    if cascade:
+        start = time.perf_counter()
+        for i, (text, analysis) in enumerate(zip(texts, analyses)):
+            verdicts[i] = embedding_verdict(text, store, analysis.embedding)
+        cascade_stats.record("embedding", time.perf_counter() - start, sum(v is not None for v in verdicts))
+
+    premises = {i: evidence(store, analyses[i].embedding) for i, v in enumerate(verdicts) if v is None}
+    pending = list(premises)
+    for tier, nli in (("small_nli", small_nli if cascade else None), ("large_nli", large_nli)):
+        if not pending or nli is None:
+            continue
+        start = time.perf_counter()
+        pairs = [nli_pairs(texts[i], premises[i]) for i in pending]
+        results = iter(nli([pair for item_pairs in pairs for pair in item_pairs]))
+        still_pending = []
+        for i, item_pairs in zip(pending, pairs):
+            scores = pair_scores([next(results) for _ in item_pairs], premises[i])
+            verdicts[i] = small_nli_exit(scores) if tier == "small_nli" else nli_verdict(scores)
+            if verdicts[i] is None:
+                still_pending.append(i)
+        cascade_stats.record(tier, time.perf_counter() - start, len(pending) - len(still_pending))
+        pending = still_pending
+    return verdicts
+
+# ===== EVALUATION =====
+# Hard cases for the cascade: paraphrases, negations and claims close to both stances.
+# (claim, expected verdict); pass --eval-csv (columns text,label) to score other claims.
+EVAL_CLAIMS = [
+    ("Mpox mostly spreads when people have close skin-to-skin contact.", "Real"),
+    ("You can get mpox from touching bedding used by an infected person.", "Real"),
+    ("The smallpox vaccine also helps protect people from mpox.", "Real"),
+    ("Mpox is passed on through direct contact with an infected person's rash.", "Real"),
+    ("Mpox is not caused by 5G radiation.", "Real"),
+    ("Garlic water does not cure mpox.", "Real"),
+    ("Mpox does not spread through WiFi.", "Real"),
+    ("Mpox cannot be prevented by natural remedies alone.", "Real"),
+    ("5G networks are what cause mpox outbreaks.", "Misinformation"),
+    ("Mobile phone signals carry the mpox virus.", "Misinformation"),
+    ("A glass of garlic water a day keeps mpox away.", "Misinformation"),
+    ("Herbal remedies give full protection against mpox.", "Misinformation"),
+    ("Mpox never spreads through physical contact.", "Misinformation"),
+    ("Smallpox vaccines do not protect against mpox at all.", "Misinformation"),
+    ("Mpox can be cured overnight with home remedies.", "Misinformation"),
+    ("You can't catch mpox from skin-to-skin contact.", "Misinformation"),
+]
+
+def bare_verdict(results):
+    """Verdict of the pre-cascade path: the large model classified the claim on its own, with no premise"""
+    flat_results = results[0] if isinstance(results[0], list) else results
+    scores = {res['label'].lower(): res.get('score', 0) for res in flat_results}
+    if scores.get("contradiction", 0) > scores.get("entailment", 0):
+        return "Misinformation"
+    elif scores.get("entailment", 0) > scores.get("contradiction", 0):
+        return "Real"
+    elif scores.get("neutral", 0) > 0.45:
+        return "Uncertain"
+    return "Requires Expert Review"
+
+# "bare": large model on the claim alone (before the cascade); "large": NLI_CASCADE=0; "cascade": NLI_CASCADE=1
+EVAL_MODES = ("bare", "large", "cascade")
+
+def _eval_verdict(text, mode):
+    from chatbot.classifier import analyze, rule_verdict, fact_check, REFERENCE_STORE
+    analysis = analyze(text)
+    verdict = rule_verdict(text, analysis=analysis)
+    if verdict is not None:
+        cascade_stats.record("rules")
+        return verdict
+    if mode == "bare":
+        return bare_verdict(fact_check([text])[0])
+    return run_cascade(text, analysis, REFERENCE_STORE, cascade=mode == "cascade")
+
+def evaluate(claims=EVAL_CLAIMS, modes=EVAL_MODES):
+    """Accuracy and per-claim latency of each fact-check path on labelled claims.
+
+    Claims are checked one at a time, as the bot does, each with a fresh
+    analysis so no mode reuses another's model outputs. Returns
+    {mode: {"accuracy", "p50_ms", "p95_ms", "exits", "verdicts"}}.
+    """
+    import numpy as np
+
+    texts, expected = [text for text, _ in claims], [label for _, label in claims]
+    report = {}
+    for mode in modes:
+        _eval_verdict(texts[0], mode)  # Warm-up, so first-call model setup is not timed
+        before = cascade_stats.snapshot()
+        verdicts, latencies = [], []
+        for text in texts:
+            start = time.perf_counter()
+            verdicts.append(_eval_verdict(text, mode))
+            latencies.append((time.perf_counter() - start) * 1000)
+        after = cascade_stats.snapshot()
+        report[mode] = {
+            "accuracy": float(np.mean([v == e for v, e in zip(verdicts, expected)])),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "exits": {tier: after[tier]["exits"] - before[tier]["exits"] for tier in TIERS},
+            "verdicts": verdicts,
+        }
+    return report
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare the fact-check cascade with the large-model-only and pre-cascade paths")
+    parser.add_argument("--eval-csv", help="Labelled claims to score (columns text,label with Real / Misinformation)")
+    parser.add_argument("--modes", nargs="+", default=list(EVAL_MODES), choices=EVAL_MODES)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    claims = EVAL_CLAIMS
+    if args.eval_csv:
+        import pandas as pd
+        claims = list(pd.read_csv(args.eval_csv)[["text", "label"]].itertuples(index=False, name=None))
+
+    report = evaluate(claims, args.modes)
+    print(f"{len(claims)} labelled claims")
+    print(f"{'':10}{'accuracy':>10}{'p50 ms':>10}{'p95 ms':>10}  exits")
+    for mode, row in report.items():
+        exits = ", ".join(f"{tier} {count}" for tier, count in row["exits"].items() if count)
+        print(f"{mode:10}{row['accuracy']:>10.3f}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}  {exits}")
+    if len(report) > 1:
+        print("Claims where the paths disagree:")
+        for i, (text, label) in enumerate(claims):
+            verdicts = {mode: row["verdicts"][i] for mode, row in report.items()}
+            if len(set(verdicts.values())) > 1:
+                print(f"  [{label}] {text}: " + ", ".join(f"{mode}={verdict}" for mode, verdict in verdicts.items()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+
+import numpy as np
+
+from chatbot.model_registry import LOADERS, INFERENCE_BACKEND, onnx_model_path, hub_model_id
+
+logger = logging.getLogger(__name__)
+
+# ===== CONFIGURATION =====
+# Instruction set the int8 kernels target: avx2, avx512, avx512_vnni or arm64
+ONNX_QUANTIZATION = os.getenv("ONNX_QUANTIZATION", "avx2")
+# Accuracy an exported model must keep against the PyTorch original
+ONNX_VERIFY_MIN_COSINE = float(os.getenv("ONNX_VERIFY_MIN_COSINE", "0.99"))
+ONNX_VERIFY_MIN_AGREEMENT = float(os.getenv("ONNX_VERIFY_MIN_AGREEMENT", "0.95"))
+ONNX_VERIFY_MAX_PERPLEXITY_DRIFT = float(os.getenv("ONNX_VERIFY_MAX_PERPLEXITY_DRIFT", "0.05"))
+ONNX_VERIFY_MIN_SUMMARY_OVERLAP = float(os.getenv("ONNX_VERIFY_MIN_SUMMARY_OVERLAP", "0.8"))
+
+# optimum ORTModel class (and export options) for each transformers model
+EXPORT_CLASSES = {
+    # The bare transformer; OnnxSentenceEncoder applies MiniLM's mean pooling
+    "semantic": ("ORTModelForFeatureExtraction", {}),
+    "fact_checker": ("ORTModelForSequenceClassification", {}),
+    "small_fact_checker": ("ORTModelForSequenceClassification", {}),
+    "summarizer": ("ORTModelForSeq2SeqLM", {}),
+    "perplexity": ("ORTModelForCausalLM", {"use_cache": False}),
+    "mythbuster": ("ORTModelForSequenceClassification", {}),
+}
+
+# ===== VERIFICATION SAMPLES =====
+VERIFY_CLAIMS = [
+    "Mpox spreads mainly through close, skin-to-skin contact.",
+    "Mpox is caused by 5G radiation.",
+    "Drinking garlic water prevents monkeypox.",
+    "Smallpox vaccines provide protection against mpox.",
+    "Mpox can spread through contaminated bedding and towels.",
+    "Mpox spreads through WiFi signals.",
+    "Most people with mpox recover within two to four weeks.",
+    "Mpox is not real, it was planned by the government.",
+    "You can catch mpox from a brief handshake.",
+    "Symptoms include fever, swollen lymph nodes and a rash.",
+    "Pets can get mpox from infected owners.",
+    "Mpox is airborne like measles.",
+]
+VERIFY_PREMISES = [
+    "Mpox transmission occurs via direct contact.",
+    "There is no credible scientific evidence supporting claims like 5G radiation or natural cures.",
+]
+VERIFY_PASSAGES = [
+    "Mpox is an infectious disease caused by the monkeypox virus. It can cause a painful rash, enlarged "
+    "lymph nodes and fever. Most people fully recover, but some get very sick. Mpox spreads from person "
+    "to person through close contact, including touching, kissing and sex, and through contaminated materials.",
+    "Vaccination can help prevent infection. People at high risk should be vaccinated during an outbreak. "
+    "People with mpox should stay at home and isolate until all sores have healed and a new layer of skin "
+    "has formed, cover lesions, and avoid close contact with others.",
+]
+
+# ===== EXPORT =====
+def _optimum():
+    try:
+        import optimum.onnxruntime
+    except ImportError:
+        raise ImportError("Exporting to ONNX requires optimum[onnxruntime]")
+    return optimum.onnxruntime
+
+def export_model(name):
+    """Export one registry model to fp32 ONNX"""
+    from transformers import AutoTokenizer
+
+    model_name, _ = LOADERS[name]
+    path = onnx_model_path(model_name, "onnx")
+    class_name, options = EXPORT_CLASSES[name]
+    model = getattr(_optimum(), class_name).from_pretrained(hub_model_id(model_name), export=True, **options)
+    model.save_pretrained(path)
+    AutoTokenizer.from_pretrained(hub_model_id(model_name)).save_pretrained(path)
+    logger.info(f"Exported {model_name} to {path}")
+    return path
+
+def quantize_model(name, arch=ONNX_QUANTIZATION):
+    """Dynamic int8 copy of the fp32 export: int8 weights, activation scales computed at run time"""
+    ort = _optimum()
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    model_name, _ = LOADERS[name]
+    source, target = onnx_model_path(model_name, "onnx"), onnx_model_path(model_name, "onnx-int8")
+    if not os.path.isdir(source):
+        export_model(name)
+    config = getattr(AutoQuantizationConfig, arch)(is_static=False, per_channel=False)
+
+    # Tokenizer and config files are copied as is; every ONNX graph (encoder, decoder, ...) is quantized in place of its fp32 file
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    shutil.copytree(source, target, ignore=shutil.ignore_patterns("*.onnx", "*.onnx_data"))
+    for root, _, files in os.walk(source):
+        for file_name in files:
+            if file_name.endswith(".onnx"):
+                save_dir = os.path.join(target, os.path.relpath(root, source))
+                ort.ORTQuantizer.from_pretrained(root, file_name=file_name).quantize(config, save_dir=save_dir, file_suffix="")
+    logger.info(f"Quantized {model_name} ({arch}) to {target}")
+    return target
+
+# ===== VERIFICATION =====
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+def _compare_semantic(reference, candidate):
+    (a, ref_s), (b, cand_s) = (_timed(lambda m=m: m.encode(VERIFY_CLAIMS, normalize_embeddings=True)) for m in (reference, candidate))
+    score = float(np.min(np.sum(a * b, axis=1)))
+    return "min cosine", score, score >= ONNX_VERIFY_MIN_COSINE, ref_s, cand_s
+
+def _compare_nli(reference, candidate):
+    pairs = [{"text": premise, "text_pair": claim} for premise in VERIFY_PREMISES for claim in VERIFY_CLAIMS]
+    top = lambda results: [max(item, key=lambda r: r["score"])["label"] for item in results]
+    (a, ref_s), (b, cand_s) = (_timed(lambda p=p: top(p(pairs, top_k=None))) for p in (reference, candidate))
+    score = float(np.mean([x == y for x, y in zip(a, b)]))
+    return "label agreement", score, score >= ONNX_VERIFY_MIN_AGREEMENT, ref_s, cand_s
+
+def _compare_summarizer(reference, candidate):
+    run = lambda p: [out["summary_text"] for out in p(VERIFY_PASSAGES, max_length=60, min_length=10, do_sample=False)]
+    (a, ref_s), (b, cand_s) = (_timed(lambda p=p: run(p)) for p in (reference, candidate))
+    overlaps = []
+    for x, y in zip(a, b):
+        x_words, y_words = set(x.lower().split()), set(y.lower().split())
+        common = len(x_words & y_words)
+        overlaps.append(2 * common / (len(x_words) + len(y_words)) if x_words or y_words else 1.0)
+    score = float(min(overlaps))
+    return "min word overlap", score, score >= ONNX_VERIFY_MIN_SUMMARY_OVERLAP, ref_s, cand_s
+
+def _perplexities(tokenizer_model):
+    import torch
+    tokenizer, model = tokenizer_model
+    values = []
+    for text in VERIFY_CLAIMS:
+        inputs = tokenizer(text, return_tensors="pt")
+        with torch.no_grad():
+            logits = model(**inputs).logits
+        loss = torch.nn.functional.cross_entropy(logits.view(-1, logits.size(-1)), inputs.input_ids.view(-1))
+        values.append(float(torch.exp(loss)))
+    return np.array(values)
+
+def _compare_perplexity(reference, candidate):
+    (a, ref_s), (b, cand_s) = (_timed(lambda m=m: _perplexities(m)) for m in (reference, candidate))
+    score = float(np.max(np.abs(b - a) / a))
+    return "max perplexity drift", score, score <= ONNX_VERIFY_MAX_PERPLEXITY_DRIFT, ref_s, cand_s
+
+def _compare_mythbuster(reference, candidate):
+    import torch
+
+    def predict(tokenizer_model):
+        tokenizer, model = tokenizer_model
+        inputs = tokenizer(VERIFY_CLAIMS, return_tensors="pt", padding=True, truncation=True)
+        with torch.no_grad():
+            return np.asarray(model(**inputs).logits).argmax(axis=1)
+    (a, ref_s), (b, cand_s) = (_timed(lambda m=m: predict(m)) for m in (reference, candidate))
+    score = float(np.mean(a == b))
+    return "label agreement", score, score >= ONNX_VERIFY_MIN_AGREEMENT, ref_s, cand_s
+
+COMPARISONS = {
+    "semantic": _compare_semantic,
+    "fact_checker": _compare_nli,
+    "small_fact_checker": _compare_nli,
+    "summarizer": _compare_summarizer,
+    "perplexity": _compare_perplexity,
+    "mythbuster": _compare_mythbuster,
+}
+
+def _dir_mb(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files) / 2**20
+
+def verify_model(name, backend):
+    """Compare an exported model with the PyTorch original on fixed samples; returns True if it passes"""
+    model_name, loader = LOADERS[name]
+    path = onnx_model_path(model_name, backend)
+    if not os.path.isdir(path):
+        print(f"{name:20} no {backend} export at {path}")
+        return False
+
+    # One warm-up call each, so first-call graph setup is not timed
+    reference, candidate = loader("torch"), loader(backend)
+    COMPARISONS[name](reference, candidate)
+    metric, score, passed, ref_s, cand_s = COMPARISONS[name](reference, candidate)
+    print(
+        f"{name:20} {metric} {score:.4f} {'ok' if passed else 'FAILED'}; "
+        f"{ref_s * 1000:.0f} ms torch vs {cand_s * 1000:.0f} ms {backend} ({ref_s / cand_s:.1f}x); "
+        f"{_dir_mb(path):.0f} MB on disk"
+    )
+    return passed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export models to ONNX (optionally int8) and check them against PyTorch")
+    parser.add_argument("command", choices=["export", "verify"])
+    parser.add_argument("--models", nargs="+", default=list(LOADERS), choices=list(LOADERS))
+    parser.add_argument("--int8", action="store_true", help="export: also write dynamically quantized int8 copies")
+    parser.add_argument("--backend", default=INFERENCE_BACKEND if INFERENCE_BACKEND != "torch" else "onnx-int8",
+                        choices=["onnx", "onnx-int8"], help="verify: which export to check")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "export":
+        for name in args.models:
+            export_model(name)
+            if args.int8:
+                quantize_model(name)
+        return
+
+    failed = [name for name in args.models if not verify_model(name, args.backend)]
+    if failed:
+        # A model without an export directory is served by PyTorch whatever INFERENCE_BACKEND says
+        print(f"Accuracy check failed for: {', '.join(failed)}. Remove their exports to keep them on PyTorch:")
+        for name in failed:
+            print(f"  {onnx_model_path(LOADERS[name][0], args.backend)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+import os
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from chatbot.repository import Repository, DEFAULT_INTENTS, ROUTING_INTENTS, INTENT_SOURCE_ROUTER
+from chatbot.migrations import AUTO_MIGRATE, LATEST_VERSION, ExecuteMany, Migration, MigrationError
+
+try:
+    import asyncpg
+except ImportError:  # Optional: only needed when DATABASE_URL points at PostgreSQL
+    asyncpg = None
+
+logger = logging.getLogger(__name__)
+
+PG_POOL_MIN_SIZE = int(os.getenv("PG_POOL_MIN_SIZE", "2"))
+PG_POOL_MAX_SIZE = int(os.getenv("PG_POOL_MAX_SIZE", "10"))
+
+# Same tables, indexes and rollups as the SQLite schema (PostgreSQL 12+).
+# "User" is a reserved word in PostgreSQL, hence the quotes. Message.user_id
+# has no foreign key: the bot logs messages from users it never stored, which
+# SQLite (with foreign keys off) has always allowed. Misinformation.content is
+# unique through an md5 index because a B-tree entry cannot hold arbitrarily
+# long text.
+POSTGRES_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS "User" (
+    user_id TEXT PRIMARY KEY,
+    username TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    created_at TIMESTAMPTZ DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS Intent (
+    intent_id SERIAL PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    description TEXT,
+    category TEXT
+);
+CREATE TABLE IF NOT EXISTS Message (
+    message_id BIGSERIAL PRIMARY KEY,
+    user_id TEXT,
+    content TEXT NOT NULL,
+    intent_id INTEGER REFERENCES Intent(intent_id),
+    timestamp TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS Response (
+    response_id BIGSERIAL PRIMARY KEY,
+    intent_id INTEGER REFERENCES Intent(intent_id),
+    content TEXT NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS Misinformation (
+    misinfo_id BIGSERIAL PRIMARY KEY,
+    content TEXT NOT NULL,
+    verification_status TEXT DEFAULT 'pending',
+    source_url TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_misinfo_content_md5 ON Misinformation (md5(content));
+CREATE TABLE IF NOT EXISTS ExportWatermark (
+    table_name TEXT NOT NULL,
+    consumer TEXT NOT NULL,
+    last_id BIGINT NOT NULL,
+    exported_at TIMESTAMPTZ DEFAULT now(),
+    PRIMARY KEY (table_name, consumer)
+);
+
+CREATE INDEX IF NOT EXISTS idx_message_intent_time ON Message (intent_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_message_user_time ON Message (user_id, timestamp);
+
+CREATE TABLE IF NOT EXISTS MessageHourly (
+    hour TIMESTAMPTZ NOT NULL,
+    intent_id INTEGER NOT NULL,
+    messages BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (hour, intent_id)
+);
+CREATE TABLE IF NOT EXISTS MisinformationStatus (
+    verification_status TEXT PRIMARY KEY,
+    claims BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION message_hourly_rollup() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO MessageHourly (hour, intent_id, messages)
+        VALUES (date_trunc('hour', NEW.timestamp, 'UTC'), COALESCE(NEW.intent_id, 0), 1)
+        ON CONFLICT (hour, intent_id) DO UPDATE SET messages = MessageHourly.messages + 1;
+        RETURN NEW;
+    END IF;
+    UPDATE MessageHourly SET messages = messages - 1
+    WHERE hour = date_trunc('hour', OLD.timestamp, 'UTC') AND intent_id = COALESCE(OLD.intent_id, 0);
+    RETURN OLD;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION misinfo_status_rollup() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE MisinformationStatus SET claims = claims - 1
+        WHERE verification_status = COALESCE(OLD.verification_status, '');
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO MisinformationStatus (verification_status, claims)
+        VALUES (COALESCE(NEW.verification_status, ''), 1)
+        ON CONFLICT (verification_status) DO UPDATE SET claims = MisinformationStatus.claims + 1;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_message_hourly ON Message;
+CREATE TRIGGER trg_message_hourly AFTER INSERT OR DELETE ON Message
+    FOR EACH ROW EXECUTE FUNCTION message_hourly_rollup();
+
+DROP TRIGGER IF EXISTS trg_misinfo_status ON Misinformation;
+CREATE TRIGGER trg_misinfo_status AFTER INSERT OR DELETE ON Misinformation
+    FOR EACH ROW EXECUTE FUNCTION misinfo_status_rollup();
+
+DROP TRIGGER IF EXISTS trg_misinfo_status_update ON Misinformation;
+CREATE TRIGGER trg_misinfo_status_update AFTER UPDATE OF verification_status ON Misinformation
+    FOR EACH ROW WHEN (OLD.verification_status IS DISTINCT FROM NEW.verification_status)
+    EXECUTE FUNCTION misinfo_status_rollup();
+'''
+
+VERSION_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS Version (
+    version INTEGER PRIMARY KEY
+)
+'''
+
+INSERT_INTENT = '''
+    INSERT INTO Intent (name, description, category) VALUES ($1, $2, $3)
+    ON CONFLICT (name) DO NOTHING
+'''
+
+# Numbered like the SQLite migrations they mirror. PostgreSQL support started
+# at version 7 with one idempotent script, so 7 also brings up databases that
+# recorded an older Version; every later SQLite migration needs a twin here.
+POSTGRES_MIGRATIONS = [
+    Migration(7, "base_schema", [POSTGRES_SCHEMA, ExecuteMany(INSERT_INTENT, DEFAULT_INTENTS)]),
+    Migration(8, "seed_routing_intents", [ExecuteMany(INSERT_INTENT, ROUTING_INTENTS)]),
+    Migration(9, "message_intent_source", ['ALTER TABLE Message ADD COLUMN IF NOT EXISTS intent_source TEXT']),
+]
+
+INSERT_USER = '''
+    INSERT INTO "User" (user_id, username, first_name, last_name)
+    VALUES ($1, $2, $3, $4)
+    ON CONFLICT (user_id) DO UPDATE
+    SET username = excluded.username, first_name = excluded.first_name, last_name = excluded.last_name
+'''
+INSERT_MESSAGE = '''
+    INSERT INTO Message (user_id, content, intent_id, intent_source) VALUES ($1, $2, $3, $4) RETURNING message_id
+'''
+INSERT_RESPONSE = 'INSERT INTO Response (intent_id, content) VALUES ($1, $2)'
+INSERT_MISINFORMATION = '''
+    INSERT INTO Misinformation (content, source_url) VALUES ($1, $2)
+    ON CONFLICT (md5(content)) DO NOTHING
+'''
+
+INTEGER_TYPES = ("int2", "int4", "int8")
+
+def _export_value(value):
+    # Same text as SQLite's CURRENT_TIMESTAMP, so exports match across backends
+    if isinstance(value, datetime):
+        return value.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    return value
+
+class PostgresRepository(Repository):
+    """Repository on PostgreSQL through an asyncpg connection pool.
+
+    The pool lives on a private event loop in a background thread, so the
+    synchronous Repository methods can be called from any thread (the
+    write-behind logger, the inference executor) without touching the bot's
+    own event loop. asyncpg prepares and caches each statement per connection.
+    """
+
+    def __init__(self, dsn, min_size=PG_POOL_MIN_SIZE, max_size=PG_POOL_MAX_SIZE):
+        if asyncpg is None:
+            raise ImportError("A postgresql:// DATABASE_URL requires the asyncpg package")
+        super().__init__()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="postgres-loop", daemon=True)
+        self._thread.start()
+        self.pool = self.run(asyncpg.create_pool(dsn, min_size=min_size, max_size=max_size))
+
+    def run(self, coro):
+        """Run a coroutine on the repository's loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    # ===== SCHEMA =====
+    async def _schema_version(self, conn):
+        if await conn.fetchval("SELECT to_regclass('version')") is None:
+            return 0
+        return await conn.fetchval('SELECT COALESCE(MAX(version), 0) FROM Version')
+
+    async def _init_schema(self, auto_migrate):
+        if POSTGRES_MIGRATIONS[-1].version != LATEST_VERSION:
+            raise MigrationError(f"No PostgreSQL migration brings the schema to version {LATEST_VERSION}")
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                # Serialize setup across replicas starting at the same time
+                await conn.execute('SELECT pg_advisory_xact_lock(hashtext($1))', 'mpox_bot_schema')
+                version = await self._schema_version(conn)
+                if version < LATEST_VERSION and not auto_migrate:
+                    raise MigrationError(
+                        f"Database schema is at version {version}, this code needs {LATEST_VERSION}; run python -m chatbot.migrate_db"
+                    )
+                await conn.execute(VERSION_SCHEMA)
+                for migration in POSTGRES_MIGRATIONS:
+                    if migration.version <= version:
+                        continue
+                    for step in migration.steps:
+                        if isinstance(step, ExecuteMany):
+                            await conn.executemany(step.sql, step.rows)
+                        else:
+                            await conn.execute(step)
+                    await conn.execute('INSERT INTO Version (version) VALUES ($1)', migration.version)
+                    logger.info(f"Applied PostgreSQL migration {migration.version:03d}_{migration.name}")
+        return await self._load_intent_ids()
+
+    async def _load_intent_ids(self):
+        rows = await self.pool.fetch('SELECT name, intent_id FROM Intent')
+        self.intent_ids = {row["name"]: row["intent_id"] for row in rows}
+        return self.intent_ids
+
+    def init_schema(self, auto_migrate=AUTO_MIGRATE):
+        """Apply pending POSTGRES_MIGRATIONS in one transaction (refused when auto_migrate is off) and load intent ids"""
+        return self.run(self._init_schema(auto_migrate))
+
+    async def _fetch_schema_version(self):
+        async with self.pool.acquire() as conn:
+            return await self._schema_version(conn)
+
+    def schema_version(self):
+        """Highest version recorded in Version, or 0 for an empty database"""
+        return self.run(self._fetch_schema_version())
+
+    def pending_migrations(self):
+        version = self.schema_version()
+        return [m for m in POSTGRES_MIGRATIONS if m.version > version]
+
+    def load_intent_ids(self):
+        return self.run(self._load_intent_ids())
+
+    # ===== WRITES =====
+    async def _write_log_batch(self, messages, responses, misinformation):
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                if messages:
+                    await conn.executemany(INSERT_MESSAGE, messages)
+                if responses:
+                    await conn.executemany(INSERT_RESPONSE, responses)
+                if misinformation:
+                    await conn.executemany(INSERT_MISINFORMATION, misinformation)
+
+    def log_user(self, user_id, username=None, first_name=None, last_name=None):
+        self.run(self.pool.execute(INSERT_USER, user_id, username, first_name, last_name))
+
+    def log_message(self, user_id, content, intent_name=None, intent_source=None):
+        return self.run(self.pool.fetchval(INSERT_MESSAGE, user_id, content, self.intent_id(intent_name), intent_source))
+
+    def log_response(self, intent_name, response_content):
+        self.run(self.pool.execute(INSERT_RESPONSE, self.intent_id(intent_name), response_content))
+
+    def log_misinformation(self, content, source_url=None):
+        self.run(self.pool.execute(INSERT_MISINFORMATION, content, source_url))
+
+    def write_log_batch(self, messages=(), responses=(), misinformation=()):
+        messages = [(user_id, content, self.intent_id(name), source) for user_id, content, name, source in messages]
+        responses = [(self.intent_id(name), content) for name, content in responses]
+        self.run(self._write_log_batch(messages, responses, list(misinformation)))
+
+    # ===== QUERIES =====
+    def get_misinformation_stats(self):
+        rows = self.run(self.pool.fetch('''
+            SELECT verification_status, claims
+            FROM MisinformationStatus
+            WHERE claims > 0
+            ORDER BY verification_status
+        '''))
+        return [tuple(row) for row in rows]
+
+    def get_hourly_intent_counts(self, since=None):
+        rows = self.run(self.pool.fetch('''
+            SELECT to_char(h.hour AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:00:00') AS hour, i.name, h.messages
+            FROM MessageHourly h
+            LEFT JOIN Intent i ON i.intent_id = h.intent_id
+            WHERE h.hour >= COALESCE($1::text::timestamp AT TIME ZONE 'UTC', '-infinity') AND h.messages > 0
+            ORDER BY h.hour, i.name
+        ''', since))
+        return [tuple(row) for row in rows]
+
+    def get_labelled_messages(self, limit=None):
+        rows = self.run(self.pool.fetch('''
+            SELECT m.content, i.name
+            FROM Message m
+            JOIN Intent i ON i.intent_id = m.intent_id
+            WHERE m.intent_source IS NULL OR m.intent_source = $1
+            ORDER BY m.message_id DESC
+            LIMIT $2
+        ''', INTENT_SOURCE_ROUTER, limit))
+        return [tuple(row) for row in rows]
+
+    # ===== EXPORT =====
+    async def _acquire(self):
+        return await self.pool.acquire()
+
+    async def _open_export(self, conn, table, key, since):
+        upper = await conn.fetchval(f'SELECT COALESCE(MAX({key}), 0) FROM {table}')
+        statement = await conn.prepare(f'SELECT * FROM {table} WHERE {key} > $1 AND {key} <= $2 ORDER BY {key}')
+        cursor = await statement.cursor(since, upper)
+        return statement.get_attributes(), upper, cursor
+
+    @contextmanager
+    def export_rows(self, table, key, since, chunk_size):
+        conn = self.run(self._acquire())
+        try:
+            # A read-only snapshot: MAX(key) and the rows agree, and writers are never blocked
+            transaction = conn.transaction(isolation="repeatable_read", readonly=True)
+            self.run(transaction.start())
+            try:
+                attributes, upper, cursor = self.run(self._open_export(conn, table, key, since))
+
+                def chunks():
+                    while True:
+                        rows = self.run(cursor.fetch(chunk_size))
+                        if not rows:
+                            return
+                        yield [tuple(_export_value(value) for value in row) for row in rows]
+
+                columns = [attr.name for attr in attributes]
+                integer_columns = {attr.name for attr in attributes if attr.type.name in INTEGER_TYPES}
+                yield columns, integer_columns, upper, chunks()
+            finally:
+                self.run(transaction.rollback())
+        finally:
+            self.run(self.pool.release(conn))
+
+    def get_export_watermark(self, table, consumer):
+        return self.run(self.pool.fetchval(
+            'SELECT last_id FROM ExportWatermark WHERE table_name = $1 AND consumer = $2', table, consumer
+        )) or 0
+
+    def set_export_watermark(self, table, consumer, last_id):
+        self.run(self.pool.execute('''
+            INSERT INTO ExportWatermark (table_name, consumer, last_id, exported_at)
+            VALUES ($1, $2, $3, now())
+            ON CONFLICT (table_name, consumer) DO UPDATE
+            SET last_id = excluded.last_id, exported_at = excluded.exported_at
+        ''', table, consumer, last_id))
+
+    def close(self):
+        if self._loop.is_running():
+            self.run(self.pool.close())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
@@ -0,0 +1,79 @@
+import os
+import json
+import hashlib
+import logging
+
+from chatbot.cache import LRUCache
+from chatbot.model_registry import get_summarizer
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_MIN_WORDS = 100  # Shorter answers are returned as-is
+FAQ_SUMMARY_PATH = os.getenv("FAQ_SUMMARY_PATH", "faq_summaries.json")
+
+# Precomputed summaries of long FAQ answers (content hash -> summary); never evicted
+faq_summaries = {}
+
+# Ad-hoc inputs such as /summarize, bounded and keyed by content hash
+summary_cache = LRUCache(max_entries=int(os.getenv("SUMMARY_CACHE_SIZE", "256")))
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def needs_summary(text) -> bool:
+    return isinstance(text, str) and len(text.split()) > SUMMARY_MIN_WORDS
+
+def summarize(text: str) -> str:
+    """Run BART-large-CNN on one text"""
+    return get_summarizer()(text, max_length=130, min_length=30, do_sample=False)[0]['summary_text']
+
+def cached_summary(text: str) -> str:
+    """Summary from the FAQ table or the ad-hoc cache; only runs the model on a miss"""
+    key = content_hash(text)
+    summary = faq_summaries.get(key) or summary_cache.get(key)
+    if summary is None:
+        summary = summarize(text)
+        summary_cache.set(key, summary)
+    return summary
+
+def precompute_faq_summaries(faq_df, path=FAQ_SUMMARY_PATH):
+    """Summarize every long FAQ answer once, persisting results by content hash.
+
+    Adds a 'summary' column to faq_df (None for answers short enough to send
+    as-is). Answers already present in the file at `path` are not re-summarized.
+    """
+    stored = {}
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            stored = json.load(f)
+    if 'summary' in faq_df.columns:
+        # Already summarized at build time (python -m chatbot.corpus --with-summaries)
+        for answer, summary in zip(faq_df['answer'], faq_df['summary']):
+            if needs_summary(answer) and isinstance(summary, str):
+                stored.setdefault(content_hash(answer), summary)
+
+    summaries = []
+    computed = 0
+    for answer in faq_df['answer']:
+        if not needs_summary(answer):
+            summaries.append(None)
+            continue
+        key = content_hash(answer)
+        if key not in stored:
+            stored[key] = summarize(answer)
+            computed += 1
+        summaries.append(stored[key])
+
+    faq_df['summary'] = summaries
+    faq_summaries.update(stored)
+    if path and computed:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(stored, f)
+    logger.info(f"FAQ summaries ready: {len(stored)} stored, {computed} newly computed")
+    return faq_df
+
+if __name__ == "__main__":
+    # Build-time precomputation: python -m chatbot.summaries
+    logging.basicConfig(level=logging.INFO)
+    from chatbot.data_loader import faq_df
+    precompute_faq_summaries(faq_df)
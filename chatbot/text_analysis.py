@@ -0,0 +1,45 @@
+class TextAnalysis:
+    """Per-request view of a user message: normalized text plus memoized sentence embeddings.
+
+    Every pipeline stage (misinformation prototypes, reference scoring, reasons,
+    FAQ matching, scenario matching) reads the embedding from here, so a message
+    costs one encoder forward pass. MiniLM's tokenizer is uncased, so the
+    lowercased text encodes to the same vector as the original.
+    """
+
+    def __init__(self, text: str, encoder, variants=(), embedding=None, nli=None, small_nli=None):
+        self.text = text
+        self.lower = text.lower()
+        self._encoder = encoder
+        self._nli = {"large": nli, "small": small_nli}
+        self._nli_results = {}
+        self._variants = [v.lower() for v in variants]
+        self._embeddings = {}
+        if embedding is not None:
+            # Already computed by a batched encode (e.g. classify_batch)
+            self._embeddings[self.lower] = embedding
+
+    @property
+    def embedding(self):
+        """L2-normalized embedding of the message itself"""
+        return self.embed(self.lower)
+
+    def embed(self, text: str):
+        """Embedding of the message or a derived form of it (e.g. an expanded query)"""
+        key = text.lower()
+        if key not in self._embeddings:
+            # Encode the message and all known variants together in one batch
+            pending = [t for t in dict.fromkeys([self.lower, *self._variants, key]) if t not in self._embeddings]
+            for t, emb in zip(pending, self._encoder(pending)):
+                self._embeddings[t] = emb
+        return self._embeddings[key]
+
+    def has_nli(self, tier: str) -> bool:
+        return self._nli.get(tier) is not None
+
+    def nli_results(self, pairs, tier="large"):
+        """NLI label scores for premise/hypothesis pairs from the "small" or "large" fact checker, computed at most once"""
+        key = (tier, tuple((pair["text"], pair["text_pair"]) for pair in pairs))
+        if key not in self._nli_results:
+            self._nli_results[key] = self._nli[tier](pairs)
+        return self._nli_results[key]
@@ -0,0 +1,90 @@
+from collections import deque
+
+class AhoCorasick:
+    """Multi-pattern substring matcher (Aho–Corasick automaton).
+
+    Finds every pattern occurring in a text in one pass over the text, so
+    lookup cost depends on the text length, not on how many patterns there are.
+    Each pattern carries a payload that is returned with its matches.
+    """
+
+    def __init__(self, patterns=()):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]  # Patterns ending exactly at this state
+        self._dict_link = [0]  # Nearest suffix state with output (0 = none)
+        self._empty = []  # Payloads of empty patterns, which match any text
+        self._built = False
+        for pattern in patterns:
+            if isinstance(pattern, tuple):
+                self.add(*pattern)
+            else:
+                self.add(pattern)
+        if patterns:
+            self.build()
+
+    def __len__(self):
+        return sum(len(out) for out in self._output) + len(self._empty)
+
+    def add(self, pattern: str, payload=None):
+        if payload is None:
+            payload = pattern
+        if not pattern:
+            self._empty.append(payload)
+            return
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._dict_link.append(0)
+            state = nxt
+        self._output[state].append((pattern, payload))
+        self._built = False
+
+    def build(self):
+        """Compute failure links (breadth-first); must run after the last add()"""
+        queue = deque(self._goto[0].values())
+        for state in queue:
+            self._fail[state] = 0
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                link = self._fail[nxt]
+                self._dict_link[nxt] = link if self._output[link] else self._dict_link[link]
+                queue.append(nxt)
+        self._built = True
+        return self
+
+    def iter_matches(self, text: str):
+        """Yield (start, end, pattern, payload) for every (possibly overlapping) occurrence"""
+        if not self._built:
+            self.build()
+        for payload in self._empty:
+            yield 0, 0, "", payload
+        state = 0
+        goto, fail, output, dict_link = self._goto, self._fail, self._output, self._dict_link
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            match_state = state if output[state] else dict_link[state]
+            while match_state:
+                for pattern, payload in output[match_state]:
+                    yield i + 1 - len(pattern), i + 1, pattern, payload
+                match_state = dict_link[match_state]
+
+    def contains_any(self, text: str) -> bool:
+        return next(self.iter_matches(text), None) is not None
+
+    def payloads(self, text: str) -> set:
+        """Payloads of every pattern found in text"""
+        return {payload for _, _, _, payload in self.iter_matches(text)}
@@ -0,0 +1,165 @@
+import os
+import time
+import queue
+import logging
+import threading
+
+from chatbot.database import write_log_batch
+
+logger = logging.getLogger(__name__)
+
+# ===== CONFIGURATION =====
+# Records held in memory; past this, new records are dropped (producers never wait)
+WRITE_BEHIND_MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "10000"))
+# Flush when this many records are pending, or this long after the first one
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "500"))
+WRITE_BEHIND_FLUSH_MS = float(os.getenv("WRITE_BEHIND_FLUSH_MS", "200"))
+# A failed batch (e.g. "database is locked") is retried this many times, doubling the wait from the base delay
+WRITE_BEHIND_RETRIES = int(os.getenv("WRITE_BEHIND_RETRIES", "5"))
+WRITE_BEHIND_RETRY_MS = float(os.getenv("WRITE_BEHIND_RETRY_MS", "100"))
+
+class WriteBehindLogger:
+    """Queues message/response/misinformation records and writes them in batches.
+
+    Handlers call log_message / log_response / log_misinformation, which only
+    enqueue. A writer thread groups records into executemany batches, so the
+    database is written once per batch instead of once per record and its
+    latency never reaches the reply path. Producers run on the event loop, so
+    when the queue is full the record is dropped and counted at once. A batch
+    that fails to write is retried with exponential backoff before its
+    records are counted as failed.
+    """
+
+    _STOP = object()
+    _FLUSH = object()
+
+    def __init__(self, write_fn=write_log_batch, max_queue=WRITE_BEHIND_MAX_QUEUE,
+                 batch_size=WRITE_BEHIND_BATCH_SIZE, flush_ms=WRITE_BEHIND_FLUSH_MS,
+                 retries=WRITE_BEHIND_RETRIES,
+                 retry_ms=WRITE_BEHIND_RETRY_MS, name="db-writer"):
+        self.write_fn = write_fn
+        self.retries = retries
+        self.retry_delay = retry_ms / 1000
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retried = 0
+        self.batches = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._name = name
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # ===== PRODUCERS =====
+    def log_message(self, user_id, content, intent_name=None, intent_source=None):
+        self._put(("message", (user_id, content, intent_name, intent_source)))
+
+    def log_response(self, intent_name, response_content):
+        self._put(("response", (intent_name, response_content)))
+
+    def log_misinformation(self, content, source_url=None):
+        self._put(("misinformation", (content, source_url)))
+
+    def log_routed_message(self, user_id, content, routing, response_content):
+        """Queue one handled message: the message and response under the routed intent, plus the claim if the classifier refuted it"""
+        intent_name = routing.log_intent
+        self.log_message(user_id, content, intent_name, routing.intent_source)
+        self.log_response(intent_name, response_content)
+        if routing.is_misinformation:
+            self.log_misinformation(content, routing.source_url)
+
+    def _put(self, record):
+        self.start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning(f"Write-behind queue full, {self.dropped} log records dropped so far")
+
+    # ===== LIFECYCLE =====
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, name=self._name, daemon=True)
+                self._thread.start()
+
+    def flush(self, timeout=None):
+        """Block until every record queued so far has been written"""
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._queue.put((self._FLUSH, done))
+        done.wait(timeout)
+
+    def close(self):
+        """Write everything still queued, then stop the writer thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put((self._STOP, None))
+        thread.join()
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "retried": self.retried,
+            "batches": self.batches,
+        }
+
+    # ===== WRITER =====
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while batch[-1][0] not in (self._STOP, self._FLUSH) and len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while True:
+            batch = self._collect()
+            control, arg = batch[-1]
+            if control in (self._STOP, self._FLUSH):
+                batch.pop()
+            if batch:
+                self._write(batch)
+            if control is self._FLUSH:
+                arg.set()
+            elif control is self._STOP:
+                return
+
+    def _write(self, batch):
+        grouped = {"message": [], "response": [], "misinformation": []}
+        for kind, row in batch:
+            grouped[kind].append(row)
+        for attempt in range(self.retries + 1):
+            try:
+                self.write_fn(grouped["message"], grouped["response"], grouped["misinformation"])
+                break
+            except Exception as e:
+                if attempt == self.retries:
+                    self.failed += len(batch)
+                    logger.exception(f"Write-behind batch of {len(batch)} log records failed after {attempt + 1} attempts")
+                    return
+                # write_log_batch is one transaction, so a failed attempt wrote nothing and can simply be repeated
+                delay = self.retry_delay * 2 ** attempt
+                self.retried += 1
+                logger.warning(f"Write-behind batch of {len(batch)} log records failed ({e}); retrying in {delay:.2f}s")
+                time.sleep(delay)
+        self.batches += 1
+        self.written += len(batch)
+
+# Shared logger for the bot process
+write_behind = WriteBehindLogger()
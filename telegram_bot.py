@@ -1,32 +1,33 @@
 import os
 import csv
 import uuid
+import asyncio
 import logging
 import random
+import weakref
 from datetime import datetime, timedelta
 import math
 import pandas as pd
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.constants import ChatAction
 from telegram.ext import (
-    ApplicationBuilder, CommandHandler, MessageHandler, CallbackQueryHandler,
+    Application, ApplicationBuilder, CommandHandler, MessageHandler, CallbackQueryHandler,
     ContextTypes, filters, ConversationHandler
 )
-import re
-from transformers import pipeline
 
 # Relative imports
-from chatbot.classifier import classify_text
+from chatbot.classifier import classify_text, analyze, encode_normalized, fact_check, small_fact_check, cascade_stats
 from chatbot.classifier_scenario import classify_scenario
-from chatbot.data_loader import rule_based_check, faq_match, source_check_override
-from chatbot.database import (
-    init_db,
-    log_user,
-    log_message,
-    log_misinformation,
-    log_response
-)
+from chatbot.data_loader import rule_based_check, faq_match, source_check_override, expand_health_query, faq_df
+from chatbot.database import init_db
+from chatbot.intent_router import intent_router, FALLBACK_INTENT
+from chatbot.intent_model import gate_fallback
+from chatbot.write_behind import write_behind
 from chatbot.fetch_mpox_news import fetch_monkeypox_news
+from chatbot.model_registry import preload, get_intent_head
+from chatbot.summaries import cached_summary, needs_summary, precompute_faq_summaries
+from chatbot.inference import run_inference, inference_executor, InferenceQueueFull, MicroBatcher
+from chatbot.cache import VerdictCache
 
 # ===== Hugging Face Spaces Configuration =====
 BOT_TOKEN = os.environ["TELEGRAM_BOT_TOKEN"]  # Get token from HF secrets
@@ -43,8 +44,19 @@ CLARIFY, FOLLOW_UP = range(2)
 # User context storage
 USER_CONTEXT = {}
 
-# Initialize the summarizer pipeline with t5-small model
-summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
+# Micro-batchers: concurrent messages share MiniLM and MNLI forward passes
+encode_batcher = MicroBatcher(encode_normalized, name="encode-batcher")
+small_nli_batcher = MicroBatcher(small_fact_check, name="small-nli-batcher")
+nli_batcher = MicroBatcher(fact_check, name="nli-batcher")
+
+# Verdict caches in front of classify_text / classify_scenario, keyed by normalize_query() text.
+# Set VERDICT_CACHE_NEAR_DUP (e.g. 0.97) to also reuse verdicts of near-identical claims.
+VERDICT_CACHE_SIZE = int(os.getenv("VERDICT_CACHE_SIZE", "2048"))
+VERDICT_CACHE_TTL = float(os.getenv("VERDICT_CACHE_TTL", "3600"))
+VERDICT_CACHE_NEAR_DUP = float(os.environ["VERDICT_CACHE_NEAR_DUP"]) if os.getenv("VERDICT_CACHE_NEAR_DUP") else None
+
+classification_cache = VerdictCache(VERDICT_CACHE_SIZE, VERDICT_CACHE_TTL, VERDICT_CACHE_NEAR_DUP)
+scenario_cache = VerdictCache(VERDICT_CACHE_SIZE, VERDICT_CACHE_TTL, VERDICT_CACHE_NEAR_DUP)
 
 # Logging
 logging.basicConfig(
@@ -90,10 +102,6 @@ RESPONSES = {
     ]
 }
 
-# ===== NEWS DETECTION ADDITION =====
-NEWS_KEYWORDS = ["news", "update", "headline", "recent", "latest", "new", "current"]
-# ===================================
-
 CASUAL_KEYWORDS = [
     "thank you", "thanks", "thx", "thanx", "thank", 
     "appreciate", "cheers", "grateful", "kudos",
@@ -101,46 +109,8 @@ CASUAL_KEYWORDS = [
     "cool", "ok", "fine", "alright", "got it", "awesome"
 ]
 
-GREETINGS = ["hi", "hello", "hey", "good morning", "good afternoon", "good evening", "howdy", 
-             "how are you", "how's it going", "what's up", "how do you do", "how are things",
-             "how have you been", "how is everything"]
-
-QUESTION_KEYWORDS = ['what', 'how', 'why', 'when', 'where', 'who', 'is', 'are', 'can', 'does', 'do', 'will']
-
 RISK_KEYWORDS = ["dangerous", "safe", "risk", "risky", "exposure", "contagious", "infect", "near", "close", "proximity"]
 
-QUESTION_PHRASES = ["tell me", "explain", "describe", "list", "what is", "what are", "how do", "can you"]
-
-# Add to priority handling after transmission
-TRANSMISSION_SCENARIOS = [
-    "handshake", "hand shake", "shake hands", "hug", "kiss", "embrace",
-    "surface", "object", "toilet", "bedding", "clothing", "utensil",
-    "air", "breathe", "cough", "sneeze", "respiratory", "aerosol",
-    "water", "pool", "swim", "swimming", "beach", "ocean",
-    "food", "eat", "drink", "animal", "pet"
-]
-
-MISINFO_KEYPHRASES = [
-    "garlic water", "5g", "government hoax", "bill gates", "microchip",
-    "wifi signals", "not real", "fake virus", "planned", "bio weapon"
-]
-
-# Off-topic detection
-OFF_TOPIC_KEYWORDS = {
-    "capital", "president", "weather", "sports", "movie", "music",
-    "celebrity", "recipe", "game", "sport", "team", "actor", "actress",
-    "book", "song", "artist", "football", "basketball", "entertainment",
-    "history", "geography", "politics", "economy", "stock", "finance",
-    "recipe", "cook", "food", "restaurant", "travel", "destination",
-    "language", "translate", "currency", "population", "size"
-}
-
-JOKE_TRIGGERS = {
-    "joke", "funny", "humor", "laugh", "hilarious", "comedy", 
-    "kidding", "jest", "gag", "pun", "rofl", "lol", "make me laugh",
-    "cheer me up", "tell me something funny", "lighten up"
-}
-
 # ===== CONTEXT MANAGEMENT =====
 def get_user_context(user_id):
     """Get user context with expiration check"""
@@ -168,176 +138,10 @@ def clear_expired_context():
     for user_id in expired_users:
         del USER_CONTEXT[user_id]
 
-# ===== Vague Reference Detection =====
-def is_vague_reference(text: str) -> bool:
-    """Check if message is a vague reference"""
-    if not text.strip():
-        return False
-        
-    text_lower = text.lower()
-    vague_terms = ["this", "that", "it", "explain", "more", "detail", "tell me"]
-    
-    # Special cases for standalone phrases
-    if text_lower in ["tell me", "explain", "what about", "how about", "and"]:
-        return True
-        
-    # Check for short phrases with vague terms
-    return (
-        any(term in text_lower for term in vague_terms) 
-        and len(text.split()) <= 3
-    )
-
-def is_clear_misinfo(text: str) -> bool:
-    text_lower = text.lower()
-    return any(phrase in text_lower for phrase in MISINFO_KEYPHRASES)
-
-def is_transmission_scenario(text: str) -> bool:
-    text_lower = text.lower()
-    
-    # Enhanced scenario detection
-    scenario_patterns = [
-        r"can you get \w+ from",
-        r"is it safe to",
-        r"risk of.*from",
-        r"transmi(t|ssion).*(through|via|from)",
-        r"spread.*(in|through|at)"
-    ]
-    
-    return (
-        any(scenario in text_lower for scenario in TRANSMISSION_SCENARIOS) or
-        any(re.search(pattern, text_lower) for pattern in scenario_patterns)
-    )
-
-# ===== OFF-TOPIC & JOKE HANDLING =====
-def is_off_topic(text: str) -> bool:
-    text_lower = text.lower()
-    
-    # 1. Check for explicit off-topic keywords
-    if any(kw in text_lower for kw in OFF_TOPIC_KEYWORDS):
-        return True
-        
-    # 2. Allow disease comparisons
-    disease_keywords = {"pox", "virus", "disease", "illness", "infection"}
-    if any(kw in text_lower for kw in disease_keywords):
-        return False
-        
-    # 3. Check for absence of health-related keywords
-    health_keywords = {"health", "medical", "clinic", "doctor", "hospital", "patient"}
-    if not any(kw in text_lower for kw in health_keywords | {"monkeypox", "mpox"}):
-        return classify_off_topic(text_lower)
-    
-    return False
-
-def classify_off_topic(text: str) -> bool:
-    """Use pattern matching to detect off-topic queries"""
-    patterns = [
-        r"who (is|are) .+",
-        r"what (is|are) .+",
-        r"where is .+",
-        r"when (was|did) .+",
-        r"how to .+",
-        r"capital of",
-        r"president of",
-        r"leader of",
-        r"population of",
-        r"define ",
-        r"meaning of",
-        r"translate "
-    ]
-    return any(re.search(pattern, text) for pattern in patterns)
-
-def is_joke_request(text: str) -> bool:
-    """Detect requests for jokes"""
-    text_lower = text.lower()
-    # Check for joke keywords
-    if any(trigger in text_lower for trigger in JOKE_TRIGGERS):
-        return True
-        
-    # Check specific patterns
-    patterns = [
-        r"tell me a joke",
-        r"make me laugh",
-        r"cheer me up",
-        r"lighten up",
-        r"say something funny"
-    ]
-    return any(re.search(pattern, text_lower) for pattern in patterns)
-
-# Helpers
-
-def is_risk_query(text: str) -> bool:
-    text_lower = text.lower()
-    risk_phrases = [
-        "safe to", "is it safe", "how safe", "should i worry", 
-        "chance of getting", "likely to catch", "risk of",
-        "more dangerous", "less dangerous", "compared to",  # ADDED
-        "versus", "vs "  # ADDED
-    ]
-    return any(phrase in text_lower for phrase in risk_phrases)
-
-def is_greeting(text):
-    if not text.strip():
-        return False
-        
-    text_lower = text.lower()
-    for greet in GREETINGS:
-        if re.search(rf"\b{re.escape(greet)}\b", text_lower):
-            return True
-    return False
-
 def random_response(category):
     return random.choice(RESPONSES[category])
 
-# ===== NEWS DETECTION =====
-def is_news_request(text: str) -> bool:
-    text_lower = text.lower()
-    news_keyword_present = any(kw in text_lower for kw in NEWS_KEYWORDS)
-    
-    # Always allow news requests without disease keywords in this bot's context
-    if news_keyword_present:
-        return True
-        
-    # Keep optional disease keyword matching
-    return ("mpox" in text_lower or "monkeypox" in text_lower) and any(
-        kw in text_lower for kw in ["update", "report", "headline", "show", "give"]
-    )
-
-def is_casual_thanks(text):
-    text_lower = text.lower()
-    # Convert to set for faster lookups
-    casual_set = {
-        "thanks", "thank", "thx", "tx", "appreciate", 
-        "ok", "cool", "lame", "fine", "alright", "got it",
-        "cheers", "kudos", "ty"
-    }
-    
-    # Check for any keyword match
-    if any(k in text_lower for k in casual_set):
-        return True
-        
-    # Handle common misspellings
-    misspellings = {"hank", "tank", "thnak", "thnks", "thx"}
-    return any(m in text_lower for m in misspellings)
-
-def is_general_question(text: str) -> bool:
-    text_lower = text.lower().strip()
-    
-    # Check for question mark
-    if text_lower.endswith('?'):
-        return True
-        
-    # Check first word
-    first_word = text_lower.split()[0] if text_lower.split() else ""
-    if first_word in QUESTION_KEYWORDS:
-        return True
-        
-    # Check for question phrases anywhere
-    if any(phrase in text_lower for phrase in QUESTION_PHRASES):
-        return True
-        
-    return False
-
-async def handle_vague_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def handle_vague_query(update: Update, context: ContextTypes.DEFAULT_TYPE, reply=None):
     user_id = update.effective_user.id
     user_context = get_user_context(user_id)
     
@@ -354,7 +158,7 @@ async def handle_vague_query(update: Update, context: ContextTypes.DEFAULT_TYPE)
             "Please provide more context or ask a complete question about monkeypox."
         )
     
-    await update.message.reply_text(response)
+    await (reply or update.message.reply_text)(response)
     return CLARIFY
 
 async def handle_clarification(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -432,12 +236,10 @@ def get_short_answer(text):
     if isinstance(text, float) and math.isnan(text):
         return "Information unavailable"
     
-    # Only summarize long text
-    word_count = len(text.split())
-    if word_count > 100:
+    # Only summarize long text; FAQ answers are precomputed, other inputs are cached by content hash
+    if needs_summary(text):
         try:
-            summary = summarizer(text, max_length=130, min_length=30, do_sample=False)
-            return summary[0]['summary_text']
+            return cached_summary(text)
         except Exception as e:
             logger.error(f"Summarization failed: {e}")
             return text[:300] + "..." if len(text) > 300 else text
@@ -489,21 +291,77 @@ def normalize_query(query: str) -> str:
     normalized = query.lower().replace("monkeypox", "mpox")
     return normalized
 
+def _classify_uncached(cache, classify_fn, user_text, analysis):
+    """Runs on the inference executor: near-duplicate lookup, then the model"""
+    embedding = analysis.embedding if cache.near_duplicate_threshold is not None else None
+    if embedding is not None:
+        result = cache.get_similar(embedding)
+        if result is not None:
+            return result
+
+    result = classify_fn(user_text, analysis=analysis)
+    cache.set(normalize_query(user_text), result, embedding=embedding)
+    return result
+
+async def cached_classify(cache, classify_fn, user_text, analysis):
+    """classify_text / classify_scenario behind a verdict cache; exact hits never leave the event loop"""
+    result = cache.get(normalize_query(user_text))
+    if result is not None:
+        return result
+    return await run_inference(_classify_uncached, cache, classify_fn, user_text, analysis)
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     message_text = update.message.text.strip()
     user_id = str(user.id)
     user_text = normalize_query(message_text)
-    lower_text = user_text.lower()
+    # One pass over the message finds every keyword/pattern; the reply and the log both use this decision
+    routing = intent_router.decide(user_text)
+    replies = []
+
+    async def reply(text, **kwargs):
+        replies.append(text)
+        return await update.message.reply_text(text, **kwargs)
+
+    try:
+        return await respond(update, context, user_id, user_text, routing, reply)
+    finally:
+        # --- Database Logging (AFTER processing, whichever branch answered) ---
+        try:
+            response_text = replies[-1] if replies else "No response generated"
+            # Queued; written in batches off the event loop
+            write_behind.log_routed_message(user_id, message_text, routing, response_text)
+            logger.debug(f"Handled message: {routing}")
+        except Exception as e:
+            logger.error(f"Database logging failed: {str(e)}")
+
+async def respond(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id, user_text, routing, reply):
+    """Answer a routed message; every reply goes through reply() so the logged response is what was sent"""
+    intent = routing.intent
+    # Encodes the message (and its FAQ query expansion) once, on first use, for every stage below
+    analysis = analyze(
+        user_text,
+        variants=[expand_health_query(user_text)],
+        encoder=encode_batcher.map,
+        nli=nli_batcher.map,
+        small_nli=small_nli_batcher.map
+    )
     confidence = None
     response_text = "No response generated"
     
     # Clear expired contexts at start
     clear_expired_context()
+
+    # No keyword rule matched: the embedding intent head may claim the message before the classify_text fallback.
+    # Without a trained head there is nothing to run, so no inference slot is taken.
+    if intent == FALLBACK_INTENT:
+        head = get_intent_head()
+        if head is not None:
+            intent = await run_inference(gate_fallback, routing, analysis, head)
     
     # ===== PRIORITY 0: Joke Requests =====
-    if is_joke_request(user_text):
-        await update.message.reply_text(
+    if intent == "joke_request":
+        await reply(
             f"🦠 Here's a health-related joke for you:\n\n"
             f"{random_response('joke')}\n\n"
             f"😄 Now, how can I help with monkeypox information today?"
@@ -511,7 +369,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # ===== PRIORITY 1: Off-Topic Queries =====
-    if is_off_topic(user_text):
+    if intent == "off_topic":
         responses = [
             "🤖 I'm specialized in monkeypox health information. I can help with:\n"
             "- Monkeypox symptoms and prevention\n"
@@ -528,22 +386,23 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "- Understanding transmission risks\n"
             "- Latest monkeypox news"
         ]
-        await update.message.reply_text(random.choice(responses))
+        await reply(random.choice(responses))
         return
     
     # ===== PRIORITY 2: Vague References =====
-    if is_vague_reference(user_text):
-        response_text = "Requesting clarification"
-        return await handle_vague_query(update, context)
+    if intent == "vague_reference":
+        return await handle_vague_query(update, context, reply)
     
     # Add default response for unhandled cases
     if response_text == "No response generated":
         response_text = random_response("fallback")
-        await update.message.reply_text(response_text)
+        await reply(response_text)
     
     # ===== PRIORITY 3: Clear Misinformation =====
-    if is_clear_misinfo(user_text):
-        label, explanation, reason, url, _ = classify_text(user_text)
+    if intent == "misinfo_check":
+        with routing.timed("classification"):
+            label, explanation, reason, url, confidence = await cached_classify(classification_cache, classify_text, user_text, analysis)
+        routing.record_verdict(label, url, confidence)
         response = (
             f"🤖 Prediction: *{label}*\n"
             f"📖 Explanation: {explanation}\n"
@@ -551,7 +410,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         if url:
             response += f"\n🔗 [Source]({url})"
-        await update.message.reply_text(response, parse_mode="Markdown", disable_web_page_preview=True)
+        await reply(response, parse_mode="Markdown", disable_web_page_preview=True)
         
         # Store context properly
         update_user_context(user_id, user_text, "classification", {
@@ -563,14 +422,14 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # ===== PRIORITY 4: Transmission Explanation =====
-    if re.search(r"how is mpox (transmitted|spread)", lower_text):
+    if intent == "transmission_explanation":
         response_text = (
             "Mpox is primarily transmitted through prolonged, close, direct contact with an infected person – "
             "especially via skin-to-skin contact. Although transmission through contaminated surfaces is possible, "
             "it is considerably less common. For more details, please refer to the [CDC Mpox FAQ](https://www.cdc.gov/mpox/index.html) "
             "or [WHO Mpox Q&A](https://www.who.int/news-room/questions-and-answers/item/mpox)."
         )
-        await update.message.reply_text(response_text, parse_mode="Markdown", disable_web_page_preview=True)
+        await reply(response_text, parse_mode="Markdown", disable_web_page_preview=True)
         
         # Store context
         update_user_context(user_id, user_text, "info", {
@@ -579,29 +438,28 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # ===== PRIORITY 5: Risk/Safety Queries =====
-    if is_risk_query(user_text):
-        # Special handling for disease comparisons
-        if " vs " in user_text or "compared to" in user_text:
-            diseases = ["covid", "chickenpox", "smallpox", "measles", "flu"]
-            if any(disease in user_text for disease in diseases):
-                response_text = (
-                    "🔍 *Disease Comparison:*\n\n"
-                    "Mpox vs other diseases:\n"
-                    "• Fatality rate: 1-10% (lower than smallpox)\n"
-                    "• Contagiousness: Less than measles or COVID\n"
-                    "• Severity: Generally milder than smallpox\n\n"
-                    "✅ *Trusted Comparison:*\n"
-                    "🔗 [WHO Mpox vs Smallpox](https://www.who.int/news-room/questions-and-answers/item/monkeypox)\n"
-                    "🔗 [CDC Mpox vs Chickenpox](https://www.cdc.gov/poxvirus/monkeypox/clinicians/faq.html)"
-                )
-                await update.message.reply_text(response_text, parse_mode="Markdown")
-                return
+    # Only disease comparisons get a dedicated answer; other risk queries fall through
+    if intent == "risk_comparison":
+        response_text = (
+            "🔍 *Disease Comparison:*\n\n"
+            "Mpox vs other diseases:\n"
+            "• Fatality rate: 1-10% (lower than smallpox)\n"
+            "• Contagiousness: Less than measles or COVID\n"
+            "• Severity: Generally milder than smallpox\n\n"
+            "✅ *Trusted Comparison:*\n"
+            "🔗 [WHO Mpox vs Smallpox](https://www.who.int/news-room/questions-and-answers/item/monkeypox)\n"
+            "🔗 [CDC Mpox vs Chickenpox](https://www.cdc.gov/poxvirus/monkeypox/clinicians/faq.html)"
+        )
+        await reply(response_text, parse_mode="Markdown")
+        return
 
     # ===== PRIORITY 6: Symptom Queries =====
-    if "symptom" in lower_text or "sign" in lower_text:
-        faq_answer, faq_score = faq_match(user_text)
+    if intent == "symptom_query":
+        with routing.timed("faq"):
+            faq_answer, faq_score = await run_inference(faq_match, user_text, analysis=analysis)
+        routing.scores["faq"] = faq_score
         if faq_answer:
-            summary = get_short_answer(faq_answer)
+            summary = await run_inference(get_short_answer, faq_answer)
             response_text = (
                 "📘 *Informational Answer:*\n\n"
                 f"_{summary}_\n\n"
@@ -616,7 +474,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 "✅ [CDC Mpox FAQ](https://www.cdc.gov/poxvirus/monkeypox/clinicians/faq.html) | "
                 "[WHO Mpox Overview](https://www.who.int/health-topics/monkeypox)"
             )
-        await update.message.reply_text(response_text, parse_mode="Markdown", disable_web_page_preview=True)
+        await reply(response_text, parse_mode="Markdown", disable_web_page_preview=True)
         
         # Store context
         update_user_context(user_id, user_text, "faq", {
@@ -627,12 +485,14 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # ===== PRIORITY 7: Transmission Claims =====
-    if any(kw in lower_text for kw in ["spread", "transmit", "catch", "infect", "exposure", "contact"]):
-        faq_answer, faq_score = faq_match(user_text, threshold=0.6)
+    if intent == "transmission_claim":
+        with routing.timed("faq"):
+            faq_answer, faq_score = await run_inference(faq_match, user_text, threshold=0.6, analysis=analysis)
+        routing.scores["faq"] = faq_score
         
         # Handle cases where no FAQ match was found
         if faq_answer and not pd.isna(faq_answer):
-            summary = get_short_answer(faq_answer)
+            summary = await run_inference(get_short_answer, faq_answer)
             response_text = (
                 "🔄 *Transmission Facts:*\n\n"
                 f"_{summary}_\n\n"
@@ -653,7 +513,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 "🔗 [WHO Transmission](https://www.who.int/news-room/questions-and-answers/item/monkeypox)"
             )
         
-        await update.message.reply_text(response_text, parse_mode="Markdown", disable_web_page_preview=True)
+        await reply(response_text, parse_mode="Markdown", disable_web_page_preview=True)
         
         # Store context
         update_user_context(user_id, user_text, "info", {
@@ -662,11 +522,13 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # ===== PRIORITY 8: Prevention Queries =====
-    if any(kw in lower_text for kw in ["prevent", "avoid", "protection", "safe"]):
-        faq_answer, faq_score = faq_match(user_text, threshold=0.6)  # Lower threshold for prevention
+    if intent == "prevention_info":
+        with routing.timed("faq"):
+            faq_answer, faq_score = await run_inference(faq_match, user_text, threshold=0.6, analysis=analysis)  # Lower threshold for prevention
+        routing.scores["faq"] = faq_score
         
         if faq_answer:
-            summary = get_short_answer(faq_answer)
+            summary = await run_inference(get_short_answer, faq_answer)
             response_text = (
                 "🛡️ *Prevention Guide:*\n\n"
                 f"_{summary}_\n\n"
@@ -686,7 +548,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 "🔗 [WHO Protection](https://www.who.int/news-room/questions-and-answers/item/monkeypox)"
             )
         
-        await update.message.reply_text(response_text, parse_mode="Markdown", disable_web_page_preview=True)
+        await reply(response_text, parse_mode="Markdown", disable_web_page_preview=True)
         
         # Store context
         update_user_context(user_id, user_text, "info", {
@@ -695,9 +557,11 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # ===== PRIORITY 9: Transmission Scenarios =====
-    if is_transmission_scenario(user_text):
+    if intent == "transmission_risk":
         # First try scenario classification
-        label, explanation, reason, url, confidence = classify_scenario(user_text)
+        with routing.timed("scenario"):
+            label, explanation, reason, url, confidence = await cached_classify(scenario_cache, classify_scenario, user_text, analysis)
+        routing.scores["scenario"] = confidence
         
         if confidence > 0.65:  # Valid scenario match
             response = (
@@ -709,19 +573,22 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 f"✅ *Trusted Sources:*\n"
                 f"🔗 [CDC Transmission Guide]({url})"
             )
-            await update.message.reply_text(response, parse_mode="Markdown")
+            await reply(response, parse_mode="Markdown")
             return
         
         # Fallback to FAQ if scenario match is weak
-        faq_answer, faq_score = faq_match(user_text, threshold=0.5)
+        with routing.timed("faq"):
+            faq_answer, faq_score = await run_inference(faq_match, user_text, threshold=0.5, analysis=analysis)
+        routing.scores["faq"] = faq_score
         if faq_answer:
+            summary = await run_inference(get_short_answer, faq_answer)
             response_text = (
                 "🔄 *Transmission Facts:*\n\n"
-                f"{get_short_answer(faq_answer)}\n\n"
+                f"{summary}\n\n"
                 "✅ *Trusted Sources:*\n"
                 "🔗 [CDC Transmission Guide](https://www.cdc.gov/poxvirus/monkeypox/transmission.html)"
             )
-            await update.message.reply_text(response_text, parse_mode="Markdown")
+            await reply(response_text, parse_mode="Markdown")
             return
         
         # Ultimate fallback
@@ -734,11 +601,11 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "✅ *Detailed Guidelines:*\n"
             "🔗 [CDC Transmission](https://www.cdc.gov/poxvirus/monkeypox/transmission.html)"
         )
-        await update.message.reply_text(response_text, parse_mode="Markdown")
+        await reply(response_text, parse_mode="Markdown")
         return
     
     # ===== PRIORITY 10: Greetings =====
-    if is_greeting(user_text):
+    if intent == "greeting":
         # Add conversational response option
         conversational_responses = [
             "😊 I'm just a bot, but I'm functioning well! How can I help with monkeypox info today?",
@@ -746,23 +613,23 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "👋 I'm here and ready to help with any monkeypox questions you have!"
         ]
         
-        if "how are you" in lower_text:
-            await update.message.reply_text(random.choice(conversational_responses))
+        if "how_are_you" in routing.features:
+            await reply(random.choice(conversational_responses))
         else:
-            await update.message.reply_text(random_response("greeting"))
+            await reply(random_response("greeting"))
         return  # No context storage for greetings
 
     # ===== PRIORITY 11: Casual Replies =====
-    if is_casual_thanks(message_text):  # Use original text for thanks detection
+    if intent == "casual_reply":
         response_text = random_response("casual_reply")
-        await update.message.reply_text(response_text)
+        await reply(response_text)
         return  # No context storage for casual replies
 
     # ===== PRIORITY 12: News Requests =====
-    if is_news_request(user_text):
+    if intent == "news_request":
         news_list = fetch_monkeypox_news()
         if not news_list:
-            await update.message.reply_text("🚫 Couldn't fetch the latest news right now. Please try again later.")
+            await reply("🚫 Couldn't fetch the latest news right now. Please try again later.")
             return
 
         title, news_url = news_list[0]
@@ -770,7 +637,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"📰 *Latest Headline:*\n{title}\n"
             f"🔗 [Read more]({news_url})"
         )
-        await update.message.reply_text(response_text, parse_mode="Markdown", disable_web_page_preview=True)
+        await reply(response_text, parse_mode="Markdown", disable_web_page_preview=True)
         
         # Store context
         update_user_context(user_id, user_text, "news", {
@@ -780,14 +647,13 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # ===== PRIORITY 13: General FAQ Queries =====
-    if is_general_question(user_text):
-        # Double-check for vague references
-        if is_vague_reference(user_text):
-            return await handle_vague_query(update, context)
-            
-        faq_answer, faq_score = faq_match(user_text)
+    if intent == "general_question":
+        # Vague references were already routed at priority 2
+        with routing.timed("faq"):
+            faq_answer, faq_score = await run_inference(faq_match, user_text, analysis=analysis)
+        routing.scores["faq"] = faq_score
         if faq_answer:
-            summary = get_short_answer(faq_answer)
+            summary = await run_inference(get_short_answer, faq_answer)
             response_text = (
                 "📘 *Informational Answer:*\n\n"
                 f"_{summary}_\n\n"
@@ -802,7 +668,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 "✅ [CDC Mpox FAQ](https://www.cdc.gov/poxvirus/monkeypox/clinicians/faq.html) | "
                 "[WHO Mpox Overview](https://www.who.int/health-topics/monkeypox)"
             )
-        await update.message.reply_text(response_text, parse_mode="Markdown", disable_web_page_preview=True)
+        await reply(response_text, parse_mode="Markdown", disable_web_page_preview=True)
         
         # Store context
         update_user_context(user_id, user_text, "faq", {
@@ -814,9 +680,11 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # ===== PRIORITY 14: Fallback Classification =====
     try:
-        label, explanation_text, reason_text, url, _ = classify_text(user_text)
+        with routing.timed("classification"):
+            label, explanation_text, reason_text, url, confidence = await cached_classify(classification_cache, classify_text, user_text, analysis)
+        routing.record_verdict(label, url, confidence)
         if label.lower() == "invalid input":
-            await update.message.reply_text(
+            await reply(
                 "⚠️ Sorry, I couldn't understand that. Please ask or state something clearly.",
                 parse_mode="Markdown"
             )
@@ -830,7 +698,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if url:
             result_text += f"\n🔗 [Source]({url})"
             
-        await update.message.reply_text(result_text, parse_mode="Markdown", disable_web_page_preview=True)
+        await reply(result_text, parse_mode="Markdown", disable_web_page_preview=True)
         
         # Store context
         update_user_context(user_id, user_text, "classification", {
@@ -840,54 +708,16 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "source_url": url
         })
         
+    except InferenceQueueFull:
+        # error_handler tells the user the bot is busy
+        raise
     except Exception as e:
         logger.exception("Error during classification")
-        await update.message.reply_text(
+        await reply(
             "😕 Oops! Something went wrong while processing your request. Please try again.",
             parse_mode="Markdown"
         )
 
-# --- Database Logging (AFTER processing) ---
-    try:
-        # Determine intent category
-        intent_name = "unknown"
-        response_text = response_text 
-
-        if is_joke_request(user_text):
-            intent_name = "greeting"
-        elif is_off_topic(user_text):
-            intent_name = "off_topic"
-        elif is_clear_misinfo(user_text):
-            intent_name = "misinfo_check"
-        elif is_news_request(user_text):
-            intent_name = "news_request"
-        elif is_transmission_scenario(user_text):
-            intent_name = "transmission_risk"
-        elif "symptom" in user_text.lower():
-            intent_name = "symptom_query"
-        elif any(kw in user_text.lower() for kw in ["prevent", "avoid", "protection"]):
-            intent_name = "prevention_info"
-        elif is_greeting(user_text):
-            intent_name = "greeting"
-        else:
-            intent_name = "general_question"
-
-    # Log message with intent
-        message_id = log_message(user_id, message_text, intent_name)
-        
-        # Log response - now safe
-        log_response(intent_name, response_text)
-        
-        # Log misinformation if detected
-        if 'label' in locals() and label == "FALSE ❌":
-            log_misinformation(
-                content=message_text,
-                source_url=url if 'url' in locals() else None
-            )
-            
-    except Exception as e:
-        logger.error(f"Database logging failed: {str(e)}")
-
 async def summarize_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await send_typing(context, update.effective_chat.id)
     input_text = update.message.text.replace('/summarize', '').strip()
@@ -896,13 +726,67 @@ async def summarize_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("✍️ Please provide some text to summarize. Example:\n`/summarize Monkeypox is...`", parse_mode="Markdown")
         return
 
-    summary = get_short_answer(input_text)
+    summary = await run_inference(get_short_answer, input_text)
     await update.message.reply_text(f"📄 *Summary:*\n{summary}", parse_mode="Markdown")
 
+async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
+    if isinstance(context.error, InferenceQueueFull):
+        logger.warning(f"Inference queue full: {context.error}")
+        if isinstance(update, Update) and update.message:
+            await update.message.reply_text("⏳ I'm handling a lot of requests right now. Please try again in a moment.")
+        return
+    logger.error("Unhandled error while processing update", exc_info=context.error)
+
+class ChatSerializedApplication(Application):
+    """Processes updates concurrently across chats, but one at a time within a chat.
+
+    The ConversationHandler state and user_contexts are per chat/user, so two
+    messages from the same chat must not interleave in handle_message /
+    handle_clarification; other chats keep awaiting the inference executor in parallel.
+    """
+
+    def __init__(self, **kwargs):
+        if not hasattr(Application, "_Application__process_update_wrapper"):
+            raise RuntimeError("ChatSerializedApplication needs python-telegram-bot 20.3 (see requirements.txt)")
+        super().__init__(**kwargs)
+        self._chat_locks = weakref.WeakValueDictionary()
+
+    def _chat_lock(self, update):
+        chat_key = None
+        if isinstance(update, Update):
+            chat = update.effective_chat or update.effective_user
+            chat_key = chat.id if chat else None
+        if chat_key is None:
+            return None
+        lock = self._chat_locks.get(chat_key)
+        if lock is None:
+            lock = self._chat_locks[chat_key] = asyncio.Lock()
+        return lock
+
+    # PTB 20.3 takes a concurrent_updates slot in this private wrapper, before
+    # process_update. Waiting for the chat lock there would let one busy chat
+    # hold every slot, so the lock is taken here, before the slot.
+    async def _Application__process_update_wrapper(self, update):
+        lock = self._chat_lock(update)
+        if lock is None:
+            return await super()._Application__process_update_wrapper(update)
+        async with lock:
+            return await super()._Application__process_update_wrapper(update)
+
 # Setup and run bot
 def main():
+    preload("telegram_bot")
+    precompute_faq_summaries(faq_df)
     init_db()
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    write_behind.start()
+    # Handlers await model calls on the inference executor, so updates from different chats are
+    # processed concurrently; updates from one chat stay in order (see ChatSerializedApplication)
+    app = (
+        ApplicationBuilder().token(BOT_TOKEN)
+        .application_class(ChatSerializedApplication)
+        .concurrent_updates(True)
+        .build()
+    )
 
     # Conversation handler for context management
     conv_handler = ConversationHandler(
@@ -916,10 +800,19 @@ def main():
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("help", help_command))
     app.add_handler(CommandHandler("summarize", summarize_command))
+    app.add_error_handler(error_handler)
     
     # Use polling for Hugging Face Spaces
     logger.info("Starting bot in polling mode...")
     app.run_polling()
+    inference_executor.shutdown()
+    write_behind.close()
+    logger.info(f"Write-behind log stats: {write_behind.stats()}")
+    logger.info(f"Verdict cache stats: classify={classification_cache.stats()} scenario={scenario_cache.stats()}")
+    logger.info(f"Fact-check cascade exits: {cascade_stats.snapshot()}")
+    encode_batcher.close()
+    small_nli_batcher.close()
+    nli_batcher.close()
 
 if __name__ == "__main__":
     logger.info("Starting bot on Hugging Face Spaces...")
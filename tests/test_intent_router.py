@@ -0,0 +1,241 @@
+import re
+
+import pytest
+
+from chatbot.intent_router import IntentRouter, FALLBACK_INTENT
+
+# ===== BASELINE =====
+# The keyword helpers handle_message called one after another before the
+# router existed, copied unchanged; baseline_route() asks them in the same order.
+NEWS_KEYWORDS = ["news", "update", "headline", "recent", "latest", "new", "current"]
+
+GREETINGS = ["hi", "hello", "hey", "good morning", "good afternoon", "good evening", "howdy",
+             "how are you", "how's it going", "what's up", "how do you do", "how are things",
+             "how have you been", "how is everything"]
+
+QUESTION_KEYWORDS = ['what', 'how', 'why', 'when', 'where', 'who', 'is', 'are', 'can', 'does', 'do', 'will']
+
+QUESTION_PHRASES = ["tell me", "explain", "describe", "list", "what is", "what are", "how do", "can you"]
+
+TRANSMISSION_SCENARIOS = [
+    "handshake", "hand shake", "shake hands", "hug", "kiss", "embrace",
+    "surface", "object", "toilet", "bedding", "clothing", "utensil",
+    "air", "breathe", "cough", "sneeze", "respiratory", "aerosol",
+    "water", "pool", "swim", "swimming", "beach", "ocean",
+    "food", "eat", "drink", "animal", "pet"
+]
+
+MISINFO_KEYPHRASES = [
+    "garlic water", "5g", "government hoax", "bill gates", "microchip",
+    "wifi signals", "not real", "fake virus", "planned", "bio weapon"
+]
+
+OFF_TOPIC_KEYWORDS = {
+    "capital", "president", "weather", "sports", "movie", "music",
+    "celebrity", "recipe", "game", "sport", "team", "actor", "actress",
+    "book", "song", "artist", "football", "basketball", "entertainment",
+    "history", "geography", "politics", "economy", "stock", "finance",
+    "recipe", "cook", "food", "restaurant", "travel", "destination",
+    "language", "translate", "currency", "population", "size"
+}
+
+JOKE_TRIGGERS = {
+    "joke", "funny", "humor", "laugh", "hilarious", "comedy",
+    "kidding", "jest", "gag", "pun", "rofl", "lol", "make me laugh",
+    "cheer me up", "tell me something funny", "lighten up"
+}
+
+def is_vague_reference(text):
+    if not text.strip():
+        return False
+    text_lower = text.lower()
+    vague_terms = ["this", "that", "it", "explain", "more", "detail", "tell me"]
+    if text_lower in ["tell me", "explain", "what about", "how about", "and"]:
+        return True
+    return any(term in text_lower for term in vague_terms) and len(text.split()) <= 3
+
+def is_clear_misinfo(text):
+    return any(phrase in text.lower() for phrase in MISINFO_KEYPHRASES)
+
+def is_transmission_scenario(text):
+    text_lower = text.lower()
+    scenario_patterns = [
+        r"can you get \w+ from",
+        r"is it safe to",
+        r"risk of.*from",
+        r"transmi(t|ssion).*(through|via|from)",
+        r"spread.*(in|through|at)"
+    ]
+    return (
+        any(scenario in text_lower for scenario in TRANSMISSION_SCENARIOS) or
+        any(re.search(pattern, text_lower) for pattern in scenario_patterns)
+    )
+
+def is_off_topic(text):
+    text_lower = text.lower()
+    if any(kw in text_lower for kw in OFF_TOPIC_KEYWORDS):
+        return True
+    disease_keywords = {"pox", "virus", "disease", "illness", "infection"}
+    if any(kw in text_lower for kw in disease_keywords):
+        return False
+    health_keywords = {"health", "medical", "clinic", "doctor", "hospital", "patient"}
+    if not any(kw in text_lower for kw in health_keywords | {"monkeypox", "mpox"}):
+        return classify_off_topic(text_lower)
+    return False
+
+def classify_off_topic(text):
+    patterns = [
+        r"who (is|are) .+",
+        r"what (is|are) .+",
+        r"where is .+",
+        r"when (was|did) .+",
+        r"how to .+",
+        r"capital of",
+        r"president of",
+        r"leader of",
+        r"population of",
+        r"define ",
+        r"meaning of",
+        r"translate "
+    ]
+    return any(re.search(pattern, text) for pattern in patterns)
+
+def is_joke_request(text):
+    text_lower = text.lower()
+    if any(trigger in text_lower for trigger in JOKE_TRIGGERS):
+        return True
+    patterns = [r"tell me a joke", r"make me laugh", r"cheer me up", r"lighten up", r"say something funny"]
+    return any(re.search(pattern, text_lower) for pattern in patterns)
+
+def is_risk_query(text):
+    risk_phrases = [
+        "safe to", "is it safe", "how safe", "should i worry",
+        "chance of getting", "likely to catch", "risk of",
+        "more dangerous", "less dangerous", "compared to",
+        "versus", "vs "
+    ]
+    return any(phrase in text.lower() for phrase in risk_phrases)
+
+def is_greeting(text):
+    if not text.strip():
+        return False
+    return any(re.search(rf"\b{re.escape(greet)}\b", text.lower()) for greet in GREETINGS)
+
+def is_news_request(text):
+    text_lower = text.lower()
+    if any(kw in text_lower for kw in NEWS_KEYWORDS):
+        return True
+    return ("mpox" in text_lower or "monkeypox" in text_lower) and any(
+        kw in text_lower for kw in ["update", "report", "headline", "show", "give"]
+    )
+
+def is_casual_thanks(text):
+    text_lower = text.lower()
+    casual_set = {
+        "thanks", "thank", "thx", "tx", "appreciate",
+        "ok", "cool", "lame", "fine", "alright", "got it",
+        "cheers", "kudos", "ty"
+    }
+    if any(k in text_lower for k in casual_set):
+        return True
+    return any(m in text_lower for m in {"hank", "tank", "thnak", "thnks", "thx"})
+
+def is_general_question(text):
+    text_lower = text.lower().strip()
+    if text_lower.endswith('?'):
+        return True
+    first_word = text_lower.split()[0] if text_lower.split() else ""
+    if first_word in QUESTION_KEYWORDS:
+        return True
+    return any(phrase in text_lower for phrase in QUESTION_PHRASES)
+
+def baseline_route(user_text):
+    """Intent of the first handle_message branch that answered user_text (already normalized)"""
+    lower_text = user_text.lower()
+    if is_joke_request(user_text):
+        return "joke_request"
+    if is_off_topic(user_text):
+        return "off_topic"
+    if is_vague_reference(user_text):
+        return "vague_reference"
+    if is_clear_misinfo(user_text):
+        return "misinfo_check"
+    if re.search(r"how is mpox (transmitted|spread)", lower_text):
+        return "transmission_explanation"
+    if is_risk_query(user_text) and (" vs " in user_text or "compared to" in user_text):
+        if any(disease in user_text for disease in ["covid", "chickenpox", "smallpox", "measles", "flu"]):
+            return "risk_comparison"
+    if "symptom" in lower_text or "sign" in lower_text:
+        return "symptom_query"
+    if any(kw in lower_text for kw in ["spread", "transmit", "catch", "infect", "exposure", "contact"]):
+        return "transmission_claim"
+    if any(kw in lower_text for kw in ["prevent", "avoid", "protection", "safe"]):
+        return "prevention_info"
+    if is_transmission_scenario(user_text):
+        return "transmission_risk"
+    if is_greeting(user_text):
+        return "greeting"
+    if is_casual_thanks(user_text):
+        return "casual_reply"
+    if is_news_request(user_text):
+        return "news_request"
+    if is_general_question(user_text):
+        return "general_question"
+    return FALLBACK_INTENT
+
+# ===== TESTS =====
+# Normalized messages (lowercase, "monkeypox" -> "mpox", as handle_message passes them)
+MESSAGES = [
+    ("tell me a joke about mpox", "joke_request"),
+    ("lol", "joke_request"),
+    ("what is the capital of france", "off_topic"),
+    ("who is the president", "off_topic"),
+    ("what is the weather like", "off_topic"),
+    ("what is a virus", "general_question"),
+    ("explain", "vague_reference"),
+    ("tell me more", "vague_reference"),
+    ("what about it", "vague_reference"),
+    ("mpox is spread by 5g towers", "misinfo_check"),
+    ("bill gates planned mpox", "misinfo_check"),
+    ("how is mpox transmitted", "transmission_explanation"),
+    ("how is mpox spread between people", "transmission_explanation"),
+    ("is mpox more dangerous compared to covid", "risk_comparison"),
+    ("mpox vs smallpox risk of death", "risk_comparison"),
+    ("is mpox riskier vs the weather", "off_topic"),
+    ("what are the symptoms of mpox", "symptom_query"),
+    ("early signs of mpox infection", "symptom_query"),
+    ("can mpox spread through sex", "transmission_claim"),
+    ("i had close contact with a patient", "transmission_claim"),
+    ("how do i prevent mpox", "prevention_info"),
+    ("is it safe to visit a clinic with mpox", "prevention_info"),
+    ("mpox from a handshake with my doctor", "transmission_risk"),
+    ("mpox and my pet hamster", "transmission_risk"),
+    ("hello there", "greeting"),
+    ("good morning mpox bot", "greeting"),
+    ("thanks a lot", "casual_reply"),
+    ("ok", "casual_reply"),
+    ("latest mpox news", "news_request"),
+    ("show me mpox reports", "news_request"),
+    ("does mpox have a vaccine", "general_question"),
+    ("when will mpox vaccines be available to everyone?", "general_question"),
+    # Keywords match as substrings: "availability" contains "it"
+    ("mpox vaccine availability?", "vague_reference"),
+    ("mpox vaccines are mandatory in all schools", FALLBACK_INTENT),
+    ("", FALLBACK_INTENT),
+]
+
+@pytest.fixture(scope="module")
+def router():
+    return IntentRouter()
+
+@pytest.mark.parametrize("text,expected", MESSAGES)
+def test_route_matches_baseline_helper_order(router, text, expected):
+    assert baseline_route(text) == expected
+    assert router.route(text) == expected
+
+def test_decide_records_features_and_timing(router):
+    routing = router.decide("how do i prevent mpox")
+
+    assert routing.intent == "prevention_info"
+    assert "prevention" in routing.features
+    assert routing.timings["route"] >= 0
@@ -0,0 +1,144 @@
+import sqlite3
+
+import pytest
+
+from chatbot.migrations import (
+    MIGRATIONS, LATEST_VERSION, ExecuteMany, Migration, MigrationError,
+    ensure_schema, pending_migrations, run_migrations, schema_version,
+)
+from chatbot.repository import DEFAULT_INTENTS, ROUTING_INTENTS
+
+# Schema the bot's init_db created before the numbered migrations (Version 3)
+BASELINE_SCHEMA = '''
+CREATE TABLE Version (version INTEGER PRIMARY KEY);
+INSERT INTO Version (version) VALUES (3);
+CREATE TABLE User (
+    user_id TEXT PRIMARY KEY,
+    username TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE Intent (
+    intent_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT UNIQUE NOT NULL,
+    description TEXT,
+    category TEXT
+);
+CREATE TABLE Message (
+    message_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT REFERENCES User(user_id),
+    content TEXT NOT NULL,
+    intent_id INTEGER REFERENCES Intent(intent_id),
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE Response (
+    response_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    intent_id INTEGER REFERENCES Intent(intent_id),
+    content TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE Misinformation (
+    misinfo_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    content TEXT NOT NULL UNIQUE,
+    verification_status TEXT DEFAULT 'pending',
+    source_url TEXT
+);
+CREATE INDEX idx_message_content ON Message(content);
+CREATE INDEX idx_misinfo_content ON Misinformation(content);
+INSERT INTO Intent (name, description, category) VALUES
+    ('misinfo_check', 'Verification of potential misinformation', 'classification'),
+    ('greeting', 'Initial user greetings', 'service');
+'''
+
+MESSAGES = [
+    ("u1", "hello", 2, "2024-05-01 10:05:00"),
+    ("u1", "hi again", 2, "2024-05-01 10:55:00"),
+    ("u2", "is this true?", 1, "2024-05-01 10:30:00"),
+    ("u2", "and this?", 1, "2024-05-01 11:00:00"),
+    ("u3", "???", None, "2024-05-01 11:59:59"),
+]
+
+CLAIMS = [("claim a", "pending"), ("claim b", "pending"), ("claim c", "false"), ("claim d", None)]
+
+HOURLY = '''
+    SELECT hour, intent_id, messages FROM MessageHourly WHERE messages > 0 ORDER BY hour, intent_id
+'''
+STATUS = 'SELECT verification_status, claims FROM MisinformationStatus WHERE claims > 0 ORDER BY 1'
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / "mpox_bot.db")
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany('INSERT INTO Message (user_id, content, intent_id, timestamp) VALUES (?, ?, ?, ?)', MESSAGES)
+    conn.executemany('INSERT INTO Misinformation (content, verification_status) VALUES (?, ?)', CLAIMS)
+    conn.commit()
+    yield conn
+    conn.close()
+
+def test_baseline_database_is_migrated_to_latest(conn):
+    applied = run_migrations(conn, batch_rows=2)
+
+    assert [m.version for m in applied] == [m.version for m in MIGRATIONS]
+    assert schema_version(conn) == LATEST_VERSION
+    columns = [col[1] for col in conn.execute('PRAGMA table_info(Message)')]
+    assert "intent_source" in columns
+    intents = dict(conn.execute('SELECT name, category FROM Intent'))
+    assert {name: category for name, _, category in DEFAULT_INTENTS + ROUTING_INTENTS}.items() <= intents.items()
+    assert conn.execute('SELECT COUNT(*) FROM Message').fetchone()[0] == len(MESSAGES)
+
+def test_rollup_backfill_counts_existing_rows_once(conn):
+    run_migrations(conn, batch_rows=2)
+
+    assert conn.execute(HOURLY).fetchall() == [
+        ("2024-05-01 10:00:00", 1, 1),
+        ("2024-05-01 10:00:00", 2, 2),
+        ("2024-05-01 11:00:00", 0, 1),
+        ("2024-05-01 11:00:00", 1, 1),
+    ]
+    assert conn.execute(STATUS).fetchall() == [("", 1), ("false", 1), ("pending", 2)]
+
+    # Rows written after the migration are counted by the triggers, not again by the backfill
+    conn.execute("INSERT INTO Message (user_id, content, intent_id, timestamp) VALUES ('u4', 'hey', 2, '2024-05-01 10:45:00')")
+    conn.execute("UPDATE Misinformation SET verification_status = 'false' WHERE content = 'claim a'")
+    conn.commit()
+    assert ("2024-05-01 10:00:00", 2, 3) in conn.execute(HOURLY).fetchall()
+    assert conn.execute(STATUS).fetchall() == [("", 1), ("false", 2), ("pending", 1)]
+
+def test_rerunning_migrations_is_a_no_op(conn):
+    run_migrations(conn, batch_rows=2)
+    hourly = conn.execute(HOURLY).fetchall()
+    ledger = conn.execute('SELECT version, checksum FROM SchemaMigrations').fetchall()
+
+    assert run_migrations(conn) == []
+    assert ensure_schema(conn) == LATEST_VERSION
+    assert conn.execute(HOURLY).fetchall() == hourly
+    assert conn.execute('SELECT version, checksum FROM SchemaMigrations').fetchall() == ledger
+
+def test_dry_run_writes_nothing(conn):
+    pending = run_migrations(conn, dry_run=True)
+
+    assert len(pending) == len(MIGRATIONS)
+    assert schema_version(conn) == 0
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'MessageHourly'").fetchone() is None
+
+def test_edited_migration_is_detected(conn):
+    run_migrations(conn)
+    conn.execute("UPDATE SchemaMigrations SET checksum = 'edited' WHERE version = 4")
+    conn.commit()
+
+    with pytest.raises(MigrationError, match="Migration 4"):
+        pending_migrations(conn)
+    with pytest.raises(MigrationError):
+        run_migrations(conn)
+
+def test_checksum_ignores_formatting_but_not_what_runs():
+    base = Migration(1, "seed", ["CREATE TABLE t (x TEXT)", ExecuteMany("INSERT INTO t VALUES (?)", [("a",)])])
+    reformatted = Migration(1, "seed", ["""
+        CREATE TABLE t
+            (x TEXT)
+    """, ExecuteMany("INSERT INTO t  VALUES (?)", [("a",)])])
+    other_rows = Migration(1, "seed", ["CREATE TABLE t (x TEXT)", ExecuteMany("INSERT INTO t VALUES (?)", [("b",)])])
+
+    assert base.checksum == reformatted.checksum
+    assert base.checksum != other_rows.checksum
@@ -0,0 +1,104 @@
+import os
+
+import pytest
+
+from chatbot.migrations import LATEST_VERSION, ExecuteMany, MigrationError
+from chatbot.repository import ROUTING_INTENTS
+
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+pytest.importorskip("asyncpg")
+pytestmark = pytest.mark.skipif(
+    not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL is not set (see tests/docker-compose.yml)"
+)
+
+from chatbot.postgres_repository import PostgresRepository, POSTGRES_MIGRATIONS, VERSION_SCHEMA  # noqa: E402
+
+@pytest.fixture
+def repository():
+    repository = PostgresRepository(TEST_POSTGRES_URL, min_size=1, max_size=2)
+    repository.run(repository.pool.execute('DROP SCHEMA public CASCADE; CREATE SCHEMA public'))
+    yield repository
+    repository.close()
+
+def _apply_up_to(repository, version):
+    """Bring an empty database to `version` the way an older release left it"""
+    async def apply():
+        async with repository.pool.acquire() as conn:
+            await conn.execute(VERSION_SCHEMA)
+            for migration in POSTGRES_MIGRATIONS:
+                if migration.version > version:
+                    break
+                for step in migration.steps:
+                    if isinstance(step, ExecuteMany):
+                        await conn.executemany(step.sql, step.rows)
+                    else:
+                        await conn.execute(step)
+            await conn.execute('INSERT INTO Version (version) VALUES ($1)', version)
+    repository.run(apply())
+
+def _columns(repository, table):
+    rows = repository.run(repository.pool.fetch(
+        'SELECT column_name FROM information_schema.columns WHERE table_name = $1', table.lower()
+    ))
+    return {row["column_name"] for row in rows}
+
+def test_fresh_database_reaches_latest_version(repository):
+    intent_ids = repository.init_schema()
+
+    assert repository.schema_version() == LATEST_VERSION
+    assert repository.pending_migrations() == []
+    assert "intent_source" in _columns(repository, "Message")
+    assert {name for name, _, _ in ROUTING_INTENTS} <= set(intent_ids)
+
+def test_init_schema_is_idempotent(repository):
+    first = repository.init_schema()
+    second = repository.init_schema()
+
+    assert first == second
+    assert repository.run(repository.pool.fetchval('SELECT COUNT(*) FROM Version')) == len(POSTGRES_MIGRATIONS)
+
+def test_older_database_is_migrated(repository):
+    _apply_up_to(repository, 7)
+    assert "intent_source" not in _columns(repository, "Message")
+    assert [m.version for m in repository.pending_migrations()] == [8, 9]
+
+    repository.init_schema()
+
+    assert repository.schema_version() == LATEST_VERSION
+    assert "intent_source" in _columns(repository, "Message")
+    assert "vague_reference" in repository.intent_ids
+
+def test_refuses_to_start_behind_without_auto_migrate(repository):
+    _apply_up_to(repository, 8)
+
+    with pytest.raises(MigrationError):
+        repository.init_schema(auto_migrate=False)
+    assert repository.schema_version() == 8
+
+def test_logged_messages_feed_rollups_and_labels(repository):
+    repository.init_schema()
+    repository.write_log_batch(
+        messages=[("u1", "hello", "greeting", "router"), ("u1", "hi there", "greeting", "head")],
+        misinformation=[("mpox spreads through wifi", None)],
+    )
+
+    assert sum(count for _, name, count in repository.get_hourly_intent_counts() if name == "greeting") == 2
+    assert repository.get_misinformation_stats() == [("pending", 1)]
+    assert repository.get_labelled_messages() == [("hello", "greeting")]
+
+def test_incremental_export_reads_the_pool(repository, tmp_path, monkeypatch):
+    from chatbot import export
+
+    repository.init_schema()
+    monkeypatch.setattr(export, "get_repository", lambda: repository)
+    monkeypatch.chdir(tmp_path)
+    repository.write_log_batch(messages=[("u1", f"message {i}", "greeting", "router") for i in range(3)])
+
+    assert export.export_tables("a.csv", incremental=True, chunk_size=2)["Message"] == 3
+    repository.write_log_batch(messages=[("u1", "later", "greeting", "router")])
+    assert export.export_tables("b.csv", incremental=True, chunk_size=2)["Message"] == 1
+
+    header, row = open(export.export_path("messages", "b.csv")).read().splitlines()
+    assert header == "message_id,user_id,content,intent_id,timestamp,intent_source"
+    assert row.split(",")[2] == "later" and len(row.split(",")[4]) == len("YYYY-MM-DD HH:MM:SS")
@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+from chatbot.text_index import AhoCorasick
+
+OVERLAPPING = ["he", "she", "his", "hers", "new", "news", "newsletter", "a", "aa", "aaa", "ana", "banana"]
+
+TEXTS = [
+    "ushers",
+    "she sells newsletters about his news",
+    "aaaa",
+    "bananas and ananas",
+    "",
+    "nothing to see",
+]
+
+def brute_force(patterns, text):
+    return sorted(
+        (start, start + len(pattern), pattern)
+        for pattern in patterns
+        for start in range(len(text) - len(pattern) + 1)
+        if text.startswith(pattern, start)
+    )
+
+def matches(index, text):
+    return sorted((start, end, pattern) for start, end, pattern, _ in index.iter_matches(text))
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_matches_equal_brute_force_on_overlapping_keywords(text):
+    index = AhoCorasick(OVERLAPPING)
+
+    assert matches(index, text) == brute_force(OVERLAPPING, text)
+    assert index.payloads(text) == {pattern for pattern in OVERLAPPING if pattern in text}
+    assert index.contains_any(text) == any(pattern in text for pattern in OVERLAPPING)
+
+def test_matches_equal_brute_force_on_random_texts():
+    rng = random.Random(0)
+    for _ in range(200):
+        patterns = ["".join(rng.choices("ab", k=rng.randint(1, 4))) for _ in range(rng.randint(1, 8))]
+        text = "".join(rng.choices("abc", k=rng.randint(0, 30)))
+        index = AhoCorasick(patterns)
+
+        assert matches(index, text) == brute_force(patterns, text)
+        assert index.payloads(text) == {pattern for pattern in patterns if pattern in text}
+
+def test_payloads_are_returned_for_each_keyword():
+    index = AhoCorasick([("news", "news"), ("update", "news"), ("joke", "joke_request")])
+
+    assert index.payloads("any news update?") == {"news"}
+    assert index.payloads("tell me a joke about news") == {"news", "joke_request"}
+    assert index.payloads("hello") == set()
+
+def test_adding_after_a_search_rebuilds_the_automaton():
+    index = AhoCorasick(["news"])
+    assert not index.contains_any("headline")
+
+    index.add("headline")
+
+    assert index.payloads("latest headline news") == {"headline", "news"}